@@ -1,7 +1,23 @@
-from PySide6.QtWidgets import *
-from PySide6.QtGui import *
-from PySide6.QtCore import *
+import time
+module_start = time.perf_counter()  # startup timing reference when the process start is unknown
+
 import math
+import os
+import sys
+import threading
+import traceback
+import numpy as np
+from PySide6.QtWidgets import (QApplication, QCheckBox, QComboBox, QFileDialog, QFrame, QGridLayout, QLabel,
+                               QLineEdit, QMainWindow, QMessageBox, QPushButton, QSizePolicy, QVBoxLayout, QWidget)
+from PySide6.QtGui import QColor, QDoubleValidator, QFont, QIntValidator, QPalette, QPixmap
+from PySide6.QtCore import QObject, QRunnable, QThreadPool, QTimer, Qt, Signal
+from calculation_engine import (limits, phase_coordinates, phase_coordinates_2, conductor_parameters,
+                                calculate_line_parameters, tower_type_index)
+from conductor_catalog import catalog
+from geometry_cache import GeometryCache
+from instrumentation import timings, last_run_report
+from input_validation import (rules as validation_rules, validate_designs, error_messages, error_fields,
+                              error_distance, error_line_length)
 
 def set_dark_theme(app):
     app.setStyle("Fusion")
@@ -32,36 +48,139 @@ def set_dark_theme(app):
     
     app.setPalette(dark_palette)
 
-limits = {
-    "Type-1: Narrow Base Tower": {
-        "x_coordinates_a": (-4.0, -2.2),
-        "y_coordinates_a": (23, 39),  
-        "x_coordinates_b": (2.2, 4.0),
-        "y_coordinates_b": (23, 39),
-        "x_coordinates_c": (2.2, 4.0),
-        "y_coordinates_c": (23, 39),
-        "number_of_conductors": (1, 3)
-    },
-    "Type-2: Single Circuit Delta Tower": {
-        "x_coordinates_a": (-11.5, -9.4),
-        "y_coordinates_a": (38.25, 43),
-        "x_coordinates_b": (-8.9, 8.9),
-        "y_coordinates_b": (38.25, 43),
-        "x_coordinates_c": (9.4, 11.5),
-        "y_coordinates_c": (38.25, 43),
-        "number_of_conductors": (1,4)
-    },
-    "Type-3: Double Circuit Vertical Tower": {
-        
-        "x_coordinates_a": (1.8, 5.35),
-        "y_coordinates_a": (36, 48.8),
-        "x_coordinates_b": (1.8, 5.35),
-        "y_coordinates_b": (36, 48.8),
-        "x_coordinates_c": (1.8, 5.35),
-        "y_coordinates_c": (36, 48.8),
-        "number_of_conductors": (1,3)
-    }
+geometry_cache = GeometryCache()  # bundle/GMD terms reused between clicks
+# results of earlier sessions, opened with the first calculation so startup does not wait on it;
+# TRANSMISSION_LINE_RESULT_STORE="" turns the store off (result_store is then False)
+result_store = None
+store_lock = threading.Lock()
+
+def open_result_store():
+    global result_store
+    with store_lock:
+        if result_store is None:
+            from result_store import ResultStore, default_store_path
+            result_store = ResultStore(default_store_path, max_entries=1000000) if default_store_path else False
+    return result_store
+
+def calculate(inputs):
+    store = open_result_store() if result_store is None else result_store
+    if store:
+        return store.calculate(**inputs, cache=geometry_cache)
+    return calculate_line_parameters(**inputs, cache=geometry_cache)
+
+# Styles of an invalid input field and of the unused second circuit fields
+error_style = "QlineEdit {color: red;} QlineEdit::placeholder {color: red;} QLineEdit {border: 1px solid red;}"
+disabled_style = "background-color: black; border: none;"
+
+# Tower images sit next to this file (or in the PyInstaller bundle) and are decoded once
+base_directory = getattr(sys, "_MEIPASS", os.path.dirname(os.path.abspath(__file__)))
+tower_images = {
+    "Type-1: Narrow Base Tower": "type1.png",
+    "Type-2: Single Circuit Delta Tower": "type2.png",
+    "Type-3: Double Circuit Vertical Tower": "type3.png",
+}
+tower_pixmaps = {}
+
+def tower_pixmap(image_path):
+    if image_path not in tower_pixmaps:
+        tower_pixmaps[image_path] = QPixmap(os.path.join(base_directory, image_path)) if image_path else QPixmap()
+    return tower_pixmaps[image_path]
+
+class CalculationSignals(QObject):
+    finished = Signal(int, object, object)  # generation, results, stage breakdown (None without timings)
+
+class CalculationWorker(QRunnable):
+    # Runs the engine off the GUI thread; the generation number lets the window drop stale results
+    def __init__(self, generation, inputs):
+        super().__init__()
+        self.generation = generation
+        self.inputs = inputs
+        self.signals = CalculationSignals()
+
+    def run(self):
+        run = None
+        try:
+            with timings.run("live_calculation") as run:
+                results = calculate(self.inputs)
+        except (ValueError, FloatingPointError):
+            results = None
+        except Exception:
+            # anything else (a failing result store, an engine bug) must still answer, or live
+            # mode would keep showing the previous result
+            traceback.print_exc()
+            results = None
+        # the breakdown goes with the result, last_run belongs to this pool thread
+        self.signals.finished.emit(self.generation, results, getattr(run, "breakdown", None))
+
+# Variables of the sweep plot. "conductor_bundle" is a category per conductor and bundle count.
+plot_x_variables = {
+    "gmd": "Phase spacing GMD (m)",
+    "distance_between_conductors": "Bundle spacing (cm)",
+    "conductor_bundle": "Conductor and bundle",
+    "L_per_km": "Inductance L (mH/km)",
+    "C_per_km": "Capacitance C (µF/km)",
 }
+plot_y_variables = {
+    "L_per_km": "Inductance L (mH/km)",
+    "C_per_km": "Capacitance C (µF/km)",
+    "R_per_km": "Resistance R (Ω/km)",
+    "capacity": "Capacity (MVA)",
+}
+max_bundle = int(max(window["number_of_conductors"][1] for window in limits.values()))
+sweep_block = 50000  # designs calculated between two plot updates
+
+def bundle_categories():
+    return [f"{name} ×{n}" for name in catalog.names for n in range(1, max_bundle + 1)]
+
+class SweepSignals(QObject):
+    block = Signal(int, object)
+    finished = Signal(int, int)
+
+class SweepWorker(QRunnable):
+    # Random designs over the limits of a tower type for the plot, sent in blocks as they are done
+    def __init__(self, generation, tower_type, number_of_circuits, count):
+        super().__init__()
+        self.generation = generation
+        self.tower_type = tower_type
+        self.number_of_circuits = number_of_circuits
+        self.count = count
+        self.cancelled = False
+        self.signals = SweepSignals()
+
+    def run(self):
+        from design_sweep import sample_designs  # loaded with the first sweep, not at startup
+        designs = 0
+        # coordinates on the 2 decimals the input fields accept, so every point can be loaded
+        for columns in sample_designs(self.tower_type, self.count, self.number_of_circuits,
+                                      block_size=sweep_block, decimals=2):
+            if self.cancelled:
+                break
+            columns["conductor_bundle"] = columns["conductor_type"] * max_bundle + columns["number_of_conductors"] - 1
+            designs += len(columns["gmd"])
+            self.signals.block.emit(self.generation, columns)
+        self.signals.finished.emit(self.generation, designs)
+
+# File types of the export dialog
+export_filters = {"Parquet (*.parquet)": ".parquet", "Arrow IPC (*.arrow)": ".arrow", "CSV (*.csv)": ".csv"}
+
+class ExportSignals(QObject):
+    finished = Signal(str, int, str)  # path, rows, error message ("" on success)
+
+class ExportWorker(QRunnable):
+    # Writes a ResultTable off the GUI thread, large sweeps take a few seconds
+    def __init__(self, table, path):
+        super().__init__()
+        self.table = table
+        self.path = path
+        self.signals = ExportSignals()
+
+    def run(self):
+        try:
+            self.table.write(self.path)
+            error = ""
+        except (OSError, ImportError, ValueError) as exception:
+            error = str(exception)
+        self.signals.finished.emit(self.path, len(self.table), error)
 
 class TransmissionLineGUI(QMainWindow):
     def __init__(self):
@@ -165,7 +284,7 @@ class TransmissionLineGUI(QMainWindow):
 
         grid_layout.addWidget(QLabel("Conductor Type:"), 13, 0)
         self.conductor_type = QComboBox()
-        self.conductor_type.addItems(["Hawk", "Drake", "Cardinal", "Rail", "Pheasant"])
+        self.conductor_type.addItems(catalog.names)
         grid_layout.addWidget(self.conductor_type, 13, 1, 1, 2)
 
         self.label_line_length = QLabel("Length of Transmission Line (km):")
@@ -174,9 +293,13 @@ class TransmissionLineGUI(QMainWindow):
         grid_layout.addWidget(self.line_length, 14, 1, 1, 2)
 
         self.calculate_button = QPushButton("Calculate")
-        grid_layout.addWidget(self.calculate_button, 15, 0, 1, 3)  
+        grid_layout.addWidget(self.calculate_button, 15, 0, 1, 2)
         self.calculate_button.clicked.connect(self.calculate_parameters) # calculate the parameters when the button is clicked
 
+        self.live_calculation = QCheckBox("Live calculation")
+        self.live_calculation.setToolTip("Recalculate while typing. Invalid inputs show N/A instead of an error dialog.")
+        grid_layout.addWidget(self.live_calculation, 15, 2)
+
         self.output_R = QLineEdit()
         self.output_R.setDisabled(True)
         self.output_R.setStyleSheet("color: white;")
@@ -217,289 +340,287 @@ class TransmissionLineGUI(QMainWindow):
         self.image_label = QLabel()
         grid_layout.addWidget(self.image_label, 0, 3, 18, 1)
 
+        # Diagnostics: stage timings of the last calculation (timings are only taken while checked)
+        self.diagnostics = QCheckBox("Diagnostics")
+        self.diagnostics.setToolTip("Show how long every stage of the last calculation took.")
+        grid_layout.addWidget(self.diagnostics, 20, 0)
+        self.diagnostics_panel = QLabel()
+        self.diagnostics_panel.setFont(QFont("Monospace", 9))
+        self.diagnostics_panel.setAlignment(Qt.AlignTop | Qt.AlignLeft)
+        self.diagnostics_panel.setTextInteractionFlags(Qt.TextSelectableByMouse)
+        self.diagnostics_panel.setVisible(False)
+        grid_layout.addWidget(self.diagnostics_panel, 21, 0, 1, 4)
+        self.diagnostics.toggled.connect(self.toggle_diagnostics)
+
+        # Sweep plot next to the tower image: random designs of the selected tower, drawn while
+        # they are calculated; hovering shows a design, clicking loads it into the inputs
+        self.show_plot = QCheckBox("Sweep plot")
+        self.show_plot.setToolTip("Plot the results of random designs within the limits of the tower type.")
+        grid_layout.addWidget(self.show_plot, 20, 1)
+
+        # Export of the full-precision inputs and results (the fields only show rounded values)
+        self.export_button = QPushButton("Export Result...")
+        self.export_button.setToolTip("Save the inputs and results of the last calculation as Parquet, Arrow or CSV.")
+        grid_layout.addWidget(self.export_button, 20, 2)
+        self.export_button.clicked.connect(self.export_result)
+        self.last_calculation = None  # (inputs, results) of the design shown in the output fields
+        self.export_workers = set()
+        self.plot_frame = QFrame()
+        self.plot_frame.setFrameShape(QFrame.StyledPanel)
+        self.plot_layout = plot_layout = QGridLayout(self.plot_frame)
+        self.plot_x = QComboBox()
+        for name, label in plot_x_variables.items():
+            self.plot_x.addItem(label, name)
+        self.plot_y = QComboBox()
+        for name, label in plot_y_variables.items():
+            self.plot_y.addItem(label, name)
+        self.plot_samples = QComboBox()
+        self.plot_samples.addItems(["10000", "100000", "1000000"])
+        self.plot_samples.setCurrentIndex(1)
+        self.sweep_button = QPushButton("Run Sweep")
+        plot_layout.addWidget(QLabel("X:"), 0, 0)
+        plot_layout.addWidget(self.plot_x, 0, 1)
+        plot_layout.addWidget(QLabel("Y:"), 0, 2)
+        plot_layout.addWidget(self.plot_y, 0, 3)
+        plot_layout.addWidget(QLabel("Designs:"), 1, 0)
+        plot_layout.addWidget(self.plot_samples, 1, 1)
+        plot_layout.addWidget(self.sweep_button, 1, 2)
+        self.export_sweep_button = QPushButton("Export Sweep...")
+        self.export_sweep_button.setToolTip("Save all plotted designs with their results.")
+        plot_layout.addWidget(self.export_sweep_button, 1, 3)
+        self.plot = None  # made when the plot is first shown
+        self.plot_readout = QLabel("Run a sweep to plot the designs of the selected tower.")
+        self.plot_readout.setWordWrap(True)
+        self.plot_readout.setMinimumHeight(40)
+        plot_layout.addWidget(self.plot_readout, 3, 0, 1, 4)
+        plot_layout.setRowStretch(2, 1)
+        grid_layout.addWidget(self.plot_frame, 0, 4, 22, 1)
+        self.plot_frame.setVisible(False)
+        self.sweep_generation = 0
+        self.sweep_worker = None
+        self.sweep_design = None  # tower type and circuits of the plotted designs
+        self.show_plot.toggled.connect(self.toggle_plot)
+        self.sweep_button.clicked.connect(self.run_sweep)
+        self.export_sweep_button.clicked.connect(self.export_sweep)
+        self.plot_x.currentIndexChanged.connect(self.update_plot_axes)
+        self.plot_y.currentIndexChanged.connect(self.update_plot_axes)
+
         grid_layout.setColumnStretch(0, 1)
         total_rows = 20
         for i in range(total_rows):
             grid_layout.setRowStretch(i, 1)
 
+        # Input fields by the names of the validation engine, and the label marked for each of them
+        self.input_fields = {
+            "x_coordinates_a": self.x_coordinates_a, "y_coordinates_a": self.y_coordinates_a,
+            "x_coordinates_b": self.x_coordinates_b, "y_coordinates_b": self.y_coordinates_b,
+            "x_coordinates_c": self.x_coordinates_c, "y_coordinates_c": self.y_coordinates_c,
+            "x_coordinates_a_2": self.x_coordinates_a_2, "y_coordinates_a_2": self.y_coordinates_a_2,
+            "x_coordinates_b_2": self.x_coordinates_b_2, "y_coordinates_b_2": self.y_coordinates_b_2,
+            "x_coordinates_c_2": self.x_coordinates_c_2, "y_coordinates_c_2": self.y_coordinates_c_2,
+            "number_of_conductors": self.number_of_conductors,
+            "distance_between_conductors": self.distance_between_conductors,
+            "line_length": self.line_length
+        }
+        self.field_labels = {
+            "x_coordinates_a": self.label_xa, "y_coordinates_a": self.label_ya,
+            "x_coordinates_b": self.label_xb, "y_coordinates_b": self.label_yb,
+            "x_coordinates_c": self.label_xc, "y_coordinates_c": self.label_yc,
+            "x_coordinates_a_2": self.label_xa, "y_coordinates_a_2": self.label_ya,
+            "x_coordinates_b_2": self.label_xb, "y_coordinates_b_2": self.label_yb,
+            "x_coordinates_c_2": self.label_xc, "y_coordinates_c_2": self.label_yc,
+            "number_of_conductors": self.label_number_of_conductors,
+            "distance_between_conductors": self.label_distance_between_conductors,
+            "line_length": self.label_line_length
+        }
+        self.validators = {}  # validators of each tower type, see tower_validators
+
         self.tower_type.currentIndexChanged.connect(self.update_circuits_input)
         self.number_of_circuits.currentIndexChanged.connect(self.update_circuits_input)
         self.update_circuits_input()
 
+        # Live mode: edits restart a short timer, the calculation runs on a single worker thread
+        self.live_timer = QTimer(self)
+        self.live_timer.setSingleShot(True)
+        self.live_timer.setInterval(250)  # debounce in ms
+        self.live_timer.timeout.connect(self.live_calculate)
+        self.thread_pool = QThreadPool(self)
+        self.thread_pool.setMaxThreadCount(1)
+        self.live_generation = 0
+        self.live_worker = None
+        self.live_inputs = None  # inputs and results of the last finished live calculation
+        self.live_results = None
+
+        for field in self.input_fields.values():
+            field.textChanged.connect(self.schedule_live_calculation)
+        for combo in [self.tower_type, self.number_of_circuits, self.conductor_type]:
+            combo.currentIndexChanged.connect(self.schedule_live_calculation)
+        self.live_calculation.toggled.connect(self.schedule_live_calculation)
+
     def update_circuits_input(self):
         # Clear input/output fields
-        coordinates = [
-            self.x_coordinates_a, self.y_coordinates_a, self.x_coordinates_b, self.y_coordinates_b,
-            self.x_coordinates_c, self.y_coordinates_c, self.x_coordinates_a_2, self.y_coordinates_a_2,
-            self.x_coordinates_b_2, self.y_coordinates_b_2, self.x_coordinates_c_2, self.y_coordinates_c_2,
-            self.number_of_conductors, self.output_R, self.output_L, self.output_C, self.output_capacity
-        ]
-
-        for coordinate in coordinates:
-            coordinate.clear()
-
-        # Reset styles
-        for coordinate in coordinates:
-            coordinate.setStyleSheet("")
-
-        # Reset labels' styles
-        labels = [
-            self.label_number_of_conductors, self.label_xa, self.label_ya,
-            self.label_xb, self.label_yb, self.label_xc, self.label_yc,
-            self.label_distance_between_conductors, self.label_line_length
-        ]
+        outputs = [self.output_R, self.output_L, self.output_C, self.output_capacity]
+        for name, field in self.input_fields.items():
+            if name not in ("distance_between_conductors", "line_length"):
+                field.clear()
+        for output in outputs:
+            output.clear()
+            if output.styleSheet():
+                output.setStyleSheet("")
+        self.last_calculation = None
 
-        for label in labels:
-            label.setText(f"{label.text().strip('* ')}")
-
-        # Reset additional styles
-        self.line_length.setStyleSheet("")
-        self.distance_between_conductors.setStyleSheet("")
-
-
-        # change the limits of the coordinates based on the tower type
-        tower_type = self.tower_type.currentText()
-        limits_dict = limits[tower_type]
-        self.x_coordinates_a.setValidator(QDoubleValidator(limits_dict["x_coordinates_a"][0], limits_dict["x_coordinates_a"][1], 2))
-        self.y_coordinates_a.setValidator(QDoubleValidator(limits_dict["y_coordinates_a"][0], limits_dict["y_coordinates_a"][1], 2))
-        self.x_coordinates_b.setValidator(QDoubleValidator(limits_dict["x_coordinates_b"][0], limits_dict["x_coordinates_b"][1], 2))
-        self.y_coordinates_b.setValidator(QDoubleValidator(limits_dict["y_coordinates_b"][0], limits_dict["y_coordinates_b"][1], 2))
-        self.x_coordinates_c.setValidator(QDoubleValidator(limits_dict["x_coordinates_c"][0], limits_dict["x_coordinates_c"][1], 2))
-        self.y_coordinates_c.setValidator(QDoubleValidator(limits_dict["y_coordinates_c"][0], limits_dict["y_coordinates_c"][1], 2))
-        self.x_coordinates_a_2.setValidator(QDoubleValidator(-1*limits_dict["x_coordinates_a"][1], -1*limits_dict["x_coordinates_a"][0], 2))
-        self.y_coordinates_a_2.setValidator(QDoubleValidator(limits_dict["y_coordinates_a"][0], limits_dict["y_coordinates_a"][1], 2))
-        self.x_coordinates_b_2.setValidator(QDoubleValidator(-1*limits_dict["x_coordinates_b"][1], -1*limits_dict["x_coordinates_b"][0], 2))
-        self.y_coordinates_b_2.setValidator(QDoubleValidator(limits_dict["y_coordinates_b"][0], limits_dict["y_coordinates_b"][1], 2))
-        self.x_coordinates_c_2.setValidator(QDoubleValidator(-1*limits_dict["x_coordinates_c"][1], -1*limits_dict["x_coordinates_c"][0], 2))
-        self.y_coordinates_c_2.setValidator(QDoubleValidator(limits_dict["y_coordinates_c"][0], limits_dict["y_coordinates_c"][1], 2))
-        self.number_of_conductors.setValidator(QIntValidator(limits_dict["number_of_conductors"][0], limits_dict["number_of_conductors"][1]))
-
-        # change the placeholder text based on the tower type
-        self.x_coordinates_a.setPlaceholderText(f"{limits_dict['x_coordinates_a'][0]} - {limits_dict['x_coordinates_a'][1]}")
-        self.y_coordinates_a.setPlaceholderText(f"{limits_dict['y_coordinates_a'][0]} - {limits_dict['y_coordinates_a'][1]}")
-        self.x_coordinates_b.setPlaceholderText(f"{limits_dict['x_coordinates_b'][0]} - {limits_dict['x_coordinates_b'][1]}")
-        self.y_coordinates_b.setPlaceholderText(f"{limits_dict['y_coordinates_b'][0]} - {limits_dict['y_coordinates_b'][1]}")
-        self.x_coordinates_c.setPlaceholderText(f"{limits_dict['x_coordinates_c'][0]} - {limits_dict['x_coordinates_c'][1]}")
-        self.y_coordinates_c.setPlaceholderText(f"{limits_dict['y_coordinates_c'][0]} - {limits_dict['y_coordinates_c'][1]}")
-        self.number_of_conductors.setPlaceholderText(f"{limits_dict['number_of_conductors'][0]} - {limits_dict['number_of_conductors'][1]}")
-        
         # Enable the number of circuits input if the tower type is Type-3
-        if self.tower_type.currentText() == "Type-3: Double Circuit Vertical Tower":
+        tower_type = self.tower_type.currentText()
+        if tower_type == "Type-3: Double Circuit Vertical Tower":
             self.number_of_circuits.setEnabled(True)
         else:
             self.number_of_circuits.setEnabled(False)
             self.number_of_circuits.setCurrentIndex(0)  # Default to 1 circuit when disabled
 
-        #Determine if the second circuit inputs should be changable or not when the number of circuits is changed 
-        if self.number_of_circuits.currentText() == "2":
-            self.x_coordinates_a_2.setReadOnly(False)
-            self.y_coordinates_a_2.setReadOnly(False)
-            self.x_coordinates_b_2.setReadOnly(False)
-            self.y_coordinates_b_2.setReadOnly(False)
-            self.x_coordinates_c_2.setReadOnly(False)
-            self.y_coordinates_c_2.setReadOnly(False)
-            self.x_coordinates_a_2.setStyleSheet("")
-            self.y_coordinates_a_2.setStyleSheet("")
-            self.x_coordinates_b_2.setStyleSheet("")
-            self.y_coordinates_b_2.setStyleSheet("")
-            self.x_coordinates_c_2.setStyleSheet("")
-            self.y_coordinates_c_2.setStyleSheet("")
-            self.x_coordinates_a_2.setPlaceholderText(f"{-1*limits_dict['x_coordinates_a'][1]} - {-1*limits_dict['x_coordinates_a'][0]}")
-            self.y_coordinates_a_2.setPlaceholderText(f"{limits_dict['y_coordinates_a'][0]} - {limits_dict['y_coordinates_a'][1]}")
-            self.x_coordinates_b_2.setPlaceholderText(f"{-1*limits_dict['x_coordinates_b'][1]} - {-1*limits_dict['x_coordinates_b'][0]}")
-            self.y_coordinates_b_2.setPlaceholderText(f"{limits_dict['y_coordinates_b'][0]} - {limits_dict['y_coordinates_b'][1]}")
-            self.x_coordinates_c_2.setPlaceholderText(f"{-1*limits_dict['x_coordinates_c'][1]} - {-1*limits_dict['x_coordinates_c'][0]}")
-            self.y_coordinates_c_2.setPlaceholderText(f"{limits_dict['y_coordinates_c'][0]} - {limits_dict['y_coordinates_c'][1]}")
-        else:
-            self.x_coordinates_a_2.setReadOnly(True)
-            self.y_coordinates_a_2.setReadOnly(True)
-            self.x_coordinates_b_2.setReadOnly(True)
-            self.y_coordinates_b_2.setReadOnly(True)
-            self.x_coordinates_c_2.setReadOnly(True)
-            self.y_coordinates_c_2.setReadOnly(True)
-            self.x_coordinates_a_2.setStyleSheet("background-color: black; border: none; QlineEdit::placeholder {color: light gray;}")
-            self.y_coordinates_a_2.setStyleSheet("background-color: black; border: none;")
-            self.x_coordinates_b_2.setStyleSheet("background-color: black; border: none;")
-            self.y_coordinates_b_2.setStyleSheet("background-color: black; border: none;")
-            self.x_coordinates_c_2.setStyleSheet("background-color: black; border: none;")
-            self.y_coordinates_c_2.setStyleSheet("background-color: black; border: none;")
-            self.x_coordinates_a_2.setPlaceholderText("N/A")
-            self.y_coordinates_a_2.setPlaceholderText("N/A")
-            self.x_coordinates_b_2.setPlaceholderText("N/A")
-            self.y_coordinates_b_2.setPlaceholderText("N/A")
-            self.x_coordinates_c_2.setPlaceholderText("N/A")
-            self.y_coordinates_c_2.setPlaceholderText("N/A")
-        
+        # change the limits and placeholder texts of the fields based on the tower type; the second
+        # circuit inputs are only changeable with two circuits
+        double = self.number_of_circuits.currentText() == "2"
+        ranges = validation_rules.field_ranges(tower_type)
+        for name, validator in self.tower_validators(tower_type).items():
+            field = self.input_fields[name]
+            field.setValidator(validator)
+            low, high, _ = ranges[name]
+            if name.endswith("_2"):
+                field.setReadOnly(not double)
+                field.setPlaceholderText(f"{low} - {high}" if double else "N/A")
+            else:
+                field.setPlaceholderText(f"{low} - {high}")
+
+        # Reset styles and labels
+        self.apply_form_state(self.base_styles(), set())
+
         # Determine the image path based on the tower type
-        if tower_type == "Type-1: Narrow Base Tower":
-            self.image_path = "type1.png"
-            self.title_text = "Type-1: Narrow Base Tower"
-        elif tower_type == "Type-2: Single Circuit Delta Tower":
-            self.image_path = "type2.png"
-            self.title_text = "Type-2: Single Circuit Delta Tower"
-        elif tower_type == "Type-3: Double Circuit Vertical Tower":
-            self.image_path = "type3.png"
-            self.title_text = "Type-3: Double Circuit Vertical Tower"
-        else:
-            self.image_path = ""  # Default
-            self.title_text = "Unknown Tower Type"
+        self.image_path = tower_images.get(tower_type, "")
+        self.title_text = tower_type if tower_type in tower_images else "Unknown Tower Type"
         # Set the title label text
         self.title_label.setText(self.title_text)
-        # Set the image
-        pixmap = QPixmap(self.image_path)
-        self.image_label.setPixmap(pixmap)
+        # Set the image; while the window is being built it is loaded after the first paint
+        if self.isVisible():
+            self.show_tower_image()
+        else:
+            QTimer.singleShot(0, self.show_tower_image)
+
+    def show_tower_image(self):
+        self.image_label.setPixmap(tower_pixmap(self.image_path))
+
+    def tower_validators(self, tower_type):
+        # Validators of the range checked fields, created once per tower type from the validation rules
+        if tower_type not in self.validators:
+            validators = {}
+            for name, (low, high, decimals) in validation_rules.field_ranges(tower_type).items():
+                if decimals == 0:
+                    validators[name] = QIntValidator(low, high, self)
+                else:
+                    validators[name] = QDoubleValidator(low, high, decimals, self)
+            self.validators[tower_type] = validators
+        return self.validators[tower_type]
+
+    def base_styles(self):
+        # Styles of the input fields without errors, the unused second circuit is blacked out
+        double = self.number_of_circuits.currentText() == "2"
+        return {name: disabled_style if name.endswith("_2") and not double else ""
+                for name in self.input_fields}
+
+    def apply_form_state(self, styles, marked_labels):
+        # One batched update of the form: only the fields and labels that change are touched and
+        # the window repaints once at the end
+        self.setUpdatesEnabled(False)
+        try:
+            for name, style in styles.items():
+                field = self.input_fields[name]
+                if field.styleSheet() != style:
+                    field.setStyleSheet(style)
+            for label in dict.fromkeys(self.field_labels.values()):
+                text = label.text().strip('* ')
+                if label in marked_labels:
+                    text += " *"
+                if label.text() != text:
+                    label.setText(text)
+        finally:
+            self.setUpdatesEnabled(True)
+
+    def form_values(self):
+        # Numbers of the input fields, NaN where a field is empty or not a number
+        values = {}
+        for name, field in self.input_fields.items():
+            try:
+                values[name] = float(field.text())
+            except ValueError:
+                values[name] = float("nan")
+        return values
+
+    def form_error_code(self):
+        # Error code of the form from the validation engine (0 when the inputs are valid)
+        values = self.form_values()
+        return int(validate_designs(
+            tower_type_index(self.tower_type.currentText()), int(self.number_of_circuits.currentText()),
+            values["number_of_conductors"], values["distance_between_conductors"], values["line_length"],
+            catalog.lookup.get(self.conductor_type.currentText(), -1), values))
 
     def validate_input(self):
-        inputs = [
-            (self.label_distance_between_conductors, self.distance_between_conductors),
-            (self.label_line_length, self.line_length),
-        ]
-
-        error_messages = []
-        
-        # Reset the style of all line edits and in the dictionary
-        for label, line_edit in inputs:
-            line_edit.setStyleSheet("")
-            label.setText(f"{label.text().strip('* ')}")
-        self.label_number_of_conductors.setText(f"{self.label_number_of_conductors.text().strip('* ')}")
-        self.number_of_conductors.setStyleSheet("")
-        self.label_xa.setText(f"{self.label_xa.text().strip('* ')}")
-        self.x_coordinates_a.setStyleSheet("QlineEdit {color: black;} QlineEdit::placeholder {color: light gray;} QLineEdit {border: 1px solid black;}")
-        self.label_ya.setText(f"{self.label_ya.text().strip('* ')}")
-        self.y_coordinates_a.setStyleSheet("")
-        self.label_xb.setText(f"{self.label_xb.text().strip('* ')}")
-        self.x_coordinates_b.setStyleSheet("")
-        self.label_yb.setText(f"{self.label_yb.text().strip('* ')}")
-        self.y_coordinates_b.setStyleSheet("")
-        self.label_xc.setText(f"{self.label_xc.text().strip('* ')}")
-        self.x_coordinates_c.setStyleSheet("")
-        self.label_yc.setText(f"{self.label_yc.text().strip('* ')}")
-        self.y_coordinates_c.setStyleSheet("")
-        if self.number_of_circuits.currentText() == "2":
-            self.x_coordinates_a_2.setStyleSheet("")
-            self.y_coordinates_a_2.setStyleSheet("")
-            self.x_coordinates_b_2.setStyleSheet("")
-            self.y_coordinates_b_2.setStyleSheet("")
-            self.x_coordinates_c_2.setStyleSheet("")
-            self.y_coordinates_c_2.setStyleSheet("")
-        else:
-            self.x_coordinates_a_2.setStyleSheet("background-color: black; border: none;")
-            self.y_coordinates_a_2.setStyleSheet("background-color: black; border: none;")
-            self.x_coordinates_b_2.setStyleSheet("background-color: black; border: none;")
-            self.y_coordinates_b_2.setStyleSheet("background-color: black; border: none;")
-            self.x_coordinates_c_2.setStyleSheet("background-color: black; border: none;")
-            self.y_coordinates_c_2.setStyleSheet("background-color: black; border: none;")
-
-        # Check if all inputs are within limits and convert to float (except for coordinates)
-        for label, line_edit in inputs:
-            value = line_edit.text()
-            if not value:
-                error_messages.append(f"Please enter {label.text()}.")
-                line_edit.setStyleSheet("QlineEdit {color: red;} QlineEdit::placeholder {color: red;} QLineEdit {border: 1px solid red;}")
-                label.setText(f"{label.text().strip('* ')} *")
-            else:
-                try:
-                    float_value = float(value)
-                    if float_value <= 0:
-                        error_messages.append(f"{label.text()} must be a positive number.")
-                        line_edit.setStyleSheet("QlineEdit {color: red;} QlineEdit::placeholder {color: red;} QLineEdit {border: 1px solid red;}")
-                        label.setText(f"{label.text().strip('* ')} *")
-                except ValueError:
-                    error_messages.append(f"{label.text()} must be a number.")
-                    line_edit.setStyleSheet("QlineEdit {color: red;} QlineEdit::placeholder {color: red;} QLineEdit {border: 1px solid red;}")
-                    label.setText(f"{label.text().strip('* ')} *")
-        
-        # Checks if the number of conductors in bundle is in the limit and its not empty
-        if not self.number_of_conductors.hasAcceptableInput():
-            error_messages.append("Invalid number of conductors in bundle.")
-            self.label_number_of_conductors.setText(f"{self.label_number_of_conductors.text().strip('* ')} *")
-            self.number_of_conductors.setStyleSheet("QlineEdit {color: red;} QlineEdit::placeholder {color: red;} QLineEdit {border: 1px solid red;}")
-        
-        # check the validity of the coordinates
-        if not (self.x_coordinates_a.hasAcceptableInput() and self.y_coordinates_a.hasAcceptableInput()):
-            error_messages.append("Invalid coordinates for Phase A.")
-            self.label_xa.setText(f"{self.label_xa.text().strip('* ')} *")
-            self.x_coordinates_a.setStyleSheet("QlineEdit {color: red;} QlineEdit::placeholder {color: red;} QLineEdit {border: 1px solid red;}")
-            self.label_ya.setText(f"{self.label_ya.text().strip('* ')} *")
-            self.y_coordinates_a.setStyleSheet("QlineEdit {color: red;} QlineEdit::placeholder {color: red;} QLineEdit {border: 1px solid red;}")
-        if not (self.x_coordinates_b.hasAcceptableInput() and self.y_coordinates_b.hasAcceptableInput()):
-            error_messages.append("Invalid coordinates for Phase B.")
-            self.label_xb.setText(f"{self.label_xb.text().strip('* ')} *")
-            self.x_coordinates_b.setStyleSheet("QlineEdit {color: red;} QlineEdit::placeholder {color: red;} QLineEdit {border: 1px solid red;}")
-            self.label_yb.setText(f"{self.label_yb.text().strip('* ')} *")
-            self.y_coordinates_b.setStyleSheet("QlineEdit {color: red;} QlineEdit::placeholder {color: red;} QLineEdit {border: 1px solid red;}")
-        if not (self.x_coordinates_c.hasAcceptableInput() and self.y_coordinates_c.hasAcceptableInput()):
-            error_messages.append("Invalid coordinates for Phase C.")
-            self.label_xc.setText(f"{self.label_xc.text().strip('* ')} *")
-            self.x_coordinates_c.setStyleSheet("QlineEdit {color: red;} QlineEdit::placeholder {color: red;} QLineEdit {border: 1px solid red;}")
-            self.label_yc.setText(f"{self.label_yc.text().strip('* ')} *")
-            self.y_coordinates_c.setStyleSheet("QlineEdit {color: red;} QlineEdit::placeholder {color: red;} QLineEdit {border: 1px solid red;}")
-        if self.number_of_circuits.currentText() == "2" and not (self.x_coordinates_a_2.hasAcceptableInput() and self.y_coordinates_a_2.hasAcceptableInput()):
-            error_messages.append("Invalid coordinates for Phase A in the second circuit.")
-            self.label_xa.setText(f"{self.label_xa.text().strip('* ')} *")
-            self.x_coordinates_a_2.setStyleSheet("QlineEdit {color: red;} QlineEdit::placeholder {color: red;} QLineEdit {border: 1px solid red;}")
-            self.label_ya.setText(f"{self.label_ya.text().strip('* ')} *")
-            self.y_coordinates_a_2.setStyleSheet("QlineEdit {color: red;} QlineEdit::placeholder {color: red;} QLineEdit {border: 1px solid red;}")
-        if self.number_of_circuits.currentText() == "2" and not (self.x_coordinates_b_2.hasAcceptableInput() and self.y_coordinates_b_2.hasAcceptableInput()):
-            error_messages.append("Invalid coordinates for Phase B in the second circuit.")
-            self.label_xb.setText(f"{self.label_xb.text().strip('* ')} *")
-            self.x_coordinates_b_2.setStyleSheet("QlineEdit {color: red;} QlineEdit::placeholder {color: red;} QLineEdit {border: 1px solid red;}")
-            self.label_yb.setText(f"{self.label_yb.text().strip('* ')} *")
-            self.y_coordinates_b_2.setStyleSheet("QlineEdit {color: red;} QlineEdit::placeholder {color: red;} QLineEdit {border: 1px solid red;}")
-        if self.number_of_circuits.currentText() == "2" and not (self.x_coordinates_c_2.hasAcceptableInput() and self.y_coordinates_c_2.hasAcceptableInput()):
-            error_messages.append("Invalid coordinates for Phase C in the second circuit.")
-            self.label_xc.setText(f"{self.label_xc.text().strip('* ')} *")
-            self.x_coordinates_c_2.setStyleSheet("QlineEdit {color: red;} QlineEdit::placeholder {color: red;} QLineEdit {border: 1px solid red;}")
-            self.label_yc.setText(f"{self.label_yc.text().strip('* ')} *")
-            self.y_coordinates_c_2.setStyleSheet("QlineEdit {color: red;} QlineEdit::placeholder {color: red;} QLineEdit {border: 1px solid red;}")
-        
+        code = self.form_error_code()
+        styles = self.base_styles()
+        marked_labels = set()
+        messages = []
+        for bit, message in error_messages.items():
+            if not code & bit:
+                continue
+            for name in error_fields.get(bit, []):
+                styles[name] = error_style
+                marked_labels.add(self.field_labels[name])
+            if bit in (error_distance, error_line_length):
+                # the message tells an empty field from a non numeric or non positive one
+                name = error_fields[bit][0]
+                label = self.field_labels[name].text().strip('* ')
+                value = self.input_fields[name].text()
+                if not value:
+                    message = f"Please enter {label}."
+                elif math.isnan(self.form_values()[name]):
+                    message = f"{label} must be a number."
+                else:
+                    message = f"{label} must be a positive number."
+            messages.append(message)
+        self.apply_form_state(styles, marked_labels)
+
         # Show error messages if any
-        if error_messages:
-            QMessageBox.critical(self, "Invalid Input", "\n".join(error_messages))
+        if messages:
+            QMessageBox.critical(self, "Invalid Input", "\n".join(messages))
             return False
-        
+
         return True
 
     def get_conductor_parameters(self):     # Returns the conductor parameters based on the selected type
-        if self.conductor_type.currentText() == "Hawk":
-            diameter = 21.793 * 10**(-3)   # in m
-            radius = diameter / 2          # in m
-            r_GMR = 8.809 * 10**(-3)       # in m
-            ac_resistance = 0.132          # in ohm/km 
-            current_capacity = 659         # in A
-            return radius, r_GMR, ac_resistance, current_capacity
-        
-        elif self.conductor_type.currentText() == "Drake":
-            diameter = 28.143 * 10**(-3)   # in m
-            radius = diameter / 2          # in m
-            r_GMR = 11.369 * 10**(-3)      # in m
-            ac_resistance = 0.080          # in ohm/km
-            current_capacity = 907         # in A
-            return radius, r_GMR, ac_resistance, current_capacity
-        
-        elif self.conductor_type.currentText() == "Cardinal":
-            diameter = 30.378 * 10**(-3)   # in m
-            radius = diameter / 2          # in m
-            r_GMR = 12.253 * 10**(-3)      # in m
-            ac_resistance = 0.067          # in ohm/km
-            current_capacity = 996         # in A
-            return radius, r_GMR, ac_resistance, current_capacity
-        
-        elif self.conductor_type.currentText() == "Rail":
-            diameter = 29.591 * 10**(-3)   # in m
-            radius = diameter / 2          # in m
-            r_GMR = 11.765 * 10**(-3)      # in m
-            ac_resistance = 0.068          # in ohm/km
-            current_capacity = 993         # in A
-            return radius, r_GMR, ac_resistance, current_capacity
-
-        elif self.conductor_type.currentText() == "Pheasant":
-            diameter = 35.103 * 10**(-3)   # in m
-            radius = diameter / 2          # in m
-            r_GMR = 14.204 * 10**(-3)      # in m
-            ac_resistance = 0.051          # in ohm/km
-            current_capacity = 1187        # in A
-            return radius, r_GMR, ac_resistance, current_capacity
+        radius, r_GMR, ac_resistance, current_capacity = conductor_parameters(self.conductor_type.currentText())
+        return float(radius), float(r_GMR), float(ac_resistance), float(current_capacity)
+
+    def read_inputs(self):
+        inputs = {
+            "tower_type": self.tower_type.currentText(),
+            "number_of_circuits": int(self.number_of_circuits.currentText()),
+            "number_of_conductors": int(self.number_of_conductors.text()),
+            "distance_between_conductors": float(self.distance_between_conductors.text()),  # in cm
+            "conductor_type": self.conductor_type.currentText(),
+            "line_length": float(self.line_length.text()),
+        }
+        coordinate_fields = {
+            "x_coordinates_a": self.x_coordinates_a, "y_coordinates_a": self.y_coordinates_a,
+            "x_coordinates_b": self.x_coordinates_b, "y_coordinates_b": self.y_coordinates_b,
+            "x_coordinates_c": self.x_coordinates_c, "y_coordinates_c": self.y_coordinates_c
+        }
+        if self.number_of_circuits.currentText() == "2":
+            coordinate_fields.update({
+                "x_coordinates_a_2": self.x_coordinates_a_2, "y_coordinates_a_2": self.y_coordinates_a_2,
+                "x_coordinates_b_2": self.x_coordinates_b_2, "y_coordinates_b_2": self.y_coordinates_b_2,
+                "x_coordinates_c_2": self.x_coordinates_c_2, "y_coordinates_c_2": self.y_coordinates_c_2
+            })
+        for name, field in coordinate_fields.items():
+            inputs[name] = float(field.text())
+        return inputs
 
     def calculate_parameters(self):
         # Check if the inputs are valid
@@ -508,84 +629,27 @@ class TransmissionLineGUI(QMainWindow):
             self.output_L.setText("N/A")
             self.output_C.setText("N/A")
             self.output_capacity.setText("N/A")
+            self.last_calculation = None
             return
 
-        # Set the input values for calculation
-        conductor_radius, conductor_GMR, conductor_resistance, conductor_capacity = self.get_conductor_parameters()
-        distance_between_conductors = float(self.distance_between_conductors.text()) / 100  # Convert cm to m
-        line_length_km = float(self.line_length.text())
-        number_of_conductors = int(self.number_of_conductors.text())
-        x_coordinates_a = float(self.x_coordinates_a.text())
-        y_coordinates_a = float(self.y_coordinates_a.text())
-        x_coordinates_b = float(self.x_coordinates_b.text())
-        y_coordinates_b = float(self.y_coordinates_b.text())
-        x_coordinates_c = float(self.x_coordinates_c.text())
-        y_coordinates_c = float(self.y_coordinates_c.text())
-
-        if self.number_of_circuits.currentText() == "2":
-            x_coordinates_a_2 = float(self.x_coordinates_a_2.text())
-            y_coordinates_a_2 = float(self.y_coordinates_a_2.text())
-            x_coordinates_b_2 = float(self.x_coordinates_b_2.text())
-            y_coordinates_b_2 = float(self.y_coordinates_b_2.text())
-            x_coordinates_c_2 = float(self.x_coordinates_c_2.text())
-            y_coordinates_c_2 = float(self.y_coordinates_c_2.text())
-        
-        # Compute Bundle Geometric Mean Radius (GMR)
-        if number_of_conductors == 4:
-            bundle_GMR = (conductor_GMR * (distance_between_conductors ** 3) * math.sqrt(2)) ** (1/4)  # in m
-            r_eq_bundle = (conductor_radius * (distance_between_conductors ** 3) * math.sqrt(2)) ** (1/4)  # in m
-        else:
-            bundle_GMR = (conductor_GMR * (distance_between_conductors ** (number_of_conductors - 1))) ** (1/number_of_conductors)  # in m
-            r_eq_bundle = (conductor_radius * (distance_between_conductors ** (number_of_conductors - 1))) ** (1/number_of_conductors) # in m
-
-        # Compute distances between phases and GMD values
-        if self.tower_type.currentText() == "Type-1: Narrow Base Tower" or self.tower_type.currentText() == "Type-2: Single Circuit Delta Tower":
-            Dab = math.sqrt((y_coordinates_b - y_coordinates_a)**2 + (x_coordinates_b + (-x_coordinates_a))**2)
-            Dbc = math.sqrt((y_coordinates_c - y_coordinates_b)**2 + (x_coordinates_c - x_coordinates_b)**2)
-            Dca = math.sqrt((y_coordinates_a - y_coordinates_c)**2 + ((-x_coordinates_a) + x_coordinates_c)**2)
-            gmd = (Dab * Dbc * Dca) ** (1 / 3)
-        else:
-            if self.number_of_circuits.currentText() == "1":
-                Dab = math.sqrt((y_coordinates_a - y_coordinates_b)**2 + (x_coordinates_b - x_coordinates_a)**2)
-                Dbc = math.sqrt((y_coordinates_b - y_coordinates_c)**2 + (x_coordinates_c - x_coordinates_b)**2)
-                Dca = math.sqrt((y_coordinates_a - y_coordinates_c)**2 + (x_coordinates_a - x_coordinates_c)**2)
-                gmd = (Dab * Dbc * Dca) ** (1 / 3)
-            else: # For double circuit
-                #self gmr of phase a,b,c to find new equivalent gmr
-                Dsa = math.sqrt(bundle_GMR * (math.sqrt((y_coordinates_a - y_coordinates_a_2)**2 + (x_coordinates_a - x_coordinates_a_2)**2)))
-                Dsb = math.sqrt(bundle_GMR * (math.sqrt((y_coordinates_b - y_coordinates_b_2)**2 + (x_coordinates_b - x_coordinates_b_2)**2)))
-                Dsc = math.sqrt(bundle_GMR * (math.sqrt((y_coordinates_c - y_coordinates_c_2)**2 + (x_coordinates_c - x_coordinates_c_2)**2)))
-                bundle_GMR = (Dsa * Dsb * Dsc) ** (1/3)
-                Dsa_r = math.sqrt(r_eq_bundle * (math.sqrt((y_coordinates_a - y_coordinates_a_2)**2 + (x_coordinates_a - x_coordinates_a_2)**2)))
-                Dsb_r = math.sqrt(r_eq_bundle * (math.sqrt((y_coordinates_b - y_coordinates_b_2)**2 + (x_coordinates_b - x_coordinates_b_2)**2)))
-                Dsc_r = math.sqrt(r_eq_bundle * (math.sqrt((y_coordinates_c - y_coordinates_c_2)**2 + (x_coordinates_c - x_coordinates_c_2)**2)))
-                r_eq_bundle = (Dsa_r * Dsb_r * Dsc_r) ** (1/3)
-
-                #mutual GMDs of ab, bc, ca to find GMD    (ab distance * ab' distance)^1/2 etc
-                Dab = math.sqrt(math.sqrt((y_coordinates_a - y_coordinates_b)**2 + (x_coordinates_b - x_coordinates_a)**2) * math.sqrt((y_coordinates_a - y_coordinates_b_2)**2 + (x_coordinates_a - x_coordinates_b_2)**2))
-                Dbc = math.sqrt(math.sqrt((y_coordinates_b - y_coordinates_c)**2 + (x_coordinates_c - x_coordinates_b)**2) * math.sqrt((y_coordinates_b - y_coordinates_c_2)**2 + (x_coordinates_b - x_coordinates_c_2)**2))
-                Dca = math.sqrt(math.sqrt((y_coordinates_a - y_coordinates_c)**2 + (x_coordinates_c - x_coordinates_a)**2) * math.sqrt((y_coordinates_a - y_coordinates_c_2)**2 + (x_coordinates_a - x_coordinates_c_2)**2))
-                gmd = (Dab * Dbc * Dca) ** (1 / 3)
-
-        # Calculate parameters
-        R = conductor_resistance / number_of_conductors  # Resistance in ohms per km
-        L = (2e-7) * math.log(gmd / bundle_GMR) * 1e3  # Inductance in mH per meter
-        C = (2 * math.pi * 8.854e-12) / math.log(gmd / bundle_GMR) * 1e6  # Capacitance in µF per meter
-
-        # Calculate total parameters for the line length
-        total_R = R * line_length_km
-        total_L = L * line_length_km *1000 # since L is per meter and line length is in km
-        total_C = C * line_length_km *1000 # since C is per meter and line length is in km
-
-        # Calculate the capacity of the line       
-        if self.tower_type.currentText() == "Type-1: Narrow Base Tower":
-            output_capacity = math.sqrt(3) * conductor_capacity * number_of_conductors * 66000 / 1000000 # in MVA
-        elif self.tower_type.currentText() == "Type-2: Single Circuit Delta Tower":
-            output_capacity = math.sqrt(3) * conductor_capacity * number_of_conductors * 400000 / 1000000 # in MVA
-        elif self.tower_type.currentText() == "Type-3: Double Circuit Vertical Tower" and self.number_of_circuits.currentText() == "1":
-            output_capacity = math.sqrt(3) * conductor_capacity * number_of_conductors * 154000 / 1000000 # in MVA
-        else:
-            output_capacity = math.sqrt(3) * conductor_capacity * number_of_conductors * 2 * 154000 / 1000000 # in MVA for double circuit (*2) since there are 2 parallel circuits
+        with timings.run("calculation"):
+            # Set the input values for calculation
+            with timings.stage("read_inputs"):
+                inputs = self.read_inputs()
+
+            # The calculation itself is done by the vectorized engine
+            results = calculate(inputs)
+            with timings.stage("display"):
+                self.show_results(results, inputs["line_length"])
+        self.last_calculation = (inputs, results)
+        self.show_diagnostics()
+
+    def show_results(self, results, line_length_km):
+        # Totals are rescaled from the per-length values, so a new line length needs no recalculation
+        total_R = float(results["R"]) * line_length_km
+        total_L = float(results["L"]) * line_length_km * 1000  # since L is per meter and line length is in km
+        total_C = float(results["C"]) * line_length_km * 1000  # since C is per meter and line length is in km
+        output_capacity = float(results["capacity"])
 
         # Display the results
         self.output_R.setText(f"{total_R:.5f}")
@@ -593,12 +657,223 @@ class TransmissionLineGUI(QMainWindow):
         self.output_C.setText(f"{total_C:.5f}")
         self.output_capacity.setText(f"{output_capacity:.3f}")
 
+    def show_not_available(self):
+        for output in [self.output_R, self.output_L, self.output_C, self.output_capacity]:
+            output.setText("N/A")
+        self.last_calculation = None
+
+    def schedule_live_calculation(self):
+        if self.live_calculation.isChecked():
+            self.live_timer.start()  # restarting the timer debounces the keystrokes
+
+    def live_calculate(self):
+        # Validates without dialogs; only a changed line length is handled here, everything else
+        # goes to the worker thread (the geometry cache keeps the GMD when only the bundle changes)
+        if self.form_error_code() != 0:
+            self.live_generation += 1  # drop the result of a calculation still running
+            self.show_not_available()
+            return
+        inputs = self.read_inputs()
+
+        geometry = {name: value for name, value in inputs.items() if name != "line_length"}
+        if self.live_inputs == geometry:
+            self.show_results(self.live_results, inputs["line_length"])
+            self.last_calculation = (inputs, self.live_results)
+            return
+
+        self.live_generation += 1
+        self.live_worker = CalculationWorker(self.live_generation, inputs)
+        self.live_worker.signals.finished.connect(self.live_finished)
+        self.thread_pool.start(self.live_worker)
+
+    def live_finished(self, generation, results, breakdown):
+        if generation != self.live_generation:
+            return  # the inputs changed while this calculation was running
+        if results is None:
+            self.show_not_available()
+            return
+        inputs = self.live_worker.inputs
+        self.live_inputs = {name: value for name, value in inputs.items() if name != "line_length"}
+        self.live_results = results
+        self.show_diagnostics(breakdown)
+        self.live_calculate()  # picks up a line length typed in the meantime
+
+    def create_plot(self):
+        # plot_panel is only loaded when the plot is first shown
+        from plot_panel import ScatterPlot
+        self.plot = ScatterPlot()
+        self.plot_layout.addWidget(self.plot, 2, 0, 1, 4)
+        self.plot.point_hovered.connect(self.show_sweep_design)
+        self.plot.point_clicked.connect(self.load_sweep_design)
+        self.update_plot_axes()
+
+    def toggle_plot(self, checked):
+        if checked and self.plot is None:
+            self.create_plot()
+        self.plot_frame.setVisible(checked)
+        if checked:
+            self.resize(max(self.width(), self.sizeHint().width()), self.height())
+
+    def update_plot_axes(self):
+        if self.plot is None:
+            return
+        x_name = self.plot_x.currentData()
+        categories = bundle_categories() if x_name == "conductor_bundle" else None
+        self.plot.set_axes(x_name, self.plot_y.currentData(), self.plot_x.currentText(),
+                           self.plot_y.currentText(), categories)
+
+    def run_sweep(self):
+        if self.sweep_worker is not None:
+            self.sweep_worker.cancelled = True
+        self.sweep_generation += 1
+        self.sweep_design = (self.tower_type.currentText(), int(self.number_of_circuits.currentText()))
+        if self.plot is None:
+            self.create_plot()
+        self.plot.clear()
+        self.plot.reserve(int(self.plot_samples.currentText()))
+        self.update_plot_axes()
+        self.plot_readout.setText("Calculating ...")
+        self.sweep_worker = SweepWorker(self.sweep_generation, *self.sweep_design, int(self.plot_samples.currentText()))
+        self.sweep_worker.signals.block.connect(self.sweep_block)
+        self.sweep_worker.signals.finished.connect(self.sweep_finished)
+        QThreadPool.globalInstance().start(self.sweep_worker)
+
+    def sweep_block(self, generation, columns):
+        if generation == self.sweep_generation:
+            self.plot.append(columns)
+            if self.plot.hover < 0:
+                self.plot_readout.setText(f"Calculating ... {self.plot.count} designs")
+
+    def sweep_finished(self, generation, designs):
+        if generation == self.sweep_generation:
+            self.sweep_worker = None
+            if self.plot.hover < 0:
+                self.plot_readout.setText(f"{designs} designs. Hover over a point to see its design, "
+                                          f"click to load it.")
+
+    def show_sweep_design(self, row):
+        if row < 0:
+            self.plot_readout.setText(f"{self.plot.count} designs. Hover over a point to see its design, "
+                                      f"click to load it.")
+            return
+        value = lambda name: self.plot.value(name, row)
+        names = phase_coordinates + (phase_coordinates_2 if self.sweep_design[1] == 2 else [])
+        phases = ", ".join(f"{label} ({value(x):g}, {value(y):g})"
+                           for label, x, y in zip(["A", "B", "C", "A'", "B'", "C'"], names[0::2], names[1::2]))
+        self.plot_readout.setText(
+            f"L {value('L_per_km'):.5f} mH/km, C {value('C_per_km'):.5f} µF/km, R {value('R_per_km'):.5f} Ω/km, "
+            f"{value('capacity'):.1f} MVA\n{catalog.names[int(value('conductor_type'))]} "
+            f"×{int(value('number_of_conductors'))} at {value('distance_between_conductors'):g} cm, "
+            f"phases {phases}")
+
+    def load_sweep_design(self, row):
+        # Puts the design of a plot point into the input fields and calculates it
+        tower_type, circuits = self.sweep_design
+        self.tower_type.setCurrentText(tower_type)
+        self.number_of_circuits.setCurrentText(str(circuits))
+        names = phase_coordinates + (phase_coordinates_2 if circuits == 2 else [])
+        for name in names:
+            self.input_fields[name].setText(f"{self.plot.value(name, row):g}")
+        self.number_of_conductors.setText(str(int(self.plot.value("number_of_conductors", row))))
+        self.distance_between_conductors.setText(f"{self.plot.value('distance_between_conductors', row):g}")
+        self.conductor_type.setCurrentIndex(int(self.plot.value("conductor_type", row)))
+        if self.line_length.text():
+            self.calculate_parameters()
+        else:
+            self.line_length.setFocus()
+
+    def closeEvent(self, event):
+        if self.sweep_worker is not None:
+            self.sweep_worker.cancelled = True
+        super().closeEvent(event)
+
+    def export_result(self):
+        if self.last_calculation is None:
+            QMessageBox.information(self, "Export Result", "Calculate a design first.")
+            return
+        from result_table import ResultTable  # the export modules load with the first export
+        self.export_table(ResultTable.from_calculation(*self.last_calculation), "Export Result", "design")
+
+    def export_sweep(self):
+        if self.plot is None or self.plot.count == 0:
+            QMessageBox.information(self, "Export Sweep", "Run a sweep first.")
+            return
+        # views of the plotted columns (the rows calculated so far), nothing is copied
+        columns = {name: values[:self.plot.count] for name, values in self.plot.columns.items()
+                   if name != "conductor_bundle"}
+        tower_type, circuits = self.sweep_design
+        columns["tower_type"] = np.full(self.plot.count, tower_type_index(tower_type), dtype=np.int32)
+        columns["number_of_circuits"] = np.full(self.plot.count, circuits)
+        from result_table import ResultTable
+        self.export_table(ResultTable(columns), "Export Sweep", "sweep")
+
+    def export_table(self, table, title, name):
+        path, selected = QFileDialog.getSaveFileName(self, title, f"{name}.parquet", ";;".join(export_filters))
+        if not path:
+            return
+        if not path.endswith(tuple(export_filters.values())):
+            path += export_filters.get(selected, ".parquet")
+        worker = ExportWorker(table, path)
+        worker.signals.finished.connect(self.export_finished)
+        self.export_workers.add(worker)  # kept alive until its signal arrived
+        QThreadPool.globalInstance().start(worker)
+
+    def export_finished(self, path, rows, error):
+        self.export_workers = {worker for worker in self.export_workers if worker.path != path}
+        if error:
+            QMessageBox.critical(self, "Export", f"Could not write {path}:\n{error}")
+        else:
+            QMessageBox.information(self, "Export", f"{rows} designs written to {path}.")
+
+    def toggle_diagnostics(self, checked):
+        timings.enable(checked)
+        self.diagnostics_panel.setVisible(checked)
+        if checked:
+            self.diagnostics_panel.setText("Stage timings appear after the next calculation.")
+
+    def show_diagnostics(self, breakdown=None):
+        # breakdown of a run of another thread, otherwise the last run of the GUI thread
+        breakdown = timings.last_run if breakdown is None else breakdown
+        if self.diagnostics.isChecked() and breakdown:
+            self.diagnostics_panel.setText(last_run_report(breakdown))
+
+def process_start():
+    # (perf_counter() value at the start, what it is): the timestamp of the launcher
+    # (TRANSMISSION_LINE_LAUNCH_TIME, seconds since the epoch, e.g. from `date +%s.%N`), else the
+    # start of this process from /proc (Linux, 10 ms resolution), else the import of this module
+    launched = os.environ.get("TRANSMISSION_LINE_LAUNCH_TIME")
+    if launched:
+        return time.perf_counter() - (time.time() - float(launched)), "launch"
+    try:
+        with open("/proc/self/stat") as file:
+            fields = file.read().rpartition(")")[2].split()
+        started = int(fields[19]) / os.sysconf("SC_CLK_TCK")  # starttime, s after boot
+        return time.perf_counter() - (time.clock_gettime(time.CLOCK_BOOTTIME) - started), "process start"
+    except (OSError, ValueError, IndexError, AttributeError):
+        return module_start, "module import"
+
+def startup_timing(app):
+    # Reports time-to-first-window and time-to-first-result, then quits
+    start, reference = process_start()
+    def first_window():
+        first_window_time = time.perf_counter() - start
+        # first result: a Type-1 sample design
+        calculate_line_parameters("Type-1: Narrow Base Tower", -3, 30, 3, 30, 3, 35, 2, 40, catalog.names[0], 100,
+                                  cache=geometry_cache)
+        first_result_time = time.perf_counter() - start
+        print(f"time to first window: {first_window_time * 1000:.1f} ms (from {reference})")
+        print(f"time to first result: {first_result_time * 1000:.1f} ms (from {reference})")
+        app.quit()
+    QTimer.singleShot(0, first_window)
+
 if __name__ == "__main__":
-    app = QApplication([])
+    app = QApplication(sys.argv)
 
     #set dark mode
     set_dark_theme(app)
 
     window = TransmissionLineGUI()
     window.show()
+    if "--startup-timing" in sys.argv:
+        startup_timing(app)
     app.exec()
@@ -0,0 +1,286 @@
+import argparse
+import csv
+import itertools
+import sys
+import time
+
+import numpy as np
+
+from calculation_engine import tower_types, phase_coordinates, phase_coordinates_2, calculate_line_parameters
+from conductor_catalog import catalog
+from geometry_cache import GeometryCache
+from input_validation import validate_designs, describe_errors
+from instrumentation import timings, profiled
+
+# Batch mode: reads design cases from CSV/Parquet in chunks, validates and calculates them with the
+# engine and streams the results out. Only one chunk is held in memory at a time and Qt is never imported.
+
+result_columns = ["total_R", "total_L", "total_C", "capacity"]
+default_chunk_size = 100000
+
+
+def read_chunks(path, chunk_size=default_chunk_size):
+    # Yields dicts of column arrays with at most chunk_size rows
+    if path.endswith(".parquet"):
+        import pyarrow.parquet as pq
+        for batch in pq.ParquetFile(path).iter_batches(batch_size=chunk_size):
+            yield {name: batch.column(i).to_numpy(zero_copy_only=False) for i, name in enumerate(batch.schema.names)}
+        return
+    if path.endswith((".arrow", ".feather")):
+        import pyarrow as pa
+        reader = pa.ipc.open_file(pa.memory_map(path))
+        for i in range(reader.num_record_batches):
+            batch = reader.get_batch(i)
+            for start in range(0, batch.num_rows, chunk_size):
+                part = batch.slice(start, chunk_size)
+                yield {name: part.column(k).to_numpy(zero_copy_only=False) for k, name in enumerate(part.schema.names)}
+        return
+
+    with (sys.stdin if path == "-" else open(path, newline="")) as file:
+        reader = csv.reader(file)
+        header = [name.strip() for name in next(reader)]
+        while True:
+            rows = list(itertools.islice(reader, chunk_size))
+            if not rows:
+                break
+            yield {name: np.array(column) for name, column in zip(header, zip(*rows))}
+
+
+def _float_or_nan(value):
+    try:
+        return float(value)
+    except (TypeError, ValueError):
+        return np.nan
+
+
+def parse_float(values, size):
+    # Float column of a chunk (None for a missing column); cells that are not numbers become NaN
+    if values is None:
+        return np.full(size, np.nan)
+    values = np.asarray(values)
+    if values.dtype.kind == "U":
+        # empty cells (such as the unused second circuit columns of single circuit rows) stay NaN,
+        # only the filled ones are converted
+        filled = values != ""
+        parsed = np.full(values.shape, np.nan)
+        try:
+            parsed[filled] = values[filled].astype(float)
+            return parsed
+        except ValueError:
+            pass
+    else:
+        try:
+            return values.astype(float)
+        except (TypeError, ValueError):
+            pass
+    # text that is not a number becomes NaN and is rejected by the validation
+    return np.array([_float_or_nan(value) for value in values.tolist()])
+
+
+def _name_text(value):
+    # Text of one cell of an object column; None and NaN (empty Parquet/Arrow cells) give ""
+    if value is None:
+        return ""
+    if isinstance(value, (float, np.floating)):
+        return str(int(value)) if np.isfinite(value) and value == int(value) else ""
+    return str(value)
+
+
+def _parse_names(values, names):
+    # Maps names (or 1-based numbers such as "3" for Type-3) to indices, -1 for unknown entries
+    values = np.asarray(values)
+    if values.dtype.kind in "iuf":
+        # NaN (an empty Parquet/Arrow cell) and fractional numbers become "" and so unknown
+        numbers = values.astype(float)
+        whole = np.isfinite(numbers) & (numbers == np.trunc(numbers))
+        values = np.where(whole, np.where(whole, numbers, 0).astype(np.int64).astype(str), "")
+    elif values.dtype.kind == "O":
+        values = np.array([_name_text(value) for value in values.tolist()], dtype=str).reshape(values.shape)
+    lookup = names if isinstance(names, dict) else {name: i for i, name in enumerate(names)}
+    unique, inverse = np.unique(values, return_inverse=True)
+    codes = np.full(len(unique), -1, dtype=np.intp)
+    for i, value in enumerate(unique.tolist()):
+        text = str(value).strip()
+        if text in lookup:
+            codes[i] = lookup[text]
+        elif text.isdigit() and 1 <= int(text) <= len(lookup):
+            codes[i] = int(text) - 1
+    return codes[inverse].reshape(values.shape)
+
+
+@timings.timed("parse")
+def parse_design_columns(columns):
+    # Parses raw design columns (strings or numbers) into engine inputs and validates them.
+    # Returns (inputs, error codes); tower and conductor types become indices (-1 when unknown).
+    size = len(next(iter(columns.values())))
+    circuits = parse_float(columns.get("number_of_circuits", np.ones(size)), size)
+    inputs = {
+        "tower_type": _parse_names(columns.get("tower_type", np.full(size, "")), tower_types),
+        "conductor_type": _parse_names(columns.get("conductor_type", np.full(size, "")), catalog.lookup),
+        "number_of_circuits": np.where(np.isnan(circuits), 1, circuits),
+        "number_of_conductors": parse_float(columns.get("number_of_conductors"), size),
+        "distance_between_conductors": parse_float(columns.get("distance_between_conductors"), size),
+        "line_length": parse_float(columns.get("line_length"), size),
+    }
+    for name in phase_coordinates + phase_coordinates_2:
+        inputs[name] = parse_float(columns.get(name), size)
+
+    with timings.stage("validate"):
+        codes = validate_designs(inputs["tower_type"], inputs["number_of_circuits"], inputs["number_of_conductors"],
+                                 inputs["distance_between_conductors"], inputs["line_length"],
+                                 inputs["conductor_type"], inputs)
+    return inputs, codes
+
+
+def select_rows(inputs, rows):
+    # Engine inputs of the selected (valid) rows, with the integer columns converted
+    selected = {name: values[rows] for name, values in inputs.items()}
+    selected["number_of_circuits"] = selected["number_of_circuits"].astype(int)
+    selected["number_of_conductors"] = selected["number_of_conductors"].astype(int)
+    return selected
+
+
+@timings.timed("process_chunk")
+def process_chunk(columns, cache=None, store=None):
+    # Validates and calculates one chunk, returns the columns with the results and error codes added.
+    # An optional GeometryCache is reused across chunks; with a ResultStore (result_store.py) the
+    # designs calculated before are read from it and the new ones are added.
+    inputs, codes = parse_design_columns(columns)
+    ok = codes == 0
+
+    results = {name: np.full(len(codes), np.nan) for name in result_columns}
+    if ok.any():
+        calculate = calculate_line_parameters if store is None else store.calculate
+        calculated = calculate(**select_rows(inputs, ok), cache=cache)
+        for name in result_columns:
+            results[name][ok] = calculated[name]
+
+    output = dict(columns)
+    output.update(results)
+    output["error_code"] = codes
+    with timings.stage("describe_errors"):
+        output["errors"] = np.array(["; ".join(describe_errors(code)) if code else "" for code in codes.tolist()])
+    return output
+
+
+class _CsvWriter:
+    def __init__(self, path):
+        self.file = sys.stdout if path == "-" else open(path, "w", newline="")
+        self.writer = csv.writer(self.file)
+        self.header = None
+
+    def write(self, columns):
+        if self.header is None:
+            self.header = list(columns)
+            self.writer.writerow(self.header)
+        self.writer.writerows(zip(*(np.asarray(columns[name]).tolist() for name in self.header)))
+
+    def close(self):
+        if self.file is not sys.stdout:
+            self.file.close()
+
+
+class _ParquetWriter:
+    def __init__(self, path):
+        import pyarrow as pa
+        import pyarrow.parquet as pq
+        self.pa, self.pq, self.path, self.writer = pa, pq, path, None
+
+    def write(self, columns):
+        table = self.pa.table({name: np.asarray(values) for name, values in columns.items()})
+        if self.writer is None:
+            self.writer = self.pq.ParquetWriter(self.path, table.schema)
+        self.writer.write_table(table.cast(self.writer.schema))
+
+    def close(self):
+        if self.writer is not None:
+            self.writer.close()
+
+
+class _ArrowWriter:
+    # Arrow IPC file (.arrow/.feather), one record batch per chunk
+    def __init__(self, path):
+        import pyarrow as pa
+        self.pa, self.path, self.writer, self.schema = pa, path, None, None
+
+    def write(self, columns):
+        table = self.pa.table({name: np.asarray(values) for name, values in columns.items()})
+        if self.writer is None:
+            self.schema = table.schema
+            self.writer = self.pa.ipc.new_file(self.path, self.schema)
+        self.writer.write_table(table.cast(self.schema))
+
+    def close(self):
+        if self.writer is not None:
+            self.writer.close()
+
+
+def open_writer(path):
+    # Chunked column writer for .parquet, Arrow IPC (.arrow/.feather) or CSV ('-' for stdout), with
+    # write(columns) and close()
+    if path.endswith(".parquet"):
+        return _ParquetWriter(path)
+    if path.endswith((".arrow", ".feather")):
+        return _ArrowWriter(path)
+    return _CsvWriter(path)
+
+
+def run_batch(input_path, output_path, chunk_size=default_chunk_size, cache=None, store=None):
+    # Streams input_path through the calculation into output_path, returns (rows, invalid rows)
+    writer = open_writer(output_path)
+    rows = invalid = 0
+    chunks = read_chunks(input_path, chunk_size)
+    try:
+        with timings.run("batch"):
+            while True:
+                with timings.stage("read"):
+                    columns = next(chunks, None)
+                if columns is None:
+                    break
+                output = process_chunk(columns, cache, store)
+                with timings.stage("write"):
+                    writer.write(output)
+                rows += len(output["error_code"])
+                invalid += int(np.count_nonzero(output["error_code"]))
+    finally:
+        writer.close()
+    return rows, invalid
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(
+        description="Calculate R, L, C and capacity for every design case of a CSV or Parquet file.")
+    parser.add_argument("input", help="input .csv/.parquet/.arrow file ('-' for CSV on stdin)")
+    parser.add_argument("output", help="output .csv/.parquet/.arrow file ('-' for CSV on stdout)")
+    parser.add_argument("--chunk-size", type=int, default=default_chunk_size, help="rows per chunk")
+    parser.add_argument("--geometry-cache", type=int, metavar="SIZE",
+                        help="reuse bundle/GMD terms of repeated geometries (LRU cache of SIZE entries)")
+    parser.add_argument("--result-store", metavar="PATH",
+                        help="read and keep the results in a persistent store (SQLite file, '-' for the default)")
+    parser.add_argument("--timings", action="store_true", help="print the time spent in every stage")
+    parser.add_argument("--profile", metavar="PATH", help="write a cProfile/pstats file of the run")
+    args = parser.parse_args(argv)
+
+    timings.enable(args.timings or timings.enabled)
+    cache = GeometryCache(args.geometry_cache) if args.geometry_cache else None
+    store = None
+    if args.result_store:
+        from result_store import ResultStore, default_store_path
+        store = ResultStore(default_store_path if args.result_store == "-" else args.result_store)
+    start = time.perf_counter()
+    with profiled(args.profile):
+        rows, invalid = run_batch(args.input, args.output, args.chunk_size, cache, store)
+    print(f"{rows} rows processed ({invalid} invalid) in {time.perf_counter() - start:.2f} s", file=sys.stderr)
+    if cache is not None:
+        for table, stats in cache.stats().items():
+            print(f"geometry cache {table}: {stats['size']} entries, hit rate {stats['hit_rate']:.1%}", file=sys.stderr)
+    if store is not None:
+        stats = store.stats()
+        print(f"result store: {stats['entries']} entries, hit rate {stats['hit_rate']:.1%}", file=sys.stderr)
+        store.close()
+    if timings.enabled:
+        print(timings.report(), file=sys.stderr)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,235 @@
+import argparse
+import json
+import math
+import os
+import platform
+import sys
+import tempfile
+import time
+
+import numpy as np
+
+from calculation_engine import limits, tower_types, phase_coordinates, phase_coordinates_2, calculate_line_parameters
+from conductor_catalog import catalog
+
+# Benchmarks of the calculation core with correctness checks against the original scalar
+# calculate_parameters math. Baselines are stored per machine tag; a run fails when a benchmark's
+# throughput drops more than the threshold below the baseline of the same machine.
+#
+#   python benchmark_suite.py                  run, check correctness, compare with the baseline
+#   python benchmark_suite.py --save-baseline  run and store the results as this machine's baseline
+#                                              (only a clean run, --force stores any run)
+
+default_baseline_file = os.path.join(os.path.dirname(os.path.abspath(__file__)), "benchmark_baselines.json")
+
+# Conductor data exactly as the original get_conductor_parameters had it
+reference_conductors = {
+    "Hawk": (21.793 * 10**(-3) / 2, 8.809 * 10**(-3), 0.132, 659),
+    "Drake": (28.143 * 10**(-3) / 2, 11.369 * 10**(-3), 0.080, 907),
+    "Cardinal": (30.378 * 10**(-3) / 2, 12.253 * 10**(-3), 0.067, 996),
+    "Rail": (29.591 * 10**(-3) / 2, 11.765 * 10**(-3), 0.068, 993),
+    "Pheasant": (35.103 * 10**(-3) / 2, 14.204 * 10**(-3), 0.051, 1187),
+}
+
+
+def reference_calculation(tower_type, number_of_circuits, number_of_conductors, distance_between_conductors,
+                          conductor_type, line_length_km, x_coordinates_a, y_coordinates_a, x_coordinates_b,
+                          y_coordinates_b, x_coordinates_c, y_coordinates_c, x_coordinates_a_2=0.0,
+                          y_coordinates_a_2=0.0, x_coordinates_b_2=0.0, y_coordinates_b_2=0.0,
+                          x_coordinates_c_2=0.0, y_coordinates_c_2=0.0):
+    # The scalar math of the original TransmissionLineGUI.calculate_parameters, kept frozen here
+    conductor_radius, conductor_GMR, conductor_resistance, conductor_capacity = reference_conductors[conductor_type]
+    distance_between_conductors = distance_between_conductors / 100
+    n = number_of_conductors
+    if n == 4:
+        bundle_GMR = (conductor_GMR * (distance_between_conductors ** 3) * math.sqrt(2)) ** (1/4)
+    else:
+        bundle_GMR = (conductor_GMR * (distance_between_conductors ** (n - 1))) ** (1/n)
+
+    if tower_type != "Type-3: Double Circuit Vertical Tower" or number_of_circuits == 1:
+        Dab = math.sqrt((y_coordinates_a - y_coordinates_b)**2 + (x_coordinates_b - x_coordinates_a)**2)
+        Dbc = math.sqrt((y_coordinates_b - y_coordinates_c)**2 + (x_coordinates_c - x_coordinates_b)**2)
+        Dca = math.sqrt((y_coordinates_a - y_coordinates_c)**2 + (x_coordinates_a - x_coordinates_c)**2)
+        gmd = (Dab * Dbc * Dca) ** (1 / 3)
+    else:
+        Dsa = math.sqrt(bundle_GMR * (math.sqrt((y_coordinates_a - y_coordinates_a_2)**2 + (x_coordinates_a - x_coordinates_a_2)**2)))
+        Dsb = math.sqrt(bundle_GMR * (math.sqrt((y_coordinates_b - y_coordinates_b_2)**2 + (x_coordinates_b - x_coordinates_b_2)**2)))
+        Dsc = math.sqrt(bundle_GMR * (math.sqrt((y_coordinates_c - y_coordinates_c_2)**2 + (x_coordinates_c - x_coordinates_c_2)**2)))
+        bundle_GMR = (Dsa * Dsb * Dsc) ** (1/3)
+        Dab = math.sqrt(math.sqrt((y_coordinates_a - y_coordinates_b)**2 + (x_coordinates_b - x_coordinates_a)**2) * math.sqrt((y_coordinates_a - y_coordinates_b_2)**2 + (x_coordinates_a - x_coordinates_b_2)**2))
+        Dbc = math.sqrt(math.sqrt((y_coordinates_b - y_coordinates_c)**2 + (x_coordinates_c - x_coordinates_b)**2) * math.sqrt((y_coordinates_b - y_coordinates_c_2)**2 + (x_coordinates_b - x_coordinates_c_2)**2))
+        Dca = math.sqrt(math.sqrt((y_coordinates_a - y_coordinates_c)**2 + (x_coordinates_c - x_coordinates_a)**2) * math.sqrt((y_coordinates_a - y_coordinates_c_2)**2 + (x_coordinates_a - x_coordinates_c_2)**2))
+        gmd = (Dab * Dbc * Dca) ** (1 / 3)
+
+    R = conductor_resistance / n
+    L = (2e-7) * math.log(gmd / bundle_GMR) * 1e3
+    C = (2 * math.pi * 8.854e-12) / math.log(gmd / bundle_GMR) * 1e6
+    voltage = {"Type-1: Narrow Base Tower": 66000, "Type-2: Single Circuit Delta Tower": 400000,
+               "Type-3: Double Circuit Vertical Tower": 154000}[tower_type]
+    capacity = math.sqrt(3) * conductor_capacity * n * number_of_circuits * voltage / 1000000
+    return R * line_length_km, L * line_length_km * 1000, C * line_length_km * 1000, capacity
+
+
+def random_designs(count, seed=0):
+    # Valid random designs of every tower type (a quarter of them double circuit Type-3), as columns
+    rng = np.random.default_rng(seed)
+    tower = rng.integers(len(tower_types), size=count)
+    circuits = np.where((tower == 2) & (rng.random(count) < 0.5), 2, 1)
+    columns = {"tower_type": tower, "number_of_circuits": circuits}
+    for name in phase_coordinates:
+        bounds = np.array([limits[t][name] for t in tower_types], dtype=float)
+        columns[name] = rng.uniform(bounds[tower, 0], bounds[tower, 1])
+        # the second circuit on the mirrored side
+        low, high = (-bounds[tower, 1], -bounds[tower, 0]) if name.startswith("x") else (bounds[tower, 0], bounds[tower, 1])
+        columns[name + "_2"] = np.where(circuits == 2, rng.uniform(low, high), np.nan)
+    bounds = np.array([limits[t]["number_of_conductors"] for t in tower_types])
+    columns["number_of_conductors"] = rng.integers(bounds[tower, 0], bounds[tower, 1] + 1)
+    columns["distance_between_conductors"] = rng.uniform(20, 60, count)
+    conductors = np.array([catalog.lookup[name] for name in reference_conductors])
+    columns["conductor_type"] = conductors[rng.integers(len(conductors), size=count)]
+    columns["line_length"] = rng.uniform(1, 500, count)
+    return columns
+
+
+def check_correctness(count=2000):
+    # Compares the engine with the frozen scalar math, and the displayed strings of the GUI
+    columns = random_designs(count, seed=1)
+    results = calculate_line_parameters(**columns)
+    failures = []
+    for i in range(count):
+        names = phase_coordinates + (phase_coordinates_2 if columns["number_of_circuits"][i] == 2 else [])
+        expected = reference_calculation(
+            tower_types[columns["tower_type"][i]], int(columns["number_of_circuits"][i]),
+            int(columns["number_of_conductors"][i]), float(columns["distance_between_conductors"][i]),
+            catalog.names[columns["conductor_type"][i]], float(columns["line_length"][i]),
+            **{name: float(columns[name][i]) for name in names})
+        got = [float(results[key][i]) for key in ("total_R", "total_L", "total_C", "capacity")]
+        formats = (".5f", ".5f", ".5f", ".3f")
+        for key, e, g, f in zip(("R", "L", "C", "MVA"), expected, got, formats):
+            if not math.isclose(e, g, rel_tol=1e-12) or format(e, f) != format(g, f):
+                failures.append(f"row {i} {key}: expected {e!r}, got {g!r}")
+    return failures
+
+
+def _throughput(function, items, repeat):
+    # Best items/s over `repeat` runs
+    best = math.inf
+    for _ in range(repeat):
+        start = time.perf_counter()
+        function()
+        best = min(best, time.perf_counter() - start)
+    return items / best
+
+
+def run_benchmarks(quick=False, repeat=5):
+    results = {}
+
+    # one GUI click: a single design per tower type and circuit count
+    single = {
+        "single_type1": ("Type-1: Narrow Base Tower", 1),
+        "single_type2": ("Type-2: Single Circuit Delta Tower", 1),
+        "single_type3": ("Type-3: Double Circuit Vertical Tower", 1),
+        "single_type3_double": ("Type-3: Double Circuit Vertical Tower", 2),
+    }
+    designs = random_designs(400, seed=2)
+    clicks = {}
+    for name, (tower, circuits) in single.items():
+        row = np.flatnonzero((np.asarray(tower_types)[designs["tower_type"]] == tower)
+                             & (designs["number_of_circuits"] == circuits))[0]
+        inputs = {key: values[row].item() for key, values in designs.items()}
+        inputs["tower_type"], inputs["conductor_type"] = tower, catalog.names[inputs["conductor_type"]]
+        clicks[name] = inputs
+        calls = 2000
+        results[name] = _throughput(lambda: [calculate_line_parameters(**inputs) for _ in range(calls)], calls, repeat)
+
+    # batched evaluation
+    for size in ([1000, 100000] if quick else [1000, 100000, 1000000]):
+        designs = random_designs(size, seed=3)
+        results[f"batch_{size}"] = _throughput(lambda: calculate_line_parameters(**designs), size, repeat)
+
+    # warm result store: the GUI click and a batch again, served from the store instead of the engine
+    from result_store import ResultStore
+    with tempfile.TemporaryDirectory() as directory:
+        store = ResultStore(os.path.join(directory, "results.sqlite3"))
+        inputs = clicks["single_type1"]
+        store.calculate(**inputs)
+        calls = 2000
+        results["store_single_warm"] = _throughput(lambda: [store.calculate(**inputs) for _ in range(calls)],
+                                                   calls, repeat)
+        designs = random_designs(100000, seed=3)
+        store.calculate(**designs)
+        results["store_batch_100000_warm"] = _throughput(lambda: store.calculate(**designs), 100000, repeat)
+        store.close()
+
+    # conductor lookup by name, scalar and gathered for a million rows
+    names = catalog.names
+    results["conductor_lookup_scalar"] = _throughput(
+        lambda: [catalog.parameters(names[i % len(names)]) for i in range(10000)], 10000, repeat)
+    column = np.asarray(names)[np.random.default_rng(4).integers(len(names), size=1000000)]
+    results["conductor_lookup_batch"] = _throughput(lambda: catalog.parameters(column), len(column), repeat)
+
+    # sweep throughput (designs evaluated per second, single process)
+    from design_sweep import grid_sweep
+    points = 3 if quick else 4
+    evaluated = grid_sweep(1, points, workers=1)[1]["evaluated"]
+    results["sweep_grid"] = _throughput(lambda: grid_sweep(1, points, workers=1), evaluated, 1)
+    return results
+
+
+def machine_tag():
+    return (f"{platform.node()}-{platform.machine()}-{os.cpu_count()}cpu-"
+            f"py{sys.version_info[0]}.{sys.version_info[1]}-numpy{np.__version__}")
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Benchmarks and correctness checks of the calculation core")
+    parser.add_argument("--save-baseline", action="store_true", help="store this run as the machine's baseline")
+    parser.add_argument("--force", action="store_true",
+                        help="save the baseline even when the run failed the correctness check or regressed")
+    parser.add_argument("--baseline-file", default=default_baseline_file)
+    parser.add_argument("--threshold", type=float, default=0.25,
+                        help="allowed throughput drop against the baseline (fraction)")
+    parser.add_argument("--quick", action="store_true", help="skip the largest sizes")
+    parser.add_argument("--repeat", type=int, default=5)
+    args = parser.parse_args(argv)
+
+    failures = check_correctness()
+    print(f"correctness: {'OK' if not failures else f'{len(failures)} mismatches'}")
+    for failure in failures[:10]:
+        print("  " + failure)
+
+    results = run_benchmarks(args.quick, args.repeat)
+    tag = machine_tag()
+    baselines = {}
+    if os.path.exists(args.baseline_file):
+        with open(args.baseline_file) as file:
+            baselines = json.load(file)
+    baseline = baselines.get(tag, {})
+
+    regressions = []
+    print(f"machine: {tag}")
+    print(f"{'benchmark':28s} {'items/s':>14s} {'baseline':>14s} {'change':>8s}")
+    for name, value in results.items():
+        reference = baseline.get(name)
+        change = f"{value / reference - 1:+.1%}" if reference else ""
+        print(f"{name:28s} {value:14.1f} {reference or float('nan'):14.1f} {change:>8s}")
+        if reference and value < reference * (1 - args.threshold):
+            regressions.append(name)
+
+    if args.save_baseline and (failures or regressions) and not args.force:
+        print("baseline not saved: the run has correctness failures or regressions (--force saves it anyway)")
+    elif args.save_baseline:
+        baselines[tag] = results
+        with open(args.baseline_file, "w") as file:
+            json.dump(baselines, file, indent=2, sort_keys=True)
+        print(f"baseline saved to {args.baseline_file}")
+    elif not baseline:
+        print("no baseline for this machine, run with --save-baseline to store one")
+
+    if regressions:
+        print("throughput regressions: " + ", ".join(regressions))
+    return 1 if failures or regressions else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
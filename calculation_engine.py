@@ -0,0 +1,219 @@
+import math
+import numpy as np
+
+from conductor_catalog import catalog
+from instrumentation import timings
+
+# Legal input windows for every tower type (coordinates in m)
+limits = {
+    "Type-1: Narrow Base Tower": {
+        "x_coordinates_a": (-4.0, -2.2),
+        "y_coordinates_a": (23, 39),
+        "x_coordinates_b": (2.2, 4.0),
+        "y_coordinates_b": (23, 39),
+        "x_coordinates_c": (2.2, 4.0),
+        "y_coordinates_c": (23, 39),
+        "number_of_conductors": (1, 3)
+    },
+    "Type-2: Single Circuit Delta Tower": {
+        "x_coordinates_a": (-11.5, -9.4),
+        "y_coordinates_a": (38.25, 43),
+        "x_coordinates_b": (-8.9, 8.9),
+        "y_coordinates_b": (38.25, 43),
+        "x_coordinates_c": (9.4, 11.5),
+        "y_coordinates_c": (38.25, 43),
+        "number_of_conductors": (1,4)
+    },
+    "Type-3: Double Circuit Vertical Tower": {
+
+        "x_coordinates_a": (1.8, 5.35),
+        "y_coordinates_a": (36, 48.8),
+        "x_coordinates_b": (1.8, 5.35),
+        "y_coordinates_b": (36, 48.8),
+        "x_coordinates_c": (1.8, 5.35),
+        "y_coordinates_c": (36, 48.8),
+        "number_of_conductors": (1,3)
+    }
+}
+
+tower_types = list(limits)
+tower_voltages = np.array([66000, 400000, 154000], dtype=float)  # line-to-line voltage of each tower type in V
+
+# Version of the calculation; bump it whenever calculate_line_parameters gives different numbers,
+# stored results (result_store.py) of other versions are then no longer used
+engine_version = 1
+
+phase_coordinates = [
+    "x_coordinates_a", "y_coordinates_a", "x_coordinates_b", "y_coordinates_b",
+    "x_coordinates_c", "y_coordinates_c",
+]
+phase_coordinates_2 = [name + "_2" for name in phase_coordinates]
+
+_tower_index = {name: i for i, name in enumerate(tower_types)}
+
+
+def _to_index(values, lookup):
+    # Accepts integer codes or names (single value or array) and returns an int array
+    values = np.asarray(values)
+    if values.dtype.kind in "iu":
+        return values.astype(np.intp)
+    if values.ndim == 0:
+        name = values.item()
+        if name not in lookup:
+            raise ValueError(f"Unknown type: {name}")
+        return np.intp(lookup[name])
+    names, inverse = np.unique(values, return_inverse=True)
+    unknown = [name for name in names.tolist() if name not in lookup]
+    if unknown:
+        raise ValueError(f"Unknown type: {unknown[0]}")
+    return np.array([lookup[name] for name in names.tolist()], dtype=np.intp)[inverse].reshape(values.shape)
+
+
+def tower_type_index(values):
+    return _to_index(values, _tower_index)
+
+
+def conductor_type_index(values):
+    return catalog.index(values)
+
+
+def conductor_parameters(conductor_type):
+    # Returns (radius, GMR, ac resistance, current capacity) arrays for the given conductor(s)
+    return catalog.parameters(conductor_type)
+
+
+def bundle_radii(conductor_GMR, conductor_radius, number_of_conductors, distance_between_conductors):
+    # Bundle GMR and equivalent radius (m), spacing in m
+    n = np.asarray(number_of_conductors)
+    d = np.asarray(distance_between_conductors, dtype=float)
+    # the square bundle gets the extra sqrt(2) of its diagonal
+    factor = np.where(n == 4, d ** 3 * math.sqrt(2), d ** (n - 1))
+    bundle_GMR = (conductor_GMR * factor) ** (1 / n)
+    r_eq_bundle = (conductor_radius * factor) ** (1 / n)
+    return bundle_GMR, r_eq_bundle
+
+
+def _distance(xa, ya, xb, yb):
+    return np.sqrt((ya - yb)**2 + (xa - xb)**2)
+
+
+def phase_gmd(x_coordinates_a, y_coordinates_a, x_coordinates_b, y_coordinates_b,
+              x_coordinates_c, y_coordinates_c):
+    # GMD of a single three-phase circuit
+    Dab = _distance(x_coordinates_a, y_coordinates_a, x_coordinates_b, y_coordinates_b)
+    Dbc = _distance(x_coordinates_b, y_coordinates_b, x_coordinates_c, y_coordinates_c)
+    Dca = _distance(x_coordinates_c, y_coordinates_c, x_coordinates_a, y_coordinates_a)
+    return (Dab * Dbc * Dca) ** (1 / 3)
+
+
+def double_circuit_distances(x_coordinates_a, y_coordinates_a, x_coordinates_b, y_coordinates_b,
+                            x_coordinates_c, y_coordinates_c, x_coordinates_a_2, y_coordinates_a_2,
+                            x_coordinates_b_2, y_coordinates_b_2, x_coordinates_c_2, y_coordinates_c_2):
+    # Geometry terms of the double circuit: distances a-a', b-b', c-c' and the GMD
+    Daa = _distance(x_coordinates_a, y_coordinates_a, x_coordinates_a_2, y_coordinates_a_2)
+    Dbb = _distance(x_coordinates_b, y_coordinates_b, x_coordinates_b_2, y_coordinates_b_2)
+    Dcc = _distance(x_coordinates_c, y_coordinates_c, x_coordinates_c_2, y_coordinates_c_2)
+
+    #mutual GMDs of ab, bc, ca    (ab distance * ab' distance)^1/2 etc
+    Dab = np.sqrt(_distance(x_coordinates_a, y_coordinates_a, x_coordinates_b, y_coordinates_b)
+                  * _distance(x_coordinates_a, y_coordinates_a, x_coordinates_b_2, y_coordinates_b_2))
+    Dbc = np.sqrt(_distance(x_coordinates_b, y_coordinates_b, x_coordinates_c, y_coordinates_c)
+                  * _distance(x_coordinates_b, y_coordinates_b, x_coordinates_c_2, y_coordinates_c_2))
+    Dca = np.sqrt(_distance(x_coordinates_a, y_coordinates_a, x_coordinates_c, y_coordinates_c)
+                  * _distance(x_coordinates_a, y_coordinates_a, x_coordinates_c_2, y_coordinates_c_2))
+    gmd = (Dab * Dbc * Dca) ** (1 / 3)
+    return Daa, Dbb, Dcc, gmd
+
+
+def double_circuit_radii(bundle_GMR, r_eq_bundle, Daa, Dbb, Dcc):
+    # Equivalent GMR and equivalent radius of the double circuit (a-a', b-b', c-c' in parallel)
+    GMR = (np.sqrt(bundle_GMR * Daa) * np.sqrt(bundle_GMR * Dbb) * np.sqrt(bundle_GMR * Dcc)) ** (1 / 3)
+    r_eq = (np.sqrt(r_eq_bundle * Daa) * np.sqrt(r_eq_bundle * Dbb) * np.sqrt(r_eq_bundle * Dcc)) ** (1 / 3)
+    return GMR, r_eq
+
+
+def line_capacity(tower_type, number_of_circuits, number_of_conductors, current_capacity, voltage=None):
+    # Thermal capacity of the line in MVA, parallel circuits add up. The voltage (line-to-line, V)
+    # defaults to the one of the tower type.
+    if voltage is None:
+        voltage = tower_voltages[tower_type_index(tower_type)]
+    return math.sqrt(3) * current_capacity * number_of_conductors * number_of_circuits * voltage / 1000000
+
+
+@timings.timed("calculate")
+def calculate_line_parameters(tower_type, x_coordinates_a, y_coordinates_a, x_coordinates_b,
+                              y_coordinates_b, x_coordinates_c, y_coordinates_c,
+                              number_of_conductors, distance_between_conductors, conductor_type,
+                              line_length, number_of_circuits=1, x_coordinates_a_2=np.nan,
+                              y_coordinates_a_2=np.nan, x_coordinates_b_2=np.nan,
+                              y_coordinates_b_2=np.nan, x_coordinates_c_2=np.nan,
+                              y_coordinates_c_2=np.nan, cache=None, conductor_data=None):
+    # Vectorized version of the GUI calculation. Every argument may be a scalar or an array and
+    # they are broadcast together. Tower and conductor types are names or integer indices,
+    # distance_between_conductors is in cm and line_length in km.
+    # Returns a dict of arrays: total R (ohm), L (mH), C (uF) and capacity (MVA), plus the
+    # per-meter values and the GMD/GMR terms they came from.
+    # With a GeometryCache as `cache` the bundle and GMD terms are reused between calls.
+    # conductor_data = (radius, GMR, ac resistance, current capacity) replaces the catalog values
+    # of the conductor, e.g. to apply tolerances; the cache is not used then.
+    with timings.stage("inputs"):
+        tower = tower_type_index(tower_type)
+        conductor = conductor_type_index(conductor_type)
+        coordinates = np.broadcast_arrays(
+            *(np.asarray(c, dtype=float) for c in (
+                x_coordinates_a, y_coordinates_a, x_coordinates_b, y_coordinates_b, x_coordinates_c,
+                y_coordinates_c, x_coordinates_a_2, y_coordinates_a_2, x_coordinates_b_2,
+                y_coordinates_b_2, x_coordinates_c_2, y_coordinates_c_2)),
+            tower, conductor, np.asarray(number_of_conductors), np.asarray(number_of_circuits),
+            np.asarray(distance_between_conductors, dtype=float), np.asarray(line_length, dtype=float))
+        *coordinates, tower, conductor, number_of_conductors, number_of_circuits, distance, line_length_km = coordinates
+    timings.count("designs", tower.size)
+
+    with timings.stage("conductor"):
+        if conductor_data is None:
+            conductor_radius, conductor_GMR, conductor_resistance, current_capacity = conductor_parameters(conductor)
+        else:
+            conductor_radius, conductor_GMR, conductor_resistance, current_capacity = conductor_data
+            cache = None
+    distance = distance / 100  # Convert cm to m
+
+    with timings.stage("bundle_gmr"):
+        if cache is None:
+            bundle_GMR, r_eq_bundle = bundle_radii(conductor_GMR, conductor_radius, number_of_conductors, distance)
+        else:
+            bundle_GMR, r_eq_bundle = cache.bundle_radii(conductor, number_of_conductors, distance)
+    with timings.stage("gmd"):
+        gmd = phase_gmd(*coordinates[:6]) if cache is None else cache.phase_gmd(*coordinates[:6])
+
+    # Only the rows with a second circuit go through the double circuit formula
+    double = number_of_circuits == 2
+    if double.any():
+        with timings.stage("double_circuit"):
+            bundle_GMR = np.array(bundle_GMR, dtype=float)
+            r_eq_bundle = np.array(r_eq_bundle, dtype=float)
+            gmd = np.array(gmd, dtype=float)
+            distances = (double_circuit_distances if cache is None else cache.double_circuit_distances)
+            Daa, Dbb, Dcc, gmd[double] = distances(*(c[double] for c in coordinates))
+            bundle_GMR[double], r_eq_bundle[double] = double_circuit_radii(
+                bundle_GMR[double], r_eq_bundle[double], Daa, Dbb, Dcc)
+
+    # Calculate parameters
+    with timings.stage("rlc"):
+        R = conductor_resistance / number_of_conductors  # Resistance in ohms per km
+        L = (2e-7) * np.log(gmd / bundle_GMR) * 1e3  # Inductance in mH per meter
+        C = (2 * math.pi * 8.854e-12) / np.log(gmd / bundle_GMR) * 1e6  # Capacitance in µF per meter
+    with timings.stage("capacity"):
+        capacity = line_capacity(tower, number_of_circuits, number_of_conductors, current_capacity)
+
+    return {
+        "bundle_GMR": bundle_GMR,
+        "r_eq_bundle": r_eq_bundle,
+        "gmd": gmd,
+        "R": R,
+        "L": L,
+        "C": C,
+        "total_R": R * line_length_km,
+        "total_L": L * line_length_km * 1000,  # since L is per meter and line length is in km
+        "total_C": C * line_length_km * 1000,  # since C is per meter and line length is in km
+        "capacity": capacity,
+    }
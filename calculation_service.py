@@ -0,0 +1,303 @@
+import argparse
+import asyncio
+import collections
+import json
+import math
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+
+from batch_calculator import process_chunk, result_columns
+from geometry_cache import GeometryCache
+
+# Local HTTP/JSON calculation service. Designs use the column names of the batch mode input:
+#
+#   POST /calculate   {"tower_type": "Type-1: Narrow Base Tower", "x_coordinates_a": -3, ...}
+#                     or a list of such objects; answers with the results in the same shape
+#   GET  /metrics     latency percentiles, batch sizes and request counts
+#   GET  /health
+#
+# Requests that arrive together are coalesced into one micro-batch (up to max_batch designs or
+# max_delay seconds) and calculated in one vectorized call on a pool of worker processes that
+# lives as long as the service. A new batch is formed whenever a worker is free, so under load
+# the batches grow by themselves. The server only binds to localhost.
+
+default_port = 8750
+max_body = 16 * 1024 * 1024  # bytes
+status_texts = {200: "OK", 400: "Bad Request", 404: "Not Found", 405: "Method Not Allowed",
+                413: "Payload Too Large", 500: "Internal Server Error"}
+
+# geometry terms are kept between batches in every worker process
+_cache = GeometryCache()
+
+
+def _columns(designs):
+    # Design objects -> batch mode columns (strings, parsed and validated by process_chunk)
+    names = sorted({name for design in designs for name in design})
+    return {name: np.array(["" if design.get(name) is None else str(design.get(name)) for design in designs])
+            for name in names}
+
+
+def _worker_ready():
+    # No-op run once on every worker process when the service starts
+    return os.getpid()
+
+
+def _calculate(designs):
+    # Runs in a worker process: results of every design as JSON-ready dicts
+    output = process_chunk(_columns(designs), _cache)
+    results = []
+    for i in range(len(designs)):
+        result = {}
+        for name in result_columns:
+            value = float(output[name][i])
+            result[name] = value if math.isfinite(value) else None
+        result["error_code"] = int(output["error_code"][i])
+        result["errors"] = str(output["errors"][i])
+        results.append(result)
+    return results
+
+
+class LatencyMetrics:
+    # Rolling window of request latencies (s) and batch sizes
+    def __init__(self, window=10000):
+        self.latencies = collections.deque(maxlen=window)
+        self.batch_sizes = collections.deque(maxlen=window)
+        self.requests = 0
+        self.designs = 0
+        self.errors = 0
+        self.started = time.monotonic()
+
+    def record_request(self, latency, designs, error=False):
+        self.latencies.append(latency)
+        self.requests += 1
+        self.designs += designs
+        self.errors += bool(error)
+
+    def record_batch(self, size):
+        self.batch_sizes.append(size)
+
+    def summary(self):
+        latencies = np.array(self.latencies) * 1000
+        uptime = time.monotonic() - self.started
+        summary = {"requests": self.requests, "designs": self.designs, "errors": self.errors,
+                   "uptime_s": uptime, "requests_per_s": self.requests / uptime if uptime else 0.0}
+        if len(latencies):
+            p50, p95, p99 = np.percentile(latencies, [50, 95, 99])
+            summary["latency_ms"] = {"mean": float(latencies.mean()), "p50": float(p50), "p95": float(p95),
+                                     "p99": float(p99), "max": float(latencies.max())}
+        if self.batch_sizes:
+            summary["batch_size"] = {"batches": len(self.batch_sizes),
+                                     "mean": float(np.mean(self.batch_sizes)), "max": int(max(self.batch_sizes))}
+        return summary
+
+
+class MicroBatcher:
+    def __init__(self, executor, slots, max_batch=4096, max_delay=0.002, metrics=None):
+        self.executor = executor
+        self.slots = asyncio.Semaphore(slots)  # batches in flight, one per worker
+        self.max_batch = max_batch
+        self.max_delay = max_delay
+        self.metrics = metrics
+        self.queue = asyncio.Queue()
+        self.task = None
+
+    def start(self):
+        self.task = asyncio.get_running_loop().create_task(self._collect())
+
+    async def stop(self):
+        if self.task is not None:
+            self.task.cancel()
+            try:
+                await self.task
+            except asyncio.CancelledError:
+                pass
+
+    async def calculate(self, designs):
+        # Results of a list of designs, calculated together with the other queued requests
+        future = asyncio.get_running_loop().create_future()
+        await self.queue.put((designs, future))
+        return await future
+
+    async def _collect(self):
+        loop = asyncio.get_running_loop()
+        while True:
+            await self.slots.acquire()
+            batch = [await self.queue.get()]
+            size = len(batch[0][0])
+            deadline = loop.time() + self.max_delay
+            while size < self.max_batch:
+                try:
+                    item = self.queue.get_nowait()
+                except asyncio.QueueEmpty:
+                    timeout = deadline - loop.time()
+                    if timeout <= 0:
+                        break
+                    try:
+                        item = await asyncio.wait_for(self.queue.get(), timeout)
+                    except asyncio.TimeoutError:
+                        break
+                batch.append(item)
+                size += len(item[0])
+            loop.create_task(self._run(batch, size))
+
+    async def _run(self, batch, size):
+        designs = [design for item, _ in batch for design in item]
+        try:
+            results = await asyncio.get_running_loop().run_in_executor(self.executor, _calculate, designs)
+        except Exception as error:
+            for _, future in batch:
+                if not future.done():
+                    future.set_exception(error)
+        else:
+            start = 0
+            for item, future in batch:
+                if not future.done():
+                    future.set_result(results[start:start + len(item)])
+                start += len(item)
+        finally:
+            self.slots.release()
+        if self.metrics is not None:
+            self.metrics.record_batch(size)
+
+
+class CalculationService:
+    def __init__(self, host="127.0.0.1", port=default_port, workers=None, max_batch=4096, max_delay=0.002):
+        self.host = host
+        self.port = port
+        # workers=0 calculates on a thread of the service process instead of worker processes
+        self.workers = os.cpu_count() if workers is None else workers
+        self.max_batch = max_batch
+        self.max_delay = max_delay
+        self.metrics = LatencyMetrics()
+        self.executor = None
+        self.batcher = None
+        self.server = None
+
+    async def start(self):
+        if self.workers:
+            self.executor = ProcessPoolExecutor(max_workers=self.workers)
+            # start every worker process before the listening socket exists: workers forked later
+            # would inherit it and the open client connections, which then never see EOF
+            loop = asyncio.get_running_loop()
+            await asyncio.gather(*[loop.run_in_executor(self.executor, _worker_ready) for _ in range(self.workers)])
+        self.batcher = MicroBatcher(self.executor, max(self.workers, 1), self.max_batch, self.max_delay,
+                                    self.metrics)
+        self.batcher.start()
+        self.server = await asyncio.start_server(self._connection, self.host, self.port)
+        self.port = self.server.sockets[0].getsockname()[1]  # the chosen port when started with port 0
+        return self
+
+    async def stop(self):
+        if self.server is not None:
+            self.server.close()
+            await self.server.wait_closed()
+        if self.batcher is not None:
+            await self.batcher.stop()
+        if self.executor is not None:
+            self.executor.shutdown(cancel_futures=True)
+
+    async def serve_forever(self):
+        async with self.server:
+            await self.server.serve_forever()
+
+    async def _connection(self, reader, writer):
+        # HTTP/1.1 with keep-alive, one request at a time per connection
+        try:
+            while True:
+                request_line = await reader.readline()
+                if not request_line.strip():
+                    break
+                start = time.perf_counter()
+                method, path, version = (request_line.decode("latin-1").split() + ["", "", ""])[:3]
+                headers = {}
+                while True:
+                    line = await reader.readline()
+                    if line in (b"\r\n", b"\n", b""):
+                        break
+                    name, _, value = line.decode("latin-1").partition(":")
+                    headers[name.strip().lower()] = value.strip()
+
+                length = int(headers.get("content-length", 0) or 0)
+                if length > max_body:
+                    await self._respond(writer, 413, {"error": "request body too large"}, start, False)
+                    break
+                body = await reader.readexactly(length) if length else b""
+                keep_alive = (headers.get("connection", "").lower() != "close"
+                              and version.upper() != "HTTP/1.0")
+                status, payload, designs = await self._handle(method, path.split("?")[0], body)
+                await self._respond(writer, status, payload, start, keep_alive)
+                if path.split("?")[0] == "/calculate":
+                    self.metrics.record_request(time.perf_counter() - start, designs, status != 200)
+                if not keep_alive:
+                    break
+        except (ConnectionError, asyncio.IncompleteReadError, ValueError):
+            pass
+        finally:
+            writer.close()
+
+    async def _handle(self, method, path, body):
+        # (status, JSON payload, designs calculated)
+        if path == "/health":
+            return 200, {"status": "ok"}, 0
+        if path == "/metrics":
+            return 200, self.metrics.summary(), 0
+        if path != "/calculate":
+            return 404, {"error": f"unknown path {path}"}, 0
+        if method != "POST":
+            return 405, {"error": "use POST"}, 0
+        try:
+            request = json.loads(body)
+        except ValueError as error:
+            return 400, {"error": f"invalid JSON: {error}"}, 0
+        single = isinstance(request, dict)
+        designs = [request] if single else request
+        if not isinstance(designs, list) or not all(isinstance(design, dict) for design in designs):
+            return 400, {"error": "expected a design object or a list of design objects"}, 0
+        if not designs:
+            return 200, [], 0
+        try:
+            results = await self.batcher.calculate(designs)
+        except Exception as error:
+            return 500, {"error": str(error)}, len(designs)
+        return 200, results[0] if single else results, len(designs)
+
+    async def _respond(self, writer, status, payload, start, keep_alive):
+        body = json.dumps(payload).encode()
+        latency = (time.perf_counter() - start) * 1000
+        writer.write((f"HTTP/1.1 {status} {status_texts[status]}\r\n"
+                      f"Content-Type: application/json\r\n"
+                      f"Content-Length: {len(body)}\r\n"
+                      f"X-Latency-Ms: {latency:.3f}\r\n"
+                      f"Connection: {'keep-alive' if keep_alive else 'close'}\r\n\r\n").encode() + body)
+        await writer.drain()
+
+
+async def _serve(args):
+    service = await CalculationService(args.host, args.port, args.workers, args.max_batch,
+                                       args.max_delay / 1000).start()
+    print(f"Calculation service on http://{service.host}:{service.port} ({service.workers} workers)")
+    try:
+        await service.serve_forever()
+    finally:
+        await service.stop()
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Local HTTP/JSON service for the line parameter calculation")
+    parser.add_argument("--host", default="127.0.0.1", help="address to bind (localhost only by default)")
+    parser.add_argument("--port", type=int, default=default_port)
+    parser.add_argument("--workers", type=int, help="worker processes (0: calculate in the service process)")
+    parser.add_argument("--max-batch", type=int, default=4096, help="designs per micro-batch")
+    parser.add_argument("--max-delay", type=float, default=2.0, help="time to gather a micro-batch in ms")
+    args = parser.parse_args(argv)
+    try:
+        asyncio.run(_serve(args))
+    except KeyboardInterrupt:
+        pass
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,154 @@
+import csv
+import os
+import re
+
+import numpy as np
+
+# Conductor catalog: the conductor table is kept as one contiguous array per column with an
+# integer index per conductor, so batch code can gather parameters for millions of rows at once.
+# The table is read on first use. The shipped conductor_catalog.csv only lists the five ACSR
+# conductors of the original calculator; set CONDUCTOR_CATALOG to load a full manufacturer table
+# (the AAAC and ACCC families below are supported but not shipped).
+#
+# Columns of the table:
+#   name, family                 conductor code word and type (ACSR, AAAC, ACCC, ...)
+#   diameter_mm, gmr_mm          outer diameter and geometric mean radius in mm
+#   ac_resistance_<T>            AC resistance in ohm/km at T °C, one or more columns
+#   current_capacity             ampacity in A
+#
+# Optional mechanical columns (used by the sag-tension calculation, NaN when missing):
+#   area_mm2, mass_kg_per_km     total cross section in mm² and mass in kg/km
+#   modulus_gpa                  final modulus of elasticity in GPa
+#   expansion_per_k              coefficient of linear thermal expansion in 1/K
+#   rated_strength_kn            rated tensile strength in kN
+
+default_catalog_path = os.environ.get(
+    "CONDUCTOR_CATALOG", os.path.join(os.path.dirname(os.path.abspath(__file__)), "conductor_catalog.csv"))
+
+# Temperature constant of the conductor metal (R2/R1 = (T + t2) / (T + t1)), used when only one
+# resistance temperature is listed
+temperature_constants = {"ACSR": 228.1, "ACCC": 228.1, "AAAC": 257.8}
+mechanical_columns = ["area_mm2", "mass_kg_per_km", "modulus_gpa", "expansion_per_k", "rated_strength_kn"]
+design_temperature = 75.0  # conductor temperature of the resistance used by the calculator, in °C
+
+_resistance_column = re.compile(r"ac_resistance_(-?\d+(?:\.\d+)?)$")
+
+
+class ConductorCatalog:
+    def __init__(self, path=default_catalog_path):
+        self.path = path
+        self._columns = None
+        self._lookup = None
+
+    def _load(self):
+        with open(self.path, newline="") as file:
+            reader = csv.reader(file)
+            header = [name.strip() for name in next(reader)]
+            rows = [row for row in reader if row]
+        raw = {name: [row[i].strip() for row in rows] for i, name in enumerate(header)}
+
+        columns = {"name": np.array(raw["name"]), "family": np.array(raw.get("family", ["ACSR"] * len(rows)))}
+        for name in ("diameter_mm", "gmr_mm", "current_capacity"):
+            columns[name] = np.array(raw[name], dtype=float)
+        columns["radius"] = columns["diameter_mm"] * 10**(-3) / 2  # in m
+        columns["gmr"] = columns["gmr_mm"] * 10**(-3)  # in m
+        for name in mechanical_columns:
+            columns[name] = np.array([float(value) if value else np.nan
+                                      for value in raw.get(name, [""] * len(rows))])
+
+        # resistance columns sorted by temperature, stored as one (temperatures x conductors) block
+        temperatures = sorted((float(match.group(1)), name) for name in header
+                              if (match := _resistance_column.match(name)))
+        if not temperatures:
+            raise ValueError(f"{self.path}: no ac_resistance_<T> column")
+        columns["resistance_temperatures"] = np.array([t for t, _ in temperatures])
+        columns["ac_resistance_table"] = np.array([raw[name] for _, name in temperatures], dtype=float)
+        columns["temperature_constant"] = np.array(
+            [temperature_constants.get(family, 228.1) for family in columns["family"]])
+
+        lookup = {}
+        for i, name in enumerate(columns["name"].tolist()):
+            if name in lookup:
+                raise ValueError(f"{self.path}: conductor {name} listed twice")
+            lookup[name] = i
+        self._columns, self._lookup = columns, lookup
+
+    @property
+    def columns(self):
+        if self._columns is None:
+            self._load()
+        return self._columns
+
+    @property
+    def lookup(self):
+        # conductor name -> index
+        if self._lookup is None:
+            self._load()
+        return self._lookup
+
+    @property
+    def resistance_temperatures(self):
+        return self.columns["resistance_temperatures"]
+
+    @property
+    def names(self):
+        return self.columns["name"].tolist()
+
+    def __len__(self):
+        return len(self.columns["name"])
+
+    def __contains__(self, name):
+        return name in self.lookup
+
+    def index(self, conductor_type):
+        # Integer index of conductor name(s); integer input is returned unchanged
+        values = np.asarray(conductor_type)
+        if values.dtype.kind in "iu":
+            return values.astype(np.intp)
+        lookup = self.lookup
+        if values.ndim == 0:
+            name = values.item()
+            if name not in lookup:
+                raise ValueError(f"Unknown conductor type: {name}")
+            return np.intp(lookup[name])
+        names, inverse = np.unique(values, return_inverse=True)
+        unknown = [name for name in names.tolist() if name not in lookup]
+        if unknown:
+            raise ValueError(f"Unknown conductor type: {unknown[0]}")
+        return np.array([lookup[name] for name in names.tolist()], dtype=np.intp)[inverse].reshape(values.shape)
+
+    def gather(self, conductor_type, *names):
+        # Columns for the given conductor(s), e.g. gather(index, "radius", "gmr")
+        index = self.index(conductor_type)
+        return tuple(self.columns[name][index] for name in names)
+
+    def resistance_at(self, conductor_type, temperature):
+        # AC resistance in ohm/km at the conductor temperature(s) in °C. Interpolates linearly between
+        # the listed temperatures, a single listed temperature is scaled with the temperature constant.
+        index = self.index(conductor_type)
+        table = self.columns["ac_resistance_table"]
+        temperature = np.asarray(temperature, dtype=float)
+        if len(self.resistance_temperatures) == 1:
+            constant = self.columns["temperature_constant"][index]
+            t1 = self.resistance_temperatures[0]
+            return table[0][index] * (constant + temperature) / (constant + t1)
+        # linear inter/extrapolation on the segment the temperature falls into
+        k = np.clip(np.searchsorted(self.resistance_temperatures, temperature) - 1,
+                    0, len(self.resistance_temperatures) - 2)
+        t1, t2 = self.resistance_temperatures[k], self.resistance_temperatures[k + 1]
+        r1, r2 = table[k, index], table[k + 1, index]
+        return r1 + (r2 - r1) * (temperature - t1) / (t2 - t1)
+
+    def parameters(self, conductor_type):
+        # (radius in m, GMR in m, AC resistance at the design temperature in ohm/km, current capacity in A)
+        index = self.index(conductor_type)
+        columns = self.columns
+        listed = np.flatnonzero(columns["resistance_temperatures"] == design_temperature)
+        if len(listed):
+            resistance = columns["ac_resistance_table"][listed[0]][index]
+        else:
+            resistance = self.resistance_at(index, design_temperature)
+        return columns["radius"][index], columns["gmr"][index], resistance, columns["current_capacity"][index]
+
+
+catalog = ConductorCatalog()
@@ -0,0 +1,219 @@
+import argparse
+import math
+import sys
+import time
+
+import numpy as np
+
+from batch_calculator import read_chunks, open_writer, parse_design_columns, select_rows, default_chunk_size
+from calculation_engine import (phase_coordinates, phase_coordinates_2, tower_voltages, tower_type_index,
+                                double_circuit_distances)
+from conductor_catalog import catalog
+from impedance_matrix import epsilon_0, potential_coefficient_matrix, bundle_positions
+
+# Conductor surface gradient and corona onset with the sub-conductors of every bundle placed
+# explicitly on a ring (impedance_matrix.bundle_positions). The line charges of all
+# sub-conductors follow from the potential coefficients (ground as a mirror) and the phase
+# voltages; the surface gradient is the normal field of all charges and their images sampled
+# around every sub-conductor. Everything is batched over a stack of towers sharing the bundle
+# layout, corona_performance groups design rows by layout.
+#
+# Gradients are rms values in kV/cm, compared with Peek's visual onset gradient
+#   E_c = 21.2 m delta (1 + 0.301 / sqrt(delta r))   (r in cm)
+# Corona loss is a fair weather estimate with Peek's formula on the bundle equivalent radius.
+
+default_surface_factor = 0.82  # Peek's surface factor m of a stranded conductor
+surface_points = 24  # sampled angles around every sub-conductor
+chunk_elements = 4000000  # complex field terms evaluated at once
+
+
+def relative_air_density(temperature=20.0, elevation=0.0):
+    # delta at the air temperature (°C) and elevation (m), 1 at 20 °C and sea level
+    pressure = (1 - 2.25577e-5 * np.asarray(elevation, dtype=float)) ** 5.25588  # relative to sea level
+    return pressure * 293 / (273 + np.asarray(temperature, dtype=float))
+
+
+def peek_onset_gradient(radius, surface_factor=default_surface_factor, air_density=1.0):
+    # Visual corona onset gradient in kV/cm rms of a conductor of radius (m)
+    radius_cm = np.asarray(radius, dtype=float) * 100
+    return 21.2 * surface_factor * air_density * (1 + 0.301 / np.sqrt(air_density * radius_cm))
+
+
+def phase_voltages(voltage, number_of_phases, phase_angles=None):
+    # Line-to-ground rms phasors (V) of the phases for a line-to-line voltage (V); without angles
+    # every circuit has the a, b, c sequence 0, -120, 120 degrees
+    if phase_angles is None:
+        phase_angles = np.tile([0.0, -120.0, 120.0], number_of_phases // 3)
+    voltage = np.asarray(voltage, dtype=float)[..., None]
+    return voltage / math.sqrt(3) * np.exp(1j * np.radians(phase_angles))
+
+
+def sub_conductor_charges(x, y, radius, phases, voltages):
+    # Complex line charges (C/m) of the conductors (..., N) at the phase voltages (..., P)
+    coefficients = potential_coefficient_matrix(x, y, radius) * 1e3  # m/F
+    return np.linalg.solve(coefficients, voltages[..., phases][..., None])[..., 0]
+
+
+def surface_gradients(x, y, radius, charges, points=surface_points):
+    # Largest normal field (V/m rms) on the surface of each conductor (..., N)
+    radius = np.broadcast_to(np.asarray(radius, dtype=float), np.shape(x))
+    angles = 2 * math.pi * np.arange(points) / points
+    cos, sin = np.cos(angles), np.sin(angles)
+    surface_x = x[..., :, None] + radius[..., :, None] * cos  # (..., N, M)
+    surface_y = y[..., :, None] + radius[..., :, None] * sin
+
+    # the charges and their images below the ground plane
+    source_x = np.concatenate([x, x], axis=-1)[..., None, None, :]
+    source_y = np.concatenate([y, -y], axis=-1)[..., None, None, :]
+    source_q = np.concatenate([charges, -charges], axis=-1)[..., None, None, :]
+    dx = surface_x[..., None] - source_x
+    dy = surface_y[..., None] - source_y
+    normal = (dx * cos[:, None] + dy * sin[:, None]) / (dx * dx + dy * dy)
+    field = (source_q * normal).sum(axis=-1) / (2 * math.pi * epsilon_0)
+    return np.abs(field).max(axis=-1)
+
+
+def bundle_gradients(x_phases, y_phases, number_of_conductors, distance_between_conductors, radius,
+                     voltage, phase_angles=None, points=surface_points):
+    # Maximum surface gradient (kV/cm rms) of every phase for a stack of towers: phase positions
+    # (..., P) in m, bundle spacing (...) in m, conductor radius (...) in m, line-to-line voltage (V)
+    n = int(number_of_conductors)
+    x_phases = np.asarray(x_phases, dtype=float)
+    y_phases = np.asarray(y_phases, dtype=float)
+    number_of_phases = x_phases.shape[-1]
+    x, y = bundle_positions(x_phases, y_phases, n, distance_between_conductors)
+    radius = np.broadcast_to(np.asarray(radius, dtype=float)[..., None], x.shape)
+    phases = np.repeat(np.arange(number_of_phases), n)
+    voltages = phase_voltages(voltage, number_of_phases, phase_angles)
+    charges = sub_conductor_charges(x, y, radius, phases, voltages)
+    gradients = surface_gradients(x, y, radius, charges, points) / 1e5  # V/m -> kV/cm
+    return gradients.reshape(gradients.shape[:-1] + (number_of_phases, n)).max(axis=-1)
+
+
+def corona_loss(voltage, onset_voltage, equivalent_radius, gmd, air_density=1.0, frequency=50.0):
+    # Peek's fair weather corona loss in kW/km per phase; line-to-ground kV rms, radii/GMD in m
+    excess = np.maximum(np.asarray(voltage) - onset_voltage, 0.0)
+    return 241e-5 / air_density * (frequency + 25) * np.sqrt(equivalent_radius / gmd) * excess ** 2
+
+
+def _group_performance(x_phases, y_phases, n, spacing, radius, voltage, air_density, surface_factor,
+                       frequency, phase_angles, points):
+    # corona_performance for rows sharing the bundle count and number of phases, in chunks
+    rows, number_of_phases = x_phases.shape
+    conductors = number_of_phases * n
+    step = max(1, chunk_elements // (conductors * conductors * 2 * points))
+    gradients = np.empty((rows, number_of_phases))
+    for start in range(0, rows, step):
+        part = slice(start, start + step)
+        gradients[part] = bundle_gradients(x_phases[part], y_phases[part], n, spacing[part], radius[part],
+                                           voltage[part], phase_angles, points)
+
+    onset = peek_onset_gradient(radius, surface_factor, air_density)
+    phase_voltage = voltage[:, None] / math.sqrt(3) / 1000  # kV line-to-ground
+    onset_voltage = phase_voltage * onset[:, None] / gradients
+    # Peek's formula with the equivalent radius of the ring bundle and the GMD of the line, for two
+    # circuits the double circuit GMD of the engine (each phase pair with both circuits' phases)
+    ring = spacing / (2 * math.sin(math.pi / n)) if n > 1 else np.zeros_like(spacing)
+    equivalent_radius = (n * radius * ring ** (n - 1)) ** (1 / n)
+    if number_of_phases == 6:
+        gmd = double_circuit_distances(*(column for i in range(6) for column in (x_phases[:, i], y_phases[:, i])))[3]
+    else:
+        distances = [np.hypot(x_phases[:, i] - x_phases[:, j], y_phases[:, i] - y_phases[:, j])
+                     for i, j in ((0, 1), (1, 2), (2, 0))]
+        gmd = np.cbrt(distances[0] * distances[1] * distances[2])
+    loss = corona_loss(phase_voltage, onset_voltage, equivalent_radius[:, None], gmd[:, None],
+                       air_density[:, None], frequency).sum(axis=-1)
+    return gradients, onset, onset_voltage.min(axis=-1) * math.sqrt(3), loss
+
+
+def corona_performance(tower_type, x_coordinates_a, y_coordinates_a, x_coordinates_b, y_coordinates_b,
+                       x_coordinates_c, y_coordinates_c, number_of_conductors, distance_between_conductors,
+                       conductor_type, number_of_circuits=1, x_coordinates_a_2=np.nan, y_coordinates_a_2=np.nan,
+                       x_coordinates_b_2=np.nan, y_coordinates_b_2=np.nan, x_coordinates_c_2=np.nan,
+                       y_coordinates_c_2=np.nan, voltage=None, frequency=50.0, temperature=20.0, elevation=0.0,
+                       surface_factor=default_surface_factor, phase_angles=None, points=surface_points,
+                       line_length=None):
+    # Corona figures of design rows with the inputs of calculate_line_parameters (spacing in cm,
+    # line_length is ignored). voltage is line-to-line in V, the tower's voltage by default;
+    # phase_angles (degrees, 3 or 6 values) overrides the phase sequence.
+    # Returns a dict of arrays: max_gradient and onset_gradient (kV/cm rms), margin (onset over
+    # max gradient, below 1 means corona), phase_gradients (rows x 6, NaN without circuit 2),
+    # onset_voltage (kV line-to-line) and corona_loss (kW/km, all phases).
+    names = phase_coordinates + phase_coordinates_2
+    values = np.broadcast_arrays(
+        *(np.asarray(v, dtype=float) for v in (
+            x_coordinates_a, y_coordinates_a, x_coordinates_b, y_coordinates_b, x_coordinates_c,
+            y_coordinates_c, x_coordinates_a_2, y_coordinates_a_2, x_coordinates_b_2,
+            y_coordinates_b_2, x_coordinates_c_2, y_coordinates_c_2)),
+        tower_type_index(tower_type), catalog.index(conductor_type), np.asarray(number_of_conductors),
+        np.asarray(number_of_circuits), np.asarray(distance_between_conductors, dtype=float),
+        np.asarray(np.nan if voltage is None else voltage, dtype=float))
+    shape = values[0].shape
+    columns = dict(zip(names, (np.ravel(v) for v in values[:12])))
+    tower, conductor, n, circuits, spacing, voltage = (np.ravel(v) for v in values[12:])
+    voltage = np.where(np.isnan(voltage), tower_voltages[tower], voltage)
+    radius = catalog.gather(conductor, "radius")[0]
+    spacing = spacing / 100  # cm -> m
+    air_density = np.broadcast_to(relative_air_density(temperature, elevation), voltage.shape)
+
+    rows = len(voltage)
+    results = {"phase_gradients": np.full((rows, 6), np.nan)}
+    for name in ("onset_gradient", "onset_voltage", "corona_loss"):
+        results[name] = np.full(rows, np.nan)
+    for group_n, group_circuits in set(zip(n.tolist(), circuits.tolist())):
+        index = np.flatnonzero((n == group_n) & (circuits == group_circuits))
+        phase_count = 3 * int(group_circuits)
+        x_phases = np.column_stack([columns[name][index] for name in names[0:2 * phase_count:2]])
+        y_phases = np.column_stack([columns[name][index] for name in names[1:2 * phase_count:2]])
+        angles = None if phase_angles is None else np.asarray(phase_angles, dtype=float)[:phase_count]
+        gradients, onset, onset_voltage, loss = _group_performance(
+            x_phases, y_phases, int(group_n), spacing[index], radius[index], voltage[index], air_density[index],
+            surface_factor, frequency, angles, points)
+        results["phase_gradients"][index, :phase_count] = gradients
+        results["onset_gradient"][index] = onset
+        results["onset_voltage"][index] = onset_voltage
+        results["corona_loss"][index] = loss
+
+    results["max_gradient"] = np.nanmax(results["phase_gradients"], axis=-1)
+    results["margin"] = results["onset_gradient"] / results["max_gradient"]
+    return {name: value.reshape(shape + value.shape[1:]) for name, value in results.items()}
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Surface gradient, corona onset and corona loss of the designs in a CSV/Parquet file")
+    parser.add_argument("input", help="design table in the batch mode format (.csv/.parquet, '-' for CSV on stdin)")
+    parser.add_argument("output", help="output .csv/.parquet ('-' for CSV on stdout)")
+    parser.add_argument("--voltage", type=float, help="line-to-line voltage in kV (default: the tower's)")
+    parser.add_argument("--temperature", type=float, default=20.0, help="air temperature in °C")
+    parser.add_argument("--elevation", type=float, default=0.0, help="in m above sea level")
+    parser.add_argument("--surface-factor", type=float, default=default_surface_factor)
+    parser.add_argument("--chunk-size", type=int, default=default_chunk_size, help="rows per chunk")
+    args = parser.parse_args(argv)
+
+    start = time.perf_counter()
+    writer = open_writer(args.output)
+    rows = 0
+    try:
+        for columns in read_chunks(args.input, args.chunk_size):
+            inputs, codes = parse_design_columns(columns)
+            ok = codes == 0
+            output = dict(columns)
+            for name in ("max_gradient", "onset_gradient", "margin", "onset_voltage", "corona_loss"):
+                output[name] = np.full(len(codes), np.nan)
+            if ok.any():
+                results = corona_performance(**select_rows(inputs, ok),
+                                             voltage=args.voltage * 1000 if args.voltage else None,
+                                             temperature=args.temperature, elevation=args.elevation,
+                                             surface_factor=args.surface_factor)
+                for name in ("max_gradient", "onset_gradient", "margin", "onset_voltage", "corona_loss"):
+                    output[name][ok] = results[name]
+            output["error_code"] = codes
+            writer.write(output)
+            rows += len(codes)
+    finally:
+        writer.close()
+    print(f"{rows} rows processed in {time.perf_counter() - start:.2f} s", file=sys.stderr)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,275 @@
+import argparse
+import os
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+
+from calculation_engine import (limits, tower_types, phase_coordinates, phase_coordinates_2,
+                                tower_type_index, conductor_type_index, calculate_line_parameters)
+from conductor_catalog import catalog
+from instrumentation import timings, profiled, timed_task
+
+# Default objectives of the sweep: smallest inductance per km against the largest capacity
+default_objectives = (("L_per_km", "min"), ("capacity", "max"))
+default_spacings = (20.0, 30.0, 40.0, 50.0, 60.0)  # in cm
+chunk_size = 200000  # designs evaluated by a worker at once
+pareto_block = 1024  # rows compared at once by the Pareto filter of more than two objectives
+
+
+def design_axes(tower_type, number_of_circuits, points_per_axis, spacings, conductors):
+    # Grid axes: the six phase coordinates, then bundle count, spacing and conductor
+    tower_name = tower_types[int(tower_type_index(tower_type))]
+    if number_of_circuits == 2 and tower_name != "Type-3: Double Circuit Vertical Tower":
+        raise ValueError("Only the Type-3 tower can carry two circuits.")
+    limits_dict = limits[tower_name]
+    axes = [np.linspace(*limits_dict[name], points_per_axis) for name in phase_coordinates]
+    low, high = limits_dict["number_of_conductors"]
+    axes.append(np.arange(low, high + 1))
+    axes.append(np.asarray(spacings, dtype=float))
+    # all catalog conductors unless a list of names/indices is given
+    axes.append(np.arange(len(catalog)) if conductors is None else conductor_type_index(list(conductors)))
+    return axes
+
+
+@timings.timed("evaluate")
+def _evaluate(tower_type, number_of_circuits, columns, min_phase_distance):
+    # Evaluates a block of designs and returns (columns + outputs, mask of usable rows)
+    coordinates = {name: columns[name] for name in phase_coordinates}
+    if number_of_circuits == 2:
+        # the second circuit is the mirror image of the first one on the other side of the tower
+        for name, name_2 in zip(phase_coordinates, phase_coordinates_2):
+            columns[name_2] = -columns[name] if name.startswith("x") else columns[name]
+            coordinates[name_2] = columns[name_2]
+
+    # coinciding phases give log(0), those rows are masked out below
+    with np.errstate(divide="ignore", invalid="ignore"):
+        results = calculate_line_parameters(
+            tower_type=tower_type, number_of_circuits=number_of_circuits,
+            number_of_conductors=columns["number_of_conductors"],
+            distance_between_conductors=columns["distance_between_conductors"],
+            conductor_type=columns["conductor_type"], line_length=1.0, **coordinates)
+
+    x = [columns[name] for name in phase_coordinates[0::2]]
+    y = [columns[name] for name in phase_coordinates[1::2]]
+    clearance = np.minimum.reduce([np.hypot(x[i] - x[j], y[i] - y[j]) for i, j in ((0, 1), (1, 2), (2, 0))])
+    valid = (clearance >= min_phase_distance) & np.isfinite(results["L"]) & (results["L"] > 0)
+
+    columns["R_per_km"] = results["total_R"]
+    columns["L_per_km"] = results["total_L"]  # in mH/km
+    columns["C_per_km"] = results["total_C"]  # in µF/km
+    columns["capacity"] = results["capacity"]
+    columns["gmd"] = results["gmd"]  # phase spacing in m
+    return columns, valid
+
+
+def pareto_front(values, senses):
+    # Indices of the non-dominated rows of values (rows x objectives), senses are "min"/"max"
+    values = np.asarray(values, dtype=float)
+    if len(values) == 0:
+        return np.arange(0)
+    costs = values * np.array([1.0 if s == "min" else -1.0 for s in senses])
+
+    if costs.shape[1] == 2:
+        # sort by the first objective (ties broken by the second), keep rows that improve the second
+        order = np.lexsort((costs[:, 1], costs[:, 0]))
+        second = costs[order, 1]
+        best_before = np.minimum.accumulate(np.concatenate(([np.inf], second[:-1])))
+        return np.sort(order[second < best_before])
+
+    # a row can only be dominated by rows before it in lexicographic order, so blocks of rows in that
+    # order are compared (with broadcasting) against the front found so far and against themselves
+    order = np.lexsort(costs.T[::-1])
+    costs = costs[order]
+    keep = np.zeros(len(costs), dtype=bool)
+    front = costs[:0]
+    for start in range(0, len(costs), pareto_block):
+        rows = start + np.flatnonzero(~_dominated(costs[start:start + pareto_block], front))
+        rows = rows[~_dominated(costs[rows], costs[rows])]
+        keep[rows] = True
+        front = np.concatenate([front, costs[rows]])
+    return np.sort(order[keep])
+
+
+def _dominated(candidates, others):
+    # Mask of the candidates (rows of costs) dominated by any row of others
+    dominated = np.zeros(len(candidates), dtype=bool)
+    for start in range(0, len(others), pareto_block):
+        block = others[start:start + pareto_block]
+        no_worse = np.ones((len(block), len(candidates)), dtype=bool)
+        better = np.zeros_like(no_worse)
+        for j in range(candidates.shape[1]):
+            no_worse &= block[:, j, None] <= candidates[:, j]
+            better |= block[:, j, None] < candidates[:, j]
+        dominated |= (no_worse & better).any(axis=0)
+    return dominated
+
+
+@timings.timed("pareto")
+def _front_of(columns, valid, objectives):
+    index = np.flatnonzero(valid)
+    values = np.column_stack([columns[key][index] for key, _ in objectives])
+    index = index[pareto_front(values, [sense for _, sense in objectives])]
+    return {key: value[index] for key, value in columns.items()}
+
+
+def merge_fronts(fronts, objectives):
+    # Pareto front of the union of several fronts (dicts of arrays); {} when all are empty
+    fronts = [f for f in fronts if len(f["capacity"])]
+    if not fronts:
+        return {}
+    merged = {key: np.concatenate([f[key] for f in fronts]) for key in fronts[0]}
+    return _front_of(merged, np.ones(len(merged["capacity"]), dtype=bool), objectives)
+
+
+def grid_chunk(task):
+    # Evaluates the grid points start..stop of a sweep, returns (front, evaluated, valid)
+    tower_type, number_of_circuits, axes, start, stop, min_phase_distance, objectives = task
+    shape = [len(axis) for axis in axes]
+    index = np.unravel_index(np.arange(start, stop), shape)
+    names = phase_coordinates + ["number_of_conductors", "distance_between_conductors", "conductor_type"]
+    columns = {name: axis[i] for name, axis, i in zip(names, axes, index)}
+    columns, valid = _evaluate(tower_type, number_of_circuits, columns, min_phase_distance)
+    return _front_of(columns, valid, objectives), stop - start, int(valid.sum())
+
+
+def run_tasks(tasks, worker, workers):
+    # [worker(task) for task in tasks] on a process pool of `workers` (in this process for 1)
+    if workers == 1:
+        with timings.stage("workers"):
+            return [worker(task) for task in tasks]
+    if not timings.enabled:
+        with ProcessPoolExecutor(max_workers=workers) as pool:
+            return list(pool.map(worker, tasks))
+    # worker processes time their tasks themselves; their stages are added below "workers",
+    # whose own time is the wall time of the pool
+    with timings.stage("workers"):
+        with ProcessPoolExecutor(max_workers=workers) as pool:
+            outputs = list(pool.map(timed_task, [(worker, task) for task in tasks]))
+        for _, snapshot in outputs:
+            timings.merge(snapshot)
+    return [output for output, _ in outputs]
+
+
+@timings.timed("grid_sweep")
+def grid_sweep(tower_type, points_per_axis=5, number_of_circuits=1, spacings=default_spacings,
+               conductors=None, objectives=default_objectives, min_phase_distance=1.0,
+               workers=None):
+    # Evaluates every point of the grid over the limits of the tower type and returns the
+    # Pareto front as a dict of arrays (inputs and per-km results), plus sweep statistics
+    axes = design_axes(tower_type, number_of_circuits, points_per_axis, spacings, conductors)
+    total = int(np.prod([len(axis) for axis in axes]))
+    workers = workers or os.cpu_count()
+    tasks = [(tower_type, number_of_circuits, axes, start, min(start + chunk_size, total),
+              min_phase_distance, objectives) for start in range(0, total, chunk_size)]
+    outputs = run_tasks(tasks, grid_chunk, workers)
+
+    front = merge_fronts([output[0] for output in outputs], objectives)
+    return front, {"evaluated": total, "valid": sum(output[2] for output in outputs)}
+
+
+def _sample_columns(axes, rng, count, centers=None, scale=1.0):
+    # Random designs within the grid axes, uniform or around the `centers` designs
+    columns = {}
+    for k, name in enumerate(phase_coordinates):
+        low, high = axes[k][0], axes[k][-1]
+        if centers is None:
+            columns[name] = rng.uniform(low, high, count)
+        else:
+            # refine around randomly chosen points of the current front
+            base = centers[name][rng.integers(len(centers[name]), size=count)]
+            columns[name] = np.clip(base + rng.normal(0.0, scale * (high - low), count), low, high)
+    for name, axis in zip(["number_of_conductors", "distance_between_conductors", "conductor_type"], axes[6:]):
+        columns[name] = axis[rng.integers(len(axis), size=count)]
+    return columns
+
+
+def sample_designs(tower_type, count, number_of_circuits=1, spacings=default_spacings, conductors=None,
+                   min_phase_distance=1.0, seed=None, block_size=chunk_size, decimals=None):
+    # Uniform random designs over the limits of the tower type with their per-km results, as in
+    # adaptive_sweep but all of them instead of the front. Yields blocks of at most block_size
+    # usable designs (dicts of arrays), so callers can show results while the rest is calculated.
+    # With `decimals` the coordinates are rounded, e.g. to the 2 decimals the GUI accepts.
+    axes = design_axes(tower_type, number_of_circuits, 2, spacings, conductors)
+    rng = np.random.default_rng(seed)
+    for start in range(0, count, block_size):
+        columns = _sample_columns(axes, rng, min(block_size, count - start))
+        if decimals is not None:
+            for name in phase_coordinates:
+                columns[name] = np.round(columns[name], decimals)
+        columns, valid = _evaluate(tower_type, number_of_circuits, columns, min_phase_distance)
+        yield {key: value[valid] for key, value in columns.items()}
+
+
+def _sample_chunk(task):
+    (tower_type, number_of_circuits, axes, seed, count, centers, scale,
+     min_phase_distance, objectives) = task
+    rng = np.random.default_rng(seed)
+    columns = _sample_columns(axes, rng, count, centers, scale)
+    columns, valid = _evaluate(tower_type, number_of_circuits, columns, min_phase_distance)
+    return _front_of(columns, valid, objectives), count, int(valid.sum())
+
+
+@timings.timed("adaptive_sweep")
+def adaptive_sweep(tower_type, samples_per_round=1000000, rounds=4, shrink=0.5, number_of_circuits=1,
+                   spacings=default_spacings, conductors=None,
+                   objectives=default_objectives, min_phase_distance=1.0, workers=None, seed=None):
+    # Random sampling of the limits window, each further round samples around the current front
+    # with a window that shrinks by `shrink`. Results are reproducible for a given seed.
+    axes = design_axes(tower_type, number_of_circuits, 2, spacings, conductors)
+    workers = workers or os.cpu_count()
+    seeds = np.random.SeedSequence(seed)
+    front, evaluated, valid = {}, 0, 0
+
+    for round_number in range(rounds):
+        centers = {name: front[name] for name in phase_coordinates} if front else None
+        scale = shrink ** round_number
+        counts = [min(chunk_size, samples_per_round - start) for start in range(0, samples_per_round, chunk_size)]
+        tasks = [(tower_type, number_of_circuits, axes, child, count, centers, scale,
+                  min_phase_distance, objectives) for child, count in zip(seeds.spawn(len(counts)), counts)]
+        outputs = run_tasks(tasks, _sample_chunk, workers)
+        front = merge_fronts([front] + [output[0] for output in outputs] if front else
+                              [output[0] for output in outputs], objectives)
+        evaluated += sum(output[1] for output in outputs)
+        valid += sum(output[2] for output in outputs)
+
+    return front, {"evaluated": evaluated, "valid": valid}
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Design space sweep over the tower limits")
+    parser.add_argument("tower_type", type=int, choices=[1, 2, 3], help="tower type number")
+    parser.add_argument("--circuits", type=int, choices=[1, 2], default=1)
+    parser.add_argument("--points", type=int, default=5, help="grid points per coordinate axis")
+    parser.add_argument("--adaptive", type=int, metavar="SAMPLES", help="adaptive sampling instead of the grid")
+    parser.add_argument("--rounds", type=int, default=4)
+    parser.add_argument("--workers", type=int)
+    parser.add_argument("--seed", type=int)
+    parser.add_argument("--timings", action="store_true", help="print the time spent in every stage")
+    parser.add_argument("--profile", metavar="PATH", help="write a cProfile/pstats file of the run "
+                        "(covers this process only, use --workers 1 to profile the evaluation)")
+    args = parser.parse_args(argv)
+
+    timings.enable(args.timings or timings.enabled)
+    with profiled(args.profile):
+        if args.adaptive:
+            front, stats = adaptive_sweep(args.tower_type - 1, args.adaptive, args.rounds,
+                                          number_of_circuits=args.circuits, workers=args.workers, seed=args.seed)
+        else:
+            front, stats = grid_sweep(args.tower_type - 1, args.points, number_of_circuits=args.circuits,
+                                      workers=args.workers)
+    if timings.enabled:
+        print(timings.report())
+
+    print(f"Evaluated {stats['evaluated']} designs ({stats['valid']} valid), "
+          f"{len(front.get('capacity', []))} on the Pareto front")
+    if front:
+        order = np.argsort(front["L_per_km"])
+        print("L (mH/km)  C (µF/km)  R (ohm/km)  MVA       n  d (cm)  conductor")
+        for i in order:
+            print(f"{front['L_per_km'][i]:9.5f}  {front['C_per_km'][i]:9.5f}  {front['R_per_km'][i]:10.5f}  "
+                  f"{front['capacity'][i]:8.3f}  {front['number_of_conductors'][i]}  "
+                  f"{front['distance_between_conductors'][i]:6.1f}  {catalog.names[front['conductor_type'][i]]}")
+
+
+if __name__ == "__main__":
+    main()
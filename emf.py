@@ -0,0 +1,171 @@
+import argparse
+import math
+import sys
+import time
+
+import numpy as np
+
+from batch_calculator import read_chunks, open_writer, parse_design_columns, select_rows
+from calculation_engine import phase_coordinates, phase_coordinates_2, tower_voltages, tower_type_index
+from conductor_catalog import catalog
+from corona import phase_voltages, sub_conductor_charges
+from impedance_matrix import epsilon_0, mu_0, bundle_positions
+from input_validation import describe_errors
+
+# Electric and magnetic field (EMF) of a line at observation points across the right-of-way.
+# E comes from the line charges of all sub-conductors (solved with the potential coefficients
+# like in corona.py) and their images below the ground plane; B from the phase currents split
+# equally over the sub-conductors (earth return currents are neglected, as usual at power
+# frequency). Fields are rms resultants sqrt(|Fx|^2 + |Fy|^2) of the phasor components.
+#
+# Observation points are evaluated in blocks of chunk_elements point-source pairs, so profiles
+# of 1e5+ points are a handful of array operations.
+
+chunk_elements = 4000000  # point-source terms evaluated at once
+
+
+def line_sources(x_phases, y_phases, number_of_conductors, distance_between_conductors):
+    # Sub-conductor positions (m) and their phase index, spacing in m
+    x, y = bundle_positions(x_phases, y_phases, number_of_conductors, distance_between_conductors)
+    return x, y, np.repeat(np.arange(np.shape(x_phases)[-1]), int(number_of_conductors))
+
+
+def _line_field(x, y, strengths, points_x, points_y, images):
+    # Sum of 2-D line source fields (p - s) / |p - s|^2 * strength at the points (chunked),
+    # with mirrored sources of opposite strength when `images` is set. strengths (..., N)
+    # complex, points (M,); returns the x and y components (..., M).
+    if images:
+        x = np.concatenate([x, x])
+        y = np.concatenate([y, -y])
+        strengths = np.concatenate([strengths, -strengths], axis=-1)
+    field_x = np.empty(strengths.shape[:-1] + (len(points_x),), dtype=complex)
+    field_y = np.empty_like(field_x)
+    step = max(1, chunk_elements // len(x))
+    for start in range(0, len(points_x), step):
+        part = slice(start, start + step)
+        dx = points_x[part, None] - x
+        dy = points_y[part, None] - y
+        distance_2 = dx * dx + dy * dy
+        field_x[..., part] = strengths @ (dx / distance_2).T
+        field_y[..., part] = strengths @ (dy / distance_2).T
+    return field_x, field_y
+
+
+def electric_field(x, y, charges, points_x, points_y):
+    # E components (V/m, complex rms) of line charges (C/m) above the ground plane
+    field_x, field_y = _line_field(x, y, charges, points_x, points_y, images=True)
+    return field_x / (2 * math.pi * epsilon_0), field_y / (2 * math.pi * epsilon_0)
+
+
+def magnetic_field(x, y, currents, points_x, points_y):
+    # B components (T, complex rms) of line currents (A); B is perpendicular to the radius vector
+    field_x, field_y = _line_field(x, y, currents, points_x, points_y, images=False)
+    return -field_y * mu_0 / (2 * math.pi), field_x * mu_0 / (2 * math.pi)
+
+
+def resultant(field_x, field_y):
+    # rms resultant of a field given by its phasor components
+    return np.sqrt(np.abs(field_x) ** 2 + np.abs(field_y) ** 2)
+
+
+def emf_profile(tower_type, x_coordinates_a, y_coordinates_a, x_coordinates_b, y_coordinates_b,
+                x_coordinates_c, y_coordinates_c, number_of_conductors, distance_between_conductors,
+                conductor_type, number_of_circuits=1, x_coordinates_a_2=np.nan, y_coordinates_a_2=np.nan,
+                x_coordinates_b_2=np.nan, y_coordinates_b_2=np.nan, x_coordinates_c_2=np.nan,
+                y_coordinates_c_2=np.nan, lateral=None, heights=(0.0, 1.0), scenarios=({},),
+                line_length=None):
+    # Lateral EMF profile of one design (inputs of calculate_line_parameters, spacing in cm).
+    # lateral: x positions of the observation points in m (default -50 to 50 m every 0.1 m),
+    # heights: observation heights in m. Every scenario is a dict with any of
+    #   voltage        line-to-line voltage in V (default: the tower's)
+    #   current        phase current in A, a value or one per phase (default: the thermal rating)
+    #   loading        fraction of the current (default 1)
+    #   power_factor   lagging power factor of the load (default 1)
+    #   phase_angles   voltage angles of the phases in degrees (default a, b, c = 0, -120, 120 per circuit)
+    # Returns x, heights and E (kV/m) and B (µT) of shape (scenarios, heights, points), plus the
+    # maxima of every scenario and height.
+    circuits = int(number_of_circuits)
+    names = (phase_coordinates + phase_coordinates_2)[:6 * circuits]
+    values = dict(zip(phase_coordinates + phase_coordinates_2, (
+        x_coordinates_a, y_coordinates_a, x_coordinates_b, y_coordinates_b, x_coordinates_c, y_coordinates_c,
+        x_coordinates_a_2, y_coordinates_a_2, x_coordinates_b_2, y_coordinates_b_2, x_coordinates_c_2,
+        y_coordinates_c_2)))
+    x_phases = np.array([values[name] for name in names[0::2]], dtype=float)
+    y_phases = np.array([values[name] for name in names[1::2]], dtype=float)
+    number_of_phases = len(x_phases)
+    n = int(number_of_conductors)
+    x, y, phases = line_sources(x_phases, y_phases, n, distance_between_conductors / 100)
+    radius, current_capacity = (float(value) for value in catalog.gather(conductor_type, "radius", "current_capacity"))
+    tower_voltage = float(tower_voltages[tower_type_index(tower_type)])
+
+    lateral = np.arange(-50.0, 50.05, 0.1) if lateral is None else np.asarray(lateral, dtype=float)
+    heights = np.asarray(heights, dtype=float)
+    points_x = np.tile(lateral, len(heights))
+    points_y = np.repeat(heights, len(lateral))
+
+    voltages = []
+    currents = []
+    for scenario in scenarios:
+        angles = np.asarray(scenario.get("phase_angles", np.tile([0.0, -120.0, 120.0], circuits)), dtype=float)
+        voltages.append(phase_voltages(scenario.get("voltage", tower_voltage), number_of_phases, angles))
+        current = np.broadcast_to(np.asarray(scenario.get("current", current_capacity * n), dtype=float),
+                                  (number_of_phases,)) * scenario.get("loading", 1.0)
+        lag = math.acos(scenario.get("power_factor", 1.0))
+        currents.append(current * np.exp(1j * (np.radians(angles) - lag)))
+    voltages = np.array(voltages)  # (scenarios, phases)
+    currents = np.array(currents)
+
+    charges = sub_conductor_charges(x, y, np.full(len(x), radius), phases, voltages)
+    E = resultant(*electric_field(x, y, charges, points_x, points_y)) / 1e3  # kV/m
+    B = resultant(*magnetic_field(x, y, currents[:, phases] / n, points_x, points_y)) * 1e6  # µT
+
+    shape = (len(voltages), len(heights), len(lateral))
+    E, B = E.reshape(shape), B.reshape(shape)
+    return {"x": lateral, "heights": heights, "E": E, "B": B,
+            "E_max": E.max(axis=-1), "B_max": B.max(axis=-1),
+            "x_E_max": lateral[E.argmax(axis=-1)], "x_B_max": lateral[B.argmax(axis=-1)]}
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Lateral EMF profiles of the designs in a CSV/Parquet file")
+    parser.add_argument("input", help="design table in the batch mode format (.csv/.parquet, '-' for CSV on stdin)")
+    parser.add_argument("output", help="profile .csv/.parquet ('-' for CSV on stdout)")
+    parser.add_argument("--width", type=float, default=50.0, help="profile from -WIDTH to WIDTH m")
+    parser.add_argument("--step", type=float, default=0.1, help="point spacing in m")
+    parser.add_argument("--heights", type=float, nargs="+", default=[0.0, 1.0], help="observation heights in m")
+    parser.add_argument("--loading", type=float, nargs="+", default=[1.0],
+                        help="load currents as fractions of the thermal rating, one scenario each")
+    parser.add_argument("--power-factor", type=float, default=1.0)
+    args = parser.parse_args(argv)
+
+    lateral = np.arange(-args.width, args.width + args.step / 2, args.step)
+    scenarios = [{"loading": loading, "power_factor": args.power_factor} for loading in args.loading]
+    start = time.perf_counter()
+    writer = open_writer(args.output)
+    row = 0
+    try:
+        for columns in read_chunks(args.input):
+            inputs, codes = parse_design_columns(columns)
+            for i in range(len(codes)):
+                row += 1
+                if codes[i]:
+                    print(f"Design {row}: " + " ".join(describe_errors(codes[i])), file=sys.stderr)
+                    continue
+                design = {name: value.item() for name, value in select_rows(inputs, i).items()}
+                profile = emf_profile(**design, lateral=lateral, heights=args.heights, scenarios=scenarios)
+                for s, loading in enumerate(args.loading):
+                    for h, height in enumerate(profile["heights"]):
+                        writer.write({"design": np.full(len(lateral), row), "loading": np.full(len(lateral), loading),
+                                      "height": np.full(len(lateral), height), "x": lateral,
+                                      "E_kV_per_m": profile["E"][s, h], "B_uT": profile["B"][s, h]})
+                        print(f"Design {row}, loading {loading:g}, height {height:g} m: "
+                              f"E max {profile['E_max'][s, h]:.3f} kV/m at {profile['x_E_max'][s, h]:.1f} m, "
+                              f"B max {profile['B_max'][s, h]:.2f} µT at {profile['x_B_max'][s, h]:.1f} m",
+                              file=sys.stderr)
+    finally:
+        writer.close()
+    print(f"done in {time.perf_counter() - start:.2f} s", file=sys.stderr)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,127 @@
+import threading
+from collections import OrderedDict
+
+import numpy as np
+
+from calculation_engine import bundle_radii, phase_gmd, double_circuit_distances
+from conductor_catalog import catalog
+
+# Bounded LRU cache for the geometry terms of the calculation. The bundle GMR/equivalent radius
+# only depend on (conductor, bundle count, spacing) and the GMD terms only on the phase
+# coordinates, so studies that vary the line length or the conductor reuse them.
+# Keys are the inputs quantized to `resolution` (m). Pass an instance as the `cache` argument of
+# calculate_line_parameters. The tables are locked, so one cache can be shared between threads.
+
+
+class _LruTable:
+    def __init__(self, max_size):
+        self.max_size = max_size
+        self.entries = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.lock = threading.Lock()
+
+    def lookup(self, keys, compute, width):
+        # keys is a (rows x fields) int array; compute(rows) returns a tuple of `width` arrays for the
+        # given row indices. Each distinct key is computed at most once, duplicates in the batch count as hits.
+        if len(keys) == 0:
+            return np.empty((0, width))
+        unique, first, inverse = np.unique(keys, axis=0, return_index=True, return_inverse=True)
+        with self.lock:
+            return self._lookup(keys, unique, first, inverse, compute, width)
+
+    def _lookup(self, keys, unique, first, inverse, compute, width):
+        missing = []
+        found = {}
+        for i, key in enumerate(map(tuple, unique.tolist())):
+            value = self.entries.get(key)
+            if value is None:
+                missing.append(i)
+            else:
+                self.entries.move_to_end(key)
+                found[i] = value
+
+        values = np.empty((len(unique), width))
+        for i, value in found.items():
+            values[i] = value
+        if missing:
+            values[missing] = np.column_stack(compute(first[missing]))
+            for i, key in zip(missing, map(tuple, unique[missing].tolist())):
+                self.entries[key] = tuple(values[i])
+            while len(self.entries) > self.max_size:
+                self.entries.popitem(last=False)
+                self.evictions += 1
+
+        self.misses += len(missing)
+        self.hits += len(keys) - len(missing)
+        return values[inverse.reshape(-1)]
+
+    def stats(self):
+        lookups = self.hits + self.misses
+        return {
+            "size": len(self.entries),
+            "max_size": self.max_size,
+            "hits": self.hits,
+            "misses": self.misses,
+            "evictions": self.evictions,
+            "hit_rate": self.hits / lookups if lookups else 0.0,
+        }
+
+
+class GeometryCache:
+    def __init__(self, max_size=4096, resolution=1e-9):
+        self.resolution = resolution
+        self.bundle = _LruTable(max_size)
+        self.gmd = _LruTable(max_size)
+        self.double_circuit = _LruTable(max_size)
+
+    def _quantize(self, *values):
+        return np.column_stack([np.round(np.ravel(v) / self.resolution).astype(np.int64) for v in values])
+
+    def bundle_radii(self, conductor, number_of_conductors, distance_between_conductors):
+        # Bundle GMR and equivalent radius (m) for conductor indices, bundle counts and spacings (m)
+        conductor, n, distance = np.broadcast_arrays(conductor, number_of_conductors, distance_between_conductors)
+        shape = np.shape(conductor)
+        conductor, n, distance = np.ravel(conductor), np.ravel(n), np.ravel(distance)
+        keys = np.column_stack([conductor.astype(np.int64), n.astype(np.int64),
+                                self._quantize(distance)[:, 0]])
+
+        def compute(rows):
+            radius, gmr = catalog.gather(conductor[rows], "radius", "gmr")
+            return bundle_radii(gmr, radius, n[rows], distance[rows])
+
+        values = self.bundle.lookup(keys, compute, 2)
+        return values[:, 0].reshape(shape), values[:, 1].reshape(shape)
+
+    def phase_gmd(self, *coordinates):
+        # Same as calculation_engine.phase_gmd
+        shape = np.shape(coordinates[0])
+        coordinates = [np.ravel(c) for c in coordinates]
+
+        def compute(rows):
+            return (phase_gmd(*(c[rows] for c in coordinates)),)
+
+        return self.gmd.lookup(self._quantize(*coordinates), compute, 1)[:, 0].reshape(shape)
+
+    def double_circuit_distances(self, *coordinates):
+        # Same as calculation_engine.double_circuit_distances
+        shape = np.shape(coordinates[0])
+        coordinates = [np.ravel(c) for c in coordinates]
+
+        def compute(rows):
+            return double_circuit_distances(*(c[rows] for c in coordinates))
+
+        values = self.double_circuit.lookup(self._quantize(*coordinates), compute, 4)
+        return tuple(values[:, i].reshape(shape) for i in range(4))
+
+    def stats(self):
+        # Hit rate and size statistics of every table
+        return {"bundle": self.bundle.stats(), "gmd": self.gmd.stats(),
+                "double_circuit": self.double_circuit.stats()}
+
+    def clear(self):
+        for table in (self.bundle, self.gmd, self.double_circuit):
+            with table.lock:
+                table.entries.clear()
+                table.hits = table.misses = table.evictions = 0
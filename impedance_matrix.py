@@ -0,0 +1,154 @@
+import math
+
+import numpy as np
+
+# General N-conductor line model. Every function works on stacks of towers: arrays have a leading
+# batch shape (...) followed by the conductor axis, and all towers of a stack share the same
+# conductor layout (which conductor belongs to which phase), so a whole stack is reduced with a
+# single batched solve.
+#
+# phases: one entry per conductor, the phase index (0, 1, 2 for a circuit, 3, 4, 5 for a second
+# circuit ...) or -1 for a grounded shield wire. Sub-conductors of a bundle share their phase index.
+
+mu_0 = 4e-7 * math.pi
+epsilon_0 = 8.854e-12
+
+
+def _pairwise(x, y):
+    dx = x[..., :, None] - x[..., None, :]
+    return dx, y[..., :, None], y[..., None, :]
+
+
+def series_impedance_matrix(x, y, gmr, resistance, frequency=50.0, earth_resistivity=100.0):
+    # Primitive series impedance matrix in ohm/km with earth return. Carson's integral is evaluated
+    # with the complex penetration depth p = sqrt(rho / (j w mu_0)), i.e. the earth is replaced by a
+    # perfect conductor at depth p. x, y, gmr in m, resistance in ohm/km (AC, per conductor).
+    x, y, gmr, resistance = np.broadcast_arrays(*(np.asarray(v, dtype=float) for v in (x, y, gmr, resistance)))
+    omega = 2 * math.pi * np.asarray(frequency, dtype=float)[..., None, None]
+    p = np.sqrt(earth_resistivity / (1j * omega * mu_0))
+
+    dx, y_i, y_j = _pairwise(x, y)
+    distance = np.hypot(dx, y_i - y_j)
+    n = x.shape[-1]
+    diagonal = np.eye(n, dtype=bool)
+    distance = np.where(diagonal, gmr[..., None, :], distance)  # GMR on the diagonal
+    image = np.sqrt((y_i + y_j + 2 * p) ** 2 + dx ** 2)
+
+    Z = 1j * omega * mu_0 / (2 * math.pi) * np.log(image / distance) * 1e3
+    return Z + np.where(diagonal, resistance[..., None, :], 0.0)
+
+
+def potential_coefficient_matrix(x, y, radius):
+    # Maxwell potential coefficients in km/F (conductors above a perfectly conducting ground plane)
+    x, y, radius = np.broadcast_arrays(*(np.asarray(v, dtype=float) for v in (x, y, radius)))
+    dx, y_i, y_j = _pairwise(x, y)
+    distance = np.hypot(dx, y_i - y_j)
+    n = x.shape[-1]
+    distance = np.where(np.eye(n, dtype=bool), radius[..., None, :], distance)
+    image = np.hypot(dx, y_i + y_j)
+    return np.log(image / distance) / (2 * math.pi * epsilon_0) / 1e3
+
+
+def kron_reduce(matrix, keep):
+    # Eliminates the conductors that are not in `keep` (their voltage is zero):
+    # M_kk - M_ke M_ee^-1 M_ek, batched over the leading axes
+    keep = np.asarray(keep)
+    eliminate = np.setdiff1d(np.arange(matrix.shape[-1]), keep)
+    if len(eliminate) == 0:
+        return matrix[..., keep[:, None], keep]
+    M_kk = matrix[..., keep[:, None], keep]
+    M_ke = matrix[..., keep[:, None], eliminate]
+    M_ek = matrix[..., eliminate[:, None], keep]
+    M_ee = matrix[..., eliminate[:, None], eliminate]
+    return M_kk - M_ke @ np.linalg.solve(M_ee, M_ek)
+
+
+def reduce_to_phases(matrix, phases):
+    # Bundles the sub-conductors of every phase and removes the shield wires. For each bundle the
+    # first sub-conductor carries the phase current; the other rows are turned into "V_k - V_first = 0"
+    # equations, which are then Kron-reduced together with the grounded shield wires.
+    phases = np.asarray(phases)
+    matrix = np.array(matrix)
+    keep = []
+    for phase in range(phases.max() + 1):
+        members = np.flatnonzero(phases == phase)
+        if len(members) == 0:
+            raise ValueError(f"Phase {phase} has no conductor")
+        first, others = members[0], members[1:]
+        matrix[..., others, :] -= matrix[..., first:first + 1, :]
+        matrix[..., :, others] -= matrix[..., :, first:first + 1]
+        keep.append(first)
+    return kron_reduce(matrix, keep)
+
+
+_a = np.exp(2j * math.pi / 3)
+_fortescue = np.array([[1, 1, 1], [1, _a**2, _a], [1, _a, _a**2]])
+
+
+def sequence_components(matrix):
+    # Symmetrical components (0, 1, 2) of phase matrices with 3, 6, ... phases; the transform is
+    # applied to every circuit (block of three phases)
+    circuits = matrix.shape[-1] // 3
+    A = np.kron(np.eye(circuits), _fortescue)
+    return np.linalg.solve(A, matrix @ A)
+
+
+def line_matrices(x, y, radius, gmr, resistance, phases, frequency=50.0, earth_resistivity=100.0):
+    # Phase and sequence impedance (ohm/km) and admittance (S/km) matrices of a stack of towers.
+    # Arrays have shape (..., N) for N conductors (sub-conductors and shield wires), phases has N entries.
+    omega = 2 * math.pi * np.asarray(frequency, dtype=float)[..., None, None]
+    Z = reduce_to_phases(series_impedance_matrix(x, y, gmr, resistance, frequency, earth_resistivity), phases)
+    P = reduce_to_phases(potential_coefficient_matrix(x, y, radius), phases)
+    C = np.linalg.inv(P)  # F/km
+    Y = 1j * omega * C
+
+    Z_sequence = sequence_components(Z)
+    Y_sequence = sequence_components(Y)
+    return {
+        "Z_phase": Z,
+        "Y_phase": Y,
+        "C_phase": C,
+        "Z_sequence": Z_sequence,
+        "Y_sequence": Y_sequence,
+        "Z0": Z_sequence[..., 0, 0],
+        "Z1": Z_sequence[..., 1, 1],
+        "Y0": Y_sequence[..., 0, 0],
+        "Y1": Y_sequence[..., 1, 1],
+    }
+
+
+def bundle_positions(x_center, y_center, number_of_conductors, distance_between_conductors):
+    # Sub-conductor positions of bundles on a ring with `distance_between_conductors` (m) between
+    # neighbours: a horizontal pair for n = 2, flat-topped triangle/square/polygon above that.
+    # x_center, y_center have shape (..., P); returns arrays of shape (..., P * n).
+    n = int(number_of_conductors)
+    x_center = np.asarray(x_center, dtype=float)[..., None]
+    y_center = np.asarray(y_center, dtype=float)[..., None]
+    if n == 1:
+        return x_center[..., 0], y_center[..., 0]
+    ring = np.asarray(distance_between_conductors, dtype=float)[..., None, None] / (2 * math.sin(math.pi / n))
+    angles = math.pi / 2 + math.pi / n + 2 * math.pi * np.arange(n) / n
+    x = x_center + ring * np.cos(angles)
+    y = y_center + ring * np.sin(angles)
+    shape = x.shape[:-2] + (x.shape[-2] * n,)
+    return x.reshape(shape), y.reshape(shape)
+
+
+def tower_conductors(x_phases, y_phases, number_of_conductors, distance_between_conductors,
+                     x_ground=(), y_ground=()):
+    # Explicit conductor layout of a stack of towers from the phase positions (..., P), the bundle
+    # (count, spacing in m) and optional shield wire positions (..., G).
+    # Returns x, y of shape (..., P * n + G) and the matching phases array.
+    x, y = bundle_positions(x_phases, y_phases, number_of_conductors, distance_between_conductors)
+    number_of_phases = np.shape(x_phases)[-1]
+    phases = np.repeat(np.arange(number_of_phases), int(number_of_conductors))
+    x_ground = np.asarray(x_ground, dtype=float)
+    y_ground = np.asarray(y_ground, dtype=float)
+    if x_ground.size:
+        batch = np.broadcast_shapes(x.shape[:-1], x_ground.shape[:-1])
+        x = np.concatenate([np.broadcast_to(x, batch + x.shape[-1:]),
+                            np.broadcast_to(x_ground, batch + x_ground.shape[-1:])], axis=-1)
+        y = np.concatenate([np.broadcast_to(y, batch + y.shape[-1:]),
+                            np.broadcast_to(y_ground, batch + y_ground.shape[-1:])], axis=-1)
+        phases = np.concatenate([phases, np.full(x_ground.shape[-1], -1)])
+    return x, y, phases
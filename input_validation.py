@@ -0,0 +1,151 @@
+import numpy as np
+
+from calculation_engine import limits, phase_coordinates
+
+# Error codes of a design row, one bit per check of TransmissionLineGUI.validate_input
+error_tower_type = 1
+error_number_of_circuits = 2
+error_distance = 4
+error_line_length = 8
+error_number_of_conductors = 16
+error_conductor_type = 32
+error_phase_a = 64
+error_phase_b = 128
+error_phase_c = 256
+error_phase_a_2 = 512
+error_phase_b_2 = 1024
+error_phase_c_2 = 2048
+
+error_messages = {
+    error_tower_type: "Unknown tower type.",
+    error_number_of_circuits: "Only the Type-3 tower can carry two circuits.",
+    error_distance: "Distance Between Conductors in Bundle (cm): must be a positive number.",
+    error_line_length: "Length of Transmission Line (km): must be a positive number.",
+    error_number_of_conductors: "Invalid number of conductors in bundle.",
+    error_conductor_type: "Unknown conductor type.",
+    error_phase_a: "Invalid coordinates for Phase A.",
+    error_phase_b: "Invalid coordinates for Phase B.",
+    error_phase_c: "Invalid coordinates for Phase C.",
+    error_phase_a_2: "Invalid coordinates for Phase A in the second circuit.",
+    error_phase_b_2: "Invalid coordinates for Phase B in the second circuit.",
+    error_phase_c_2: "Invalid coordinates for Phase C in the second circuit.",
+}
+
+
+# Declarative range rules: (field, key of the limits table, mirrored, allowed decimals, error bit).
+# The second circuit fields are only checked on double circuit rows, on the mirrored x window.
+_phase_errors = [error_phase_a, error_phase_a, error_phase_b, error_phase_b, error_phase_c, error_phase_c]
+_phase_errors_2 = [error_phase_a_2, error_phase_a_2, error_phase_b_2, error_phase_b_2, error_phase_c_2, error_phase_c_2]
+range_rules = (
+    [("number_of_conductors", "number_of_conductors", False, 0, error_number_of_conductors)]
+    + [(name, name, False, 2, error) for name, error in zip(phase_coordinates, _phase_errors)]
+    + [(name + "_2", name, name.startswith("x"), 2, error) for name, error in zip(phase_coordinates, _phase_errors_2)]
+)
+
+tile_rows = 4096  # rows checked at once
+
+# Fields that must hold a positive number
+positive_rules = [("distance_between_conductors", error_distance), ("line_length", error_line_length)]
+
+# Fields behind every error bit, e.g. to mark them in a form
+error_fields = {}
+for _field, *_, _error in range_rules:
+    error_fields.setdefault(_error, []).append(_field)
+for _field, _error in positive_rules:
+    error_fields[_error] = [_field]
+
+
+class ValidationRules:
+    # The rules compiled once against a limits table: (fields x tower types) arrays of the lower
+    # and upper bounds, so a block of rows is checked with one comparison per bound.
+    def __init__(self, limits_table=limits):
+        self.limits = limits_table
+        self.tower_types = list(limits_table)
+        self.fields = [field for field, *_ in range_rules]
+        bounds = np.array([[limits_table[tower][key] for tower in self.tower_types]
+                           for _, key, _, _, _ in range_rules], dtype=float)
+        mirrored = np.array([rule[2] for rule in range_rules])
+        bounds[mirrored] = -bounds[mirrored][..., ::-1]
+        self.low, self.high = bounds[..., 0], bounds[..., 1]
+        self.scale = 10.0 ** np.array([rule[3] for rule in range_rules])
+        bits = np.array([rule[4] for rule in range_rules])
+        self.bit_values, index = np.unique(bits, return_inverse=True)
+        self.bit_fields = np.zeros((len(self.bit_values), len(bits)), dtype=np.float32)  # bits x fields
+        self.bit_fields[index, np.arange(len(bits))] = 1
+        self.second_circuit = np.array([field.endswith("_2") for field in self.fields])
+
+    def field_ranges(self, tower_type):
+        # {field: (low, high, decimals)} of one tower type (index or name), with the values as
+        # written in the limits table (for validators and placeholder texts)
+        tower = tower_type if isinstance(tower_type, str) else self.tower_types[int(tower_type)]
+        ranges = {}
+        for field, key, mirrored, decimals, _ in range_rules:
+            low, high = self.limits[tower][key]
+            ranges[field] = (-1 * high, -1 * low, decimals) if mirrored else (low, high, decimals)
+        return ranges
+
+    def validate(self, tower_type, number_of_circuits, number_of_conductors, distance_between_conductors,
+                 line_length, conductor_type, coordinates):
+        tower_type = np.asarray(tower_type)
+        codes = np.zeros(tower_type.shape, dtype=np.int32)
+
+        known_tower = (tower_type >= 0) & (tower_type < len(self.tower_types))
+        codes[~known_tower] |= error_tower_type
+        tower = np.where(known_tower, tower_type, 0)
+
+        double = np.asarray(number_of_circuits) == 2
+        bad_circuits = ~np.isin(number_of_circuits, (1, 2)) | (double & (tower != 2))
+        codes[bad_circuits & known_tower] |= error_number_of_circuits
+
+        positive = {"distance_between_conductors": distance_between_conductors, "line_length": line_length}
+        with np.errstate(invalid="ignore"):
+            for field, error in positive_rules:
+                codes[~(np.asarray(positive[field]) > 0)] |= error
+        codes[np.asarray(conductor_type) < 0] |= error_conductor_type
+
+        # (fields x rows) blocks of values against the bounds of every row's tower type, in tiles
+        # of rows that stay in the CPU cache; the second circuit fields only when there are double
+        # circuit rows. The rules check numbers, not text: the decimals check accepts values that have
+        # at most the field's decimals, so -4.000 passes here although QDoubleValidator rejects the text.
+        fields = np.flatnonzero(~self.second_circuit | double.any())
+        second_circuit = self.second_circuit[fields]
+        low, high, scale = self.low[fields], self.high[fields], self.scale[fields, None]
+        bit_fields = self.bit_fields[:, fields]
+        values = dict(coordinates, number_of_conductors=number_of_conductors)
+        columns = [np.ravel(column) for column in np.broadcast_arrays(
+            codes, *(np.asarray(values.get(self.fields[i], np.nan), dtype=float) for i in fields))[1:]]
+        tower = np.ravel(tower)
+        double = np.ravel(np.broadcast_to(double, codes.shape))
+        flat_codes = codes.reshape(-1)
+        for start in range(0, len(flat_codes), tile_rows):
+            rows = slice(start, start + tile_rows)
+            block = np.stack([column[rows] for column in columns])
+            with np.errstate(invalid="ignore"):
+                ok = block >= low[:, tower[rows]]
+                ok &= block <= high[:, tower[rows]]
+                block *= scale
+                ok &= np.abs(block - np.rint(block)) < 1e-6
+            failed = ~ok
+            failed[second_circuit] &= double[rows]
+            # failed fields -> error bits: count the failures per bit, then add up the bits that failed
+            failures = bit_fields @ failed.astype(np.float32)
+            flat_codes[rows] |= (self.bit_values @ (failures > 0)).astype(np.int32)
+        return flat_codes.reshape(codes.shape)
+
+
+rules = ValidationRules()
+
+
+def validate_designs(tower_type, number_of_circuits, number_of_conductors, distance_between_conductors,
+                     line_length, conductor_type, coordinates):
+    # Validates arrays of design rows. tower_type and conductor_type are integer indices (-1 for
+    # unknown names), numeric columns are float arrays with NaN for missing/non numeric entries,
+    # coordinates maps the coordinate names (x_coordinates_a ... y_coordinates_c_2) to arrays.
+    # Returns an int array of error codes, 0 for valid rows.
+    return rules.validate(tower_type, number_of_circuits, number_of_conductors, distance_between_conductors,
+                          line_length, conductor_type, coordinates)
+
+
+def describe_errors(code):
+    # Error messages of a single row code
+    return [message for bit, message in error_messages.items() if code & bit]
@@ -0,0 +1,200 @@
+import contextlib
+import functools
+import os
+import threading
+import time
+
+# Stage timers and counters for the calculation pipeline.
+#
+#   with timings.stage("gmd"): ...          times a block
+#   @timings.timed("calculate")             times every call of a function
+#   timings.count("designs", n)             adds to a counter
+#
+# Stages nest: a stage opened inside another one is recorded under "outer/inner", so the report
+# reads like a call tree. When timings are disabled (the default, or TRANSMISSION_LINE_TIMINGS=0)
+# stage() hands out one shared no-op context and nothing is recorded. Stages are placed around
+# whole array operations, never per design, so even enabled timings cost microseconds per call.
+#
+# A `run` is an outermost stage whose breakdown (path -> s) is kept on the stage object it hands
+# out and in last_run of the thread that ran it, so runs of other threads (a GUI click next to a
+# background calculation) never replace it; a worker thread passes its breakdown on with its
+# result. The GUI diagnostics panel shows it. Timings of worker processes come back as snapshots and are merged with merge().
+
+_disabled = contextlib.nullcontext()
+
+
+class _Stage:
+    __slots__ = ("timings", "name", "is_run", "path", "start", "breakdown")
+
+    def __init__(self, timings, name, is_run=False):
+        self.timings = timings
+        self.name = name
+        self.is_run = is_run
+        self.breakdown = None
+
+    def __enter__(self):
+        local = self.timings._local
+        stack = local.__dict__.setdefault("stack", [])
+        if self.is_run:
+            local.run = {}
+        stack.append(self.name)
+        self.path = "/".join(stack)
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, *exception):
+        elapsed = time.perf_counter() - self.start
+        local = self.timings._local
+        local.stack.pop()
+        self.timings._record(self.path, elapsed, 1)
+        run = getattr(local, "run", None)
+        if run is not None:
+            run[self.path] = run.get(self.path, 0.0) + elapsed
+            if self.is_run:
+                self.breakdown = local.last_run = run
+                local.run = None
+        return False
+
+
+class StageTimings:
+    def __init__(self, enabled=False):
+        self.enabled = enabled
+        self.stages = {}  # path -> [calls, total s, max s]
+        self.counters = {}
+        self.lock = threading.Lock()
+        self._local = threading.local()
+
+    def enable(self, enabled=True):
+        self.enabled = enabled
+
+    def stage(self, name):
+        return _Stage(self, name) if self.enabled else _disabled
+
+    def run(self, name):
+        # Like stage(); the breakdown of this stage is kept in its `breakdown` and in last_run
+        return _Stage(self, name, is_run=True) if self.enabled else _disabled
+
+    @property
+    def last_run(self):
+        # Breakdown (path -> s) of the last run finished in the calling thread
+        return self._local.__dict__.get("last_run", {})
+
+    def timed(self, name):
+        # Decorator: every call of the function is a stage
+        def decorate(function):
+            @functools.wraps(function)
+            def wrapper(*args, **kwargs):
+                if not self.enabled:
+                    return function(*args, **kwargs)
+                with _Stage(self, name):
+                    return function(*args, **kwargs)
+            return wrapper
+        return decorate
+
+    def count(self, name, amount=1):
+        if self.enabled:
+            with self.lock:
+                self.counters[name] = self.counters.get(name, 0) + amount
+
+    def _record(self, path, elapsed, calls):
+        with self.lock:
+            entry = self.stages.get(path)
+            if entry is None:
+                self.stages[path] = [calls, elapsed, elapsed]
+            else:
+                entry[0] += calls
+                entry[1] += elapsed
+                entry[2] = max(entry[2], elapsed)
+
+    def snapshot(self):
+        # Picklable copy of the stages and counters, e.g. to send back from a worker process
+        with self.lock:
+            return {"stages": {path: list(entry) for path, entry in self.stages.items()},
+                    "counters": dict(self.counters)}
+
+    def merge(self, snapshot):
+        # Adds a snapshot, its stages are recorded below the stage open in this thread (e.g. the
+        # one that ran the workers)
+        prefix = "/".join(self._local.__dict__.get("stack", []))
+        with self.lock:
+            for path, (calls, total, longest) in snapshot["stages"].items():
+                path = f"{prefix}/{path}" if prefix else path
+                entry = self.stages.setdefault(path, [0, 0.0, 0.0])
+                entry[0] += calls
+                entry[1] += total
+                entry[2] = max(entry[2], longest)
+            for name, amount in snapshot["counters"].items():
+                self.counters[name] = self.counters.get(name, 0) + amount
+
+    def reset(self):
+        with self.lock:
+            self.stages.clear()
+            self.counters.clear()
+        self._local.last_run = {}
+
+    def summary(self):
+        # {path: {"calls", "total", "mean", "max", "share"}} with the share of the enclosing stage
+        # (of the total of all outermost stages for those), and the counters
+        with self.lock:
+            stages = {path: list(entry) for path, entry in self.stages.items()}
+            counters = dict(self.counters)
+        top = sum(total for path, (_, total, _) in stages.items() if "/" not in path)
+        summary = {}
+        for path, (calls, total, longest) in sorted(stages.items()):
+            parent = stages.get(path.rpartition("/")[0])
+            base = parent[1] if parent else top
+            summary[path] = {"calls": calls, "total": total, "mean": total / calls, "max": longest,
+                             "share": total / base if base else 0.0}
+        return {"stages": summary, "counters": counters}
+
+    def report(self):
+        # Aligned text table of summary()
+        summary = self.summary()
+        lines = [f"{'stage':40s} {'calls':>8s} {'total ms':>10s} {'mean ms':>9s} {'max ms':>9s} {'share':>6s}"]
+        for path, entry in summary["stages"].items():
+            name = "  " * path.count("/") + path.rpartition("/")[2]
+            lines.append(f"{name:40s} {entry['calls']:8d} {entry['total'] * 1e3:10.2f} {entry['mean'] * 1e3:9.3f} "
+                         f"{entry['max'] * 1e3:9.3f} {entry['share']:6.1%}")
+        for name, amount in sorted(summary["counters"].items()):
+            lines.append(f"{name:40s} {amount:8d}")
+        return "\n".join(lines)
+
+
+def last_run_report(last_run):
+    # Text breakdown of a run (StageTimings.last_run or the breakdown of a run stage): stage, ms and
+    # share of the enclosing stage
+    lines = []
+    for path, elapsed in sorted(last_run.items()):
+        parent = last_run.get(path.rpartition("/")[0], elapsed)
+        name = "  " * path.count("/") + path.rpartition("/")[2]
+        lines.append(f"{name:24s} {elapsed * 1e3:9.3f} ms {elapsed / parent if parent else 0.0:6.1%}")
+    return "\n".join(lines)
+
+
+@contextlib.contextmanager
+def profiled(path):
+    # cProfile of the block written to `path` (load it with pstats.Stats(path)); None does nothing
+    if not path:
+        yield None
+        return
+    import cProfile  # only loaded when a profile is asked for
+    profile = cProfile.Profile()
+    profile.enable()
+    try:
+        yield profile
+    finally:
+        profile.disable()
+        profile.dump_stats(path)
+
+
+def timed_task(task):
+    # Runs worker(arguments) in a worker process with fresh timings, returns (result, snapshot)
+    worker, arguments = task
+    timings.reset()
+    timings.enable()
+    timings._local.stack = []  # a forked worker starts with the stages open in the parent
+    result = worker(arguments)
+    return result, timings.snapshot()
+
+
+timings = StageTimings(os.environ.get("TRANSMISSION_LINE_TIMINGS", "0") not in ("", "0"))
@@ -0,0 +1,292 @@
+import argparse
+import math
+import time
+
+import numpy as np
+
+from calculation_engine import (tower_types, tower_type_index, tower_voltages, phase_coordinates,
+                                phase_coordinates_2, calculate_line_parameters, bundle_radii, phase_gmd,
+                                double_circuit_distances, double_circuit_radii, conductor_parameters)
+from conductor_catalog import catalog
+from design_sweep import default_spacings, design_axes
+from instrumentation import timings
+from long_line import surge_impedance_loading
+
+# Inverse design: designs within the limits of a tower type that meet targets on the line
+# parameters, e.g. a maximum series reactance, a minimum SIL or a required MVA.
+#
+# R and the capacity only depend on the conductor, bundle and circuits, so those targets just
+# filter the catalog combinations. L, C, X, the surge impedance and the SIL all depend on the
+# geometry through the single number k = ln(GMD / GMR_bundle) (L and X grow with k, C and the SIL
+# fall), so for every conductor/bundle/spacing combination the targets become a window of k.
+# Many random starts per combination are then moved into their window at once: a batched
+# minimum-norm Newton iteration on k(x) = k_target over the phase coordinates x (gradients by
+# finite differences, steps clipped to the limits). The results are rounded to the decimals of the
+# input fields, checked with calculate_line_parameters and ranked.
+
+# targets: quantity -> (low, high), None for an open side
+target_quantities = {
+    "L_per_km": "mH/km",
+    "C_per_km": "µF/km",
+    "X_per_km": "ohm/km",
+    "R_per_km": "ohm/km",
+    "surge_impedance": "ohm",
+    "SIL": "MW",
+    "capacity": "MVA",
+}
+_geometry_quantities = {"L_per_km": 1, "X_per_km": 1, "surge_impedance": 1, "C_per_km": -1, "SIL": -1}  # k or 1/k
+default_starts = 20000
+iterations = 25
+tolerance = 1e-9  # on k
+
+
+def line_quantities(results, frequency=50.0, voltage=None, tower_type=None):
+    # Target quantities per km from calculate_line_parameters results
+    L, C = results["L"], results["C"] * 1e-3  # H/km, F/km (see long_line.per_km_parameters)
+    if voltage is None:
+        voltage = tower_voltages[tower_type_index(tower_type)]
+    surge_impedance, sil = surge_impedance_loading(L, C, voltage)
+    return {
+        "L_per_km": L * 1e3,
+        "C_per_km": C * 1e6,
+        "X_per_km": 2 * math.pi * frequency * L,
+        "R_per_km": results["R"],
+        "surge_impedance": surge_impedance,
+        "SIL": sil,
+        "capacity": results["capacity"],
+        "gmd": results["gmd"],
+    }
+
+
+def _log_ratio(tower_type, number_of_circuits, coordinates, bundle_GMR):
+    # k = ln(GMD / GMR) of designs given by the six coordinates of the first circuit (N, 6); the
+    # second circuit is its mirror image, as in design_sweep
+    first = [coordinates[:, i] for i in range(6)]
+    gmd = phase_gmd(*first)
+    if number_of_circuits == 2:
+        second = [-value if name.startswith("x") else value for name, value in zip(phase_coordinates, first)]
+        Daa, Dbb, Dcc, gmd = double_circuit_distances(*first, *second)
+        bundle_GMR, _ = double_circuit_radii(bundle_GMR, bundle_GMR, Daa, Dbb, Dcc)
+    return np.log(gmd / bundle_GMR)
+
+
+@timings.timed("newton")
+def solve_geometry(tower_type, number_of_circuits, coordinates, bundle_GMR, k_target, low, high):
+    # Batched minimum-norm Newton iteration moving every design (row of coordinates) towards
+    # k = k_target inside the box [low, high]; returns the coordinates and their k
+    x = np.array(coordinates, dtype=float)
+    h = 1e-6 * (high - low)
+    with np.errstate(divide="ignore", invalid="ignore"):
+        for _ in range(iterations):
+            k = _log_ratio(tower_type, number_of_circuits, x, bundle_GMR)
+            residual = k - k_target
+            active = np.abs(residual) > tolerance
+            if not active.any():
+                break
+            gradient = np.empty_like(x)
+            for i in range(x.shape[1]):
+                shifted = x.copy()
+                shifted[:, i] += h[i]
+                gradient[:, i] = (_log_ratio(tower_type, number_of_circuits, shifted, bundle_GMR) - k) / h[i]
+            # coordinates held at a limit while the step pushes them outside do not count
+            blocked = ((x <= low) & (gradient * residual[:, None] < 0)) | ((x >= high) & (gradient * residual[:, None] > 0))
+            gradient[blocked] = 0.0
+            norm = np.sum(gradient * gradient, axis=1)
+            step = np.where((norm > 0) & active, residual / norm, 0.0)[:, None] * gradient
+            x = np.clip(x - np.nan_to_num(step), low, high)
+        return x, _log_ratio(tower_type, number_of_circuits, x, bundle_GMR)
+
+
+def _k_window(targets, bundle_GMR, frequency, voltage):
+    # Window of k per combination from the geometry targets (quantities are a k or a / k)
+    unit = line_quantities({"L": 2e-7 * 1e3, "C": 2 * math.pi * 8.854e-12 * 1e6, "R": 0.0, "capacity": 0.0,
+                            "gmd": 1.0}, frequency, voltage)  # quantities at k = 1 (engine constants)
+    low = np.full(np.shape(bundle_GMR), 0.0)
+    high = np.full(np.shape(bundle_GMR), np.inf)
+    for name, (lower, upper) in targets.items():
+        sign = _geometry_quantities.get(name)
+        if sign is None:
+            continue
+        for bound, is_lower in ((lower, True), (upper, False)):
+            if bound is None:
+                continue
+            k = (bound / unit[name]) ** sign
+            if is_lower == (sign > 0):
+                low = np.maximum(low, k)
+            else:
+                high = np.minimum(high, k)
+    return low, high
+
+
+def _margin(quantities, targets):
+    # Smallest relative slack over all target bounds (negative when a target is missed)
+    margin = np.full(len(quantities["capacity"]), np.inf)
+    for name, (lower, upper) in targets.items():
+        if lower is not None:
+            margin = np.minimum(margin, (quantities[name] - lower) / abs(lower or 1.0))
+        if upper is not None:
+            margin = np.minimum(margin, (upper - quantities[name]) / abs(upper or 1.0))
+    return margin
+
+
+@timings.timed("inverse_design")
+def inverse_design(tower_type, targets, number_of_circuits=1, objective=None, spacings=default_spacings,
+                   conductors=None, starts=default_starts, min_phase_distance=1.0, frequency=50.0, voltage=None,
+                   decimals=2, count=20, seed=None):
+    # Ranked designs of the tower type meeting `targets` ({quantity: (low, high)}, see
+    # target_quantities; None for an open side). objective = (quantity, "min"/"max") ranks the
+    # designs, by default the ones with the largest margin to all targets come first.
+    # Returns a dict of arrays (inputs, quantities and margin) of at most `count` distinct designs,
+    # coordinates rounded to `decimals`.
+    unknown = set(targets) - set(target_quantities)
+    if unknown:
+        raise ValueError(f"Unknown target: {sorted(unknown)[0]}")
+    if objective is not None and objective[0] not in target_quantities:
+        raise ValueError(f"Unknown objective: {objective[0]}")
+    tower_name = tower_types[int(tower_type_index(tower_type))]
+    voltage = tower_voltages[tower_types.index(tower_name)] if voltage is None else voltage
+    axes = design_axes(tower_type, number_of_circuits, 2, spacings, conductors)
+    low = np.array([axis[0] for axis in axes[:6]])
+    high = np.array([axis[-1] for axis in axes[:6]])
+
+    # conductor x bundle x spacing combinations; R and capacity do not depend on the geometry
+    n, spacing, conductor = (values.ravel() for values in np.meshgrid(*axes[6:], indexing="ij"))
+    radius, GMR, resistance, current_capacity = conductor_parameters(conductor)
+    bundle_GMR, _ = bundle_radii(GMR, radius, n, spacing / 100)
+    center = dict(zip(phase_coordinates, (low + high) / 2))
+    with np.errstate(divide="ignore", invalid="ignore"):  # the center may put phases on top of each other
+        fixed = line_quantities(calculate_line_parameters(
+            tower_name, number_of_circuits=number_of_circuits, number_of_conductors=n,
+            distance_between_conductors=spacing, conductor_type=conductor, line_length=1.0, **center),
+            frequency, voltage)
+    keep = np.ones(len(n), dtype=bool)
+    for name in ("R_per_km", "capacity"):
+        lower, upper = targets.get(name, (None, None))
+        keep &= (lower is None or fixed[name] >= lower) & (upper is None or fixed[name] <= upper)
+    k_low, k_high = _k_window(targets, bundle_GMR, frequency, voltage)
+    keep &= k_low < k_high
+    combos = np.flatnonzero(keep)
+    if len(combos) == 0:
+        return {}
+
+    # random starts, the same number for every combination
+    rng = np.random.default_rng(seed)
+    per_combo = max(1, starts // len(combos))
+    combo = np.repeat(combos, per_combo)
+    x = rng.uniform(low, high, (len(combo), 6))
+    with np.errstate(divide="ignore"):
+        k_start = _log_ratio(tower_type, number_of_circuits, x, bundle_GMR[combo])
+    # target: the nearest point of the (slightly narrowed) window, or its better end when the
+    # objective depends on k; open ends are replaced by the extremes the starts of the same
+    # combination reached (coinciding phases give no finite k)
+    finite = np.isfinite(k_start).reshape(len(combos), per_combo)
+    k_reached = k_start.reshape(len(combos), per_combo)
+    reach_low = np.repeat(np.where(finite, k_reached, np.inf).min(axis=1), per_combo)
+    reach_high = np.repeat(np.where(finite, k_reached, -np.inf).max(axis=1), per_combo)
+    window_low = np.maximum(k_low[combo], reach_low)
+    window_high = np.minimum(k_high[combo], reach_high)
+    inset = 0.02 * np.maximum(window_high - window_low, 0)
+    window_low, window_high = window_low + inset, window_high - inset
+    k_target = np.clip(k_start, window_low, np.maximum(window_high, window_low))
+    if objective is not None and objective[0] in _geometry_quantities:
+        increasing = _geometry_quantities[objective[0]] > 0
+        k_target = window_low if increasing == (objective[1] == "min") else window_high
+    x, _ = solve_geometry(tower_type, number_of_circuits, x, bundle_GMR[combo], k_target, low, high)
+
+    # designs as the input fields take them, checked with the engine
+    x = np.clip(np.round(x, decimals), low, high)
+    columns = {name: x[:, i] for i, name in enumerate(phase_coordinates)}
+    if number_of_circuits == 2:
+        for name, name_2 in zip(phase_coordinates, phase_coordinates_2):
+            columns[name_2] = -columns[name] if name.startswith("x") else columns[name]
+    columns.update(number_of_conductors=n[combo], distance_between_conductors=spacing[combo],
+                   conductor_type=conductor[combo])
+    with np.errstate(divide="ignore", invalid="ignore"):
+        results = calculate_line_parameters(tower_name, number_of_circuits=number_of_circuits, line_length=1.0,
+                                            **columns)
+    quantities = line_quantities(results, frequency, voltage)
+    columns.update(quantities)
+    columns["margin"] = _margin(quantities, targets)
+    xs = [columns[name] for name in phase_coordinates[0::2]]
+    ys = [columns[name] for name in phase_coordinates[1::2]]
+    clearance = np.minimum.reduce([np.hypot(xs[i] - xs[j], ys[i] - ys[j]) for i, j in ((0, 1), (1, 2), (2, 0))])
+    valid = (columns["margin"] >= 0) & (clearance >= min_phase_distance) & np.isfinite(quantities["L_per_km"])
+
+    index = np.flatnonzero(valid)
+    if objective is None:
+        order = np.argsort(-columns["margin"][index], kind="stable")
+    else:
+        sign = 1.0 if objective[1] == "min" else -1.0
+        order = np.lexsort((-columns["margin"][index], sign * columns[objective[0]][index]))
+    index = index[order]
+    # drop repeated designs (starts that ended on the same rounded design)
+    key = np.column_stack([x[index], n[combo][index], spacing[combo][index], conductor[combo][index]])
+    _, first = np.unique(key, axis=0, return_index=True)
+    index = index[np.sort(first)][:count]
+    return {name: values[index] for name, values in columns.items()}
+
+
+def _parse_target(text):
+    # "X_per_km<0.35", "SIL>150", "L_per_km=0.9:1.0"
+    for separator in ("<", ">", "="):
+        if separator in text:
+            name, value = text.split(separator, 1)
+            name = name.strip()
+            if separator == "<":
+                return name, (None, float(value))
+            if separator == ">":
+                return name, (float(value), None)
+            lower, upper = value.split(":")
+            return name, (float(lower), float(upper))
+    raise ValueError(f"invalid target: {text}")
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Designs within the tower limits that meet target line parameters")
+    parser.add_argument("tower_type", type=int, choices=[1, 2, 3], help="tower type number")
+    parser.add_argument("targets", nargs="+", metavar="TARGET",
+                        help="NAME<VALUE, NAME>VALUE or NAME=LOW:HIGH with NAME one of "
+                        + ", ".join(f"{name} ({unit})" for name, unit in target_quantities.items()))
+    parser.add_argument("--circuits", type=int, choices=[1, 2], default=1)
+    parser.add_argument("--minimize", metavar="NAME", help="rank by this quantity, smallest first")
+    parser.add_argument("--maximize", metavar="NAME", help="rank by this quantity, largest first")
+    parser.add_argument("--count", type=int, default=10, help="designs to show")
+    parser.add_argument("--starts", type=int, default=default_starts, help="random starts")
+    parser.add_argument("--frequency", type=float, default=50.0, help="in Hz (for X)")
+    parser.add_argument("--seed", type=int)
+    parser.add_argument("--output", help="write the designs to a .csv/.parquet/.arrow file")
+    args = parser.parse_args(argv)
+
+    try:
+        targets = dict(_parse_target(text) for text in args.targets)
+    except ValueError as error:
+        parser.error(str(error))
+    for name in list(targets) + [args.minimize, args.maximize]:
+        if name is not None and name not in target_quantities:
+            parser.error(f"unknown quantity {name!r}, choose from {', '.join(target_quantities)}")
+    objective = (args.minimize, "min") if args.minimize else (args.maximize, "max") if args.maximize else None
+    if args.circuits == 2 and args.tower_type != 3:
+        parser.error("Only the Type-3 tower can carry two circuits.")
+    start = time.perf_counter()
+    designs = inverse_design(args.tower_type - 1, targets, args.circuits, objective, starts=args.starts,
+                             frequency=args.frequency, count=args.count, seed=args.seed)
+    elapsed = time.perf_counter() - start
+    if not designs or len(designs["margin"]) == 0:
+        print(f"No design meets the targets ({elapsed:.2f} s)")
+        return
+    print(f"{len(designs['margin'])} designs in {elapsed:.2f} s")
+    print("X (ohm/km)  L (mH/km)  C (µF/km)  SIL (MW)  MVA      margin  n  d (cm)  conductor  phases (x, y)")
+    for i in range(len(designs["margin"])):
+        phases = " ".join(f"({designs[x][i]:g}, {designs[y][i]:g})"
+                          for x, y in zip(phase_coordinates[0::2], phase_coordinates[1::2]))
+        print(f"{designs['X_per_km'][i]:10.5f}  {designs['L_per_km'][i]:9.5f}  {designs['C_per_km'][i]:9.5f}  "
+              f"{designs['SIL'][i]:8.2f}  {designs['capacity'][i]:7.1f}  {designs['margin'][i]:6.3f}  "
+              f"{designs['number_of_conductors'][i]}  {designs['distance_between_conductors'][i]:6.1f}  "
+              f"{catalog.names[designs['conductor_type'][i]]:9s}  {phases}")
+    if args.output:
+        from result_table import ResultTable
+        ResultTable(designs).write(args.output)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,122 @@
+import math
+
+import numpy as np
+
+from calculation_engine import tower_voltages, tower_type_index
+
+# Distributed-parameter (long line) model. Series impedance z = R + jwL and shunt admittance
+# y = G + jwC per km give the characteristic impedance Zc = sqrt(z / y), the propagation constant
+# gamma = sqrt(z y) and the ABCD parameters of a line of length l:
+#   A = D = cosh(gamma l),  B = Zc sinh(gamma l),  C = sinh(gamma l) / Zc
+# All functions broadcast, so frequency sweeps over many lengths are a single array evaluation.
+
+
+def _sinhc(x):
+    # sinh(x) / x, 1 at x = 0 (DC)
+    small = np.abs(x) < 1e-6
+    safe = np.where(small, 1.0, x)
+    return np.where(small, 1 + x * x / 6, np.sinh(safe) / safe)
+
+
+def per_km_parameters(results):
+    # R (ohm/km), L (H/km) and C (F/km) from calculate_line_parameters results
+    # (its L is in mH/m, which is numerically H/km, and C in µF/m)
+    return results["R"], results["L"], results["C"] * 1e-3
+
+
+def propagation(R, L, C, frequency, G=0.0):
+    # Characteristic impedance (ohm) and propagation constant (1/km) of per-km R (ohm), L (H), C (F)
+    omega = 2 * math.pi * np.asarray(frequency, dtype=float)
+    z = R + 1j * omega * L
+    y = G + 1j * omega * C
+    # infinite at DC without shunt conductance
+    characteristic_impedance = np.sqrt(np.divide(z, y, out=np.full(np.broadcast(z, y).shape, np.inf + 0j), where=y != 0))
+    gamma = np.sqrt(z * y)
+    return characteristic_impedance, gamma, z, y
+
+
+def abcd_parameters(R, L, C, frequency, line_length, G=0.0):
+    # ABCD parameters of a line of line_length km, as arrays A, B, C, D broadcast over all inputs.
+    # B and C are written as z l sinh(gamma l)/(gamma l) and y l sinh(gamma l)/(gamma l), which
+    # stays finite at DC.
+    _, gamma, z, y = propagation(R, L, C, frequency, G)
+    line_length = np.asarray(line_length, dtype=float)
+    gamma_l = gamma * line_length
+    A = np.cosh(gamma_l)
+    sinhc = _sinhc(gamma_l)
+    B = z * line_length * sinhc
+    C_ = y * line_length * sinhc
+    return A, B, C_, A
+
+
+def abcd_matrix(A, B, C, D):
+    # Stacks ABCD parameters into (..., 2, 2) matrices
+    return np.stack([np.stack([A, B], axis=-1), np.stack([C, D], axis=-1)], axis=-2)
+
+
+def phase_modes(Z, Y):
+    # Modal decomposition of Z Y for phase_abcd_matrix: eigenvalues (..., P), modes and their inverse
+    eigenvalues, modes = np.linalg.eig(Z @ Y)
+    return eigenvalues, modes, np.linalg.inv(modes)
+
+
+def phase_abcd_matrix(Z, Y, line_length, modes=None):
+    # ABCD matrices (..., 2P, 2P) of a P-phase line from its phase impedance Z (ohm/km) and admittance
+    # Y (S/km) matrices (..., P, P) and length in km. The matrix functions are taken on the modes of
+    # Z Y: A = cosh(sqrt(ZY) l), B = sinhc(sqrt(ZY) l) Z l, C = Y l sinhc(sqrt(ZY) l), and D = A^T
+    # since Z and Y are symmetric. modes can pass phase_modes(Z, Y) when it is already known.
+    eigenvalues, modes, inverse = phase_modes(Z, Y) if modes is None else modes
+    line_length = np.asarray(line_length, dtype=float)[..., None, None]
+    gamma_l = np.sqrt(eigenvalues) * line_length[..., 0]
+    A = modes @ (np.cosh(gamma_l)[..., None] * inverse)
+    sinhc = modes @ (_sinhc(gamma_l)[..., None] * inverse)
+    B = sinhc @ Z * line_length
+    C_ = line_length * Y @ sinhc
+    return np.concatenate([np.concatenate([A, B], axis=-1),
+                           np.concatenate([C_, np.swapaxes(A, -1, -2)], axis=-1)], axis=-2)
+
+
+def surge_impedance_loading(L, C, voltage):
+    # Lossless surge impedance sqrt(L/C) (ohm) and SIL in MW for line-to-line voltage in V
+    surge_impedance = np.sqrt(L / C)
+    return surge_impedance, np.asarray(voltage, dtype=float) ** 2 / surge_impedance / 1e6
+
+
+def ferranti_rise(A):
+    # Receiving end to sending end voltage ratio of the open-circuited line, |Vr / Vs| = 1 / |A|
+    return 1 / np.abs(A)
+
+
+def frequency_sweep(R, L, C, frequencies, lengths, G=0.0):
+    # Long line quantities for every (frequency, length) pair. R, L, C, G are per-km scalars,
+    # frequencies (F,) in Hz and lengths (N,) in km; results have shape (F, N) (Zc and gamma (F, 1)).
+    frequencies = np.asarray(frequencies, dtype=float)[:, None]
+    lengths = np.asarray(lengths, dtype=float)[None, :]
+    characteristic_impedance, gamma, _, _ = propagation(R, L, C, frequencies, G)
+    A, B, C_, D = abcd_parameters(R, L, C, frequencies, lengths, G)
+    return {
+        "frequency": frequencies[:, 0],
+        "length": lengths[0],
+        "characteristic_impedance": characteristic_impedance,
+        "gamma": gamma,
+        "attenuation": gamma.real,  # Np/km
+        "phase_constant": gamma.imag,  # rad/km
+        "A": A,
+        "B": B,
+        "C": C_,
+        "D": D,
+        "ferranti_rise": ferranti_rise(A),
+        "input_impedance_open": np.divide(A, C_, out=np.full(A.shape, np.inf + 0j), where=C_ != 0),
+        "input_impedance_short": B / D,
+    }
+
+
+def long_line_model(results, tower_type, frequencies, lengths):
+    # Frequency sweep of one design from calculate_line_parameters (scalar results), plus the surge
+    # impedance loading at the tower type's voltage. For a double circuit the engine's per-phase
+    # values already describe both circuits in parallel.
+    R, L, C = (float(value) for value in per_km_parameters(results))
+    sweep = frequency_sweep(R, L, C, frequencies, lengths)
+    voltage = tower_voltages[tower_type_index(tower_type)]
+    sweep["surge_impedance"], sweep["surge_impedance_loading"] = surge_impedance_loading(L, C, voltage)  # ohm, MW
+    return sweep
@@ -0,0 +1,217 @@
+import argparse
+import os
+
+import numpy as np
+
+from batch_calculator import read_chunks, parse_design_columns, select_rows
+from calculation_engine import phase_coordinates, phase_coordinates_2, calculate_line_parameters
+from conductor_catalog import catalog
+from design_sweep import chunk_size, run_tasks
+from input_validation import describe_errors
+
+# Tolerance (uncertainty) analysis of one design. Coordinates, bundle spacing and conductor data
+# are drawn around their nominal values, every sample goes through the vectorized calculation, and
+# the results are summarised as distributions and sensitivity indices of L, C and MVA.
+#
+# tolerances: {input: (distribution, scale)} with distribution "normal" (scale = standard
+# deviation), "uniform" (scale = half width) or "triangular" (scale = half width of the base).
+# Coordinates are in m and the spacing in cm; the conductor data ("radius", "gmr", "resistance",
+# "current_capacity") takes relative tolerances (0.01 = 1 %).
+#
+# The samples are split into fixed shards, each with its own child of SeedSequence(seed), so the
+# results only depend on the seed and the sample count, not on the number of worker processes.
+# Shards return mergeable statistics (mean and co-moment matrix of inputs and outputs) and a
+# random subset of the outputs for the percentiles.
+
+default_tolerances = {
+    **{name: ("normal", 0.2) for name in phase_coordinates + phase_coordinates_2},
+    "distance_between_conductors": ("normal", 1.0),
+    "radius": ("uniform", 0.01),
+    "gmr": ("uniform", 0.01),
+    "resistance": ("uniform", 0.02),
+    "current_capacity": ("uniform", 0.05),
+}
+conductor_fields = ["radius", "gmr", "resistance", "current_capacity"]
+outputs = ["L_per_km", "C_per_km", "capacity"]  # mH/km, µF/km, MVA
+percentiles = (1, 5, 25, 50, 75, 95, 99)
+samples_kept = 20000  # outputs kept per shard for the percentiles
+
+
+def _draw(rng, distribution, scale, count):
+    # Deviations from the nominal value
+    if distribution == "normal":
+        return rng.normal(0.0, scale, count)
+    if distribution == "uniform":
+        return rng.uniform(-scale, scale, count)
+    if distribution == "triangular":
+        return rng.triangular(-scale, 0.0, scale, count)
+    raise ValueError(f"Unknown distribution: {distribution}")
+
+
+def _variables(design, tolerances):
+    # The inputs that are varied: the design's own coordinates (the second circuit only when
+    # there is one) with a non-zero tolerance
+    names = list(phase_coordinates)
+    if int(design.get("number_of_circuits", 1)) == 2:
+        names += phase_coordinates_2
+    names += ["distance_between_conductors"] + conductor_fields
+    return [name for name in names if name in tolerances and tolerances[name][1] > 0]
+
+
+def _evaluate_samples(design, tolerances, variables, rng, count):
+    # Draws `count` samples, returns the deviations (count x variables) and outputs (count x outputs)
+    inputs = dict(design)
+    conductor_data = list(catalog.parameters(design["conductor_type"]))
+    deviations = np.empty((count, len(variables)))
+    for k, name in enumerate(variables):
+        deviations[:, k] = _draw(rng, *tolerances[name], count)
+        if name in conductor_fields:
+            field = conductor_fields.index(name)
+            conductor_data[field] = conductor_data[field] * (1 + deviations[:, k])
+        else:
+            inputs[name] = design[name] + deviations[:, k]
+
+    inputs["line_length"] = 1.0
+    # samples where phases coincide give log(0), they are dropped by the caller
+    with np.errstate(divide="ignore", invalid="ignore"):
+        results = calculate_line_parameters(**inputs, conductor_data=conductor_data)
+    values = np.column_stack([np.broadcast_to(results[key], count)
+                              for key in ("total_L", "total_C", "capacity")])
+    return deviations, values
+
+
+def _shard(task):
+    design, tolerances, variables, seed, count = task
+    rng = np.random.default_rng(seed)
+    deviations, values = _evaluate_samples(design, tolerances, variables, rng, count)
+    valid = np.isfinite(values).all(axis=1) & (values[:, 0] > 0)
+    data = np.column_stack([deviations[valid], values[valid]])
+    mean = data.mean(axis=0) if len(data) else np.zeros(data.shape[1])
+    centered = data - mean
+    return {
+        "count": len(data),
+        "invalid": count - len(data),
+        "mean": mean,
+        "comoment": centered.T @ centered,
+        "min": values[valid].min(axis=0) if len(data) else np.full(len(outputs), np.inf),
+        "max": values[valid].max(axis=0) if len(data) else np.full(len(outputs), -np.inf),
+        "samples": values[valid][:samples_kept],
+    }
+
+
+def _merge(a, b):
+    # Pairwise combination of the shard statistics (Chan et al. update of mean and co-moments)
+    count = a["count"] + b["count"]
+    if count == 0:
+        return {**a, "invalid": a["invalid"] + b["invalid"]}
+    delta = b["mean"] - a["mean"]
+    return {
+        "count": count,
+        "invalid": a["invalid"] + b["invalid"],
+        "mean": a["mean"] + delta * b["count"] / count,
+        "comoment": a["comoment"] + b["comoment"] + np.outer(delta, delta) * a["count"] * b["count"] / count,
+        "min": np.minimum(a["min"], b["min"]),
+        "max": np.maximum(a["max"], b["max"]),
+        "samples": np.concatenate([a["samples"], b["samples"]]),
+    }
+
+
+def _sensitivity(covariance, variables):
+    # Correlation coefficients and standardized regression coefficients (SRC) of every output on
+    # the varied inputs; SRC**2 is the share of the output variance explained by that input
+    k = len(variables)
+    std = np.sqrt(np.diag(covariance))
+    summary = {}
+    for j, name in enumerate(outputs):
+        y = k + j
+        if std[y] == 0 or k == 0:
+            summary[name] = {"correlation": dict.fromkeys(variables, 0.0), "src": dict.fromkeys(variables, 0.0),
+                             "r_squared": 0.0}
+            continue
+        correlation = covariance[:k, y] / (std[:k] * std[y])
+        coefficients = np.linalg.lstsq(covariance[:k, :k], covariance[:k, y], rcond=None)[0]
+        src = coefficients * std[:k] / std[y]
+        summary[name] = {
+            "correlation": dict(zip(variables, correlation.tolist())),
+            "src": dict(zip(variables, src.tolist())),
+            "r_squared": float(coefficients @ covariance[:k, y] / covariance[y, y]),
+        }
+    return summary
+
+
+def monte_carlo(design, samples=1000000, tolerances=None, seed=None, workers=None):
+    # Tolerance analysis of a design given as calculate_line_parameters inputs (scalars, conductor
+    # by name or index). Returns the nominal values and, per output, the statistics, percentiles
+    # and sensitivity indices.
+    tolerances = default_tolerances if tolerances is None else tolerances
+    design = {key: value for key, value in design.items() if key != "line_length"}
+    variables = _variables(design, tolerances)
+    counts = [min(chunk_size, samples - start) for start in range(0, samples, chunk_size)]
+    tasks = [(design, tolerances, variables, child, count)
+             for child, count in zip(np.random.SeedSequence(seed).spawn(len(counts)), counts)]
+    shards = run_tasks(tasks, _shard, workers or os.cpu_count())
+
+    while len(shards) > 1:
+        shards = [_merge(shards[i], shards[i + 1]) if i + 1 < len(shards) else shards[i]
+                  for i in range(0, len(shards), 2)]
+    total = shards[0]
+
+    nominal = calculate_line_parameters(**design, line_length=1.0)
+    covariance = total["comoment"] / max(total["count"] - 1, 1)
+    sensitivity = _sensitivity(covariance, variables)
+    k = len(variables)
+    summary = {"samples": samples, "valid": total["count"], "invalid": total["invalid"], "variables": variables}
+    for j, name in enumerate(outputs):
+        values = total["samples"][:, j]
+        summary[name] = {
+            "nominal": float(nominal[("total_L", "total_C", "capacity")[j]]),
+            "mean": float(total["mean"][k + j]),
+            "std": float(np.sqrt(covariance[k + j, k + j])),
+            "min": float(total["min"][j]),
+            "max": float(total["max"][j]),
+            "percentiles": dict(zip(percentiles, np.percentile(values, percentiles).tolist()))
+            if len(values) else {},
+            **sensitivity[name],
+        }
+    return summary
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Monte Carlo tolerance analysis of the designs in a CSV/Parquet file")
+    parser.add_argument("designs", help="design table in the batch mode format (.csv or .parquet)")
+    parser.add_argument("--samples", type=int, default=1000000, help="samples per design")
+    parser.add_argument("--coordinate-std", type=float, default=0.2, help="standard deviation of the coordinates (m)")
+    parser.add_argument("--spacing-std", type=float, default=1.0, help="standard deviation of the bundle spacing (cm)")
+    parser.add_argument("--seed", type=int)
+    parser.add_argument("--workers", type=int)
+    parser.add_argument("--top", type=int, default=5, help="most influential inputs listed per output")
+    args = parser.parse_args(argv)
+
+    tolerances = dict(default_tolerances)
+    for name in phase_coordinates + phase_coordinates_2:
+        tolerances[name] = ("normal", args.coordinate_std)
+    tolerances["distance_between_conductors"] = ("normal", args.spacing_std)
+
+    row = 0
+    for columns in read_chunks(args.designs):
+        inputs, codes = parse_design_columns(columns)
+        for i in range(len(codes)):
+            row += 1
+            if codes[i]:
+                print(f"Design {row}: " + " ".join(describe_errors(codes[i])))
+                continue
+            design = {name: value.item() for name, value in select_rows(inputs, i).items()}
+            summary = monte_carlo(design, args.samples, tolerances, args.seed, args.workers)
+            print(f"Design {row}: {summary['valid']} valid samples of {summary['samples']}")
+            for name, unit in zip(outputs, ("mH/km", "µF/km", "MVA")):
+                result = summary[name]
+                p = result["percentiles"]
+                print(f"  {name} ({unit}): nominal {result['nominal']:.6g}  mean {result['mean']:.6g}  "
+                      f"std {result['std']:.3g}  p5 {p.get(5, np.nan):.6g}  p95 {p.get(95, np.nan):.6g}  "
+                      f"R² {result['r_squared']:.3f}")
+                ranked = sorted(result["src"].items(), key=lambda item: -abs(item[1]))[:args.top]
+                print("    " + "  ".join(f"{variable} {src:+.3f}" for variable, src in ranked if abs(src) >= 5e-4))
+
+
+if __name__ == "__main__":
+    main()
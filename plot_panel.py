@@ -0,0 +1,300 @@
+import math
+
+import numpy as np
+from PySide6.QtCore import QRect, Qt, QTimer, Signal
+from PySide6.QtGui import QColor, QImage, QPainter, QPen
+from PySide6.QtWidgets import QSizePolicy, QWidget
+
+# Scatter plot for up to millions of result points that stays responsive while they stream in.
+#
+# Points are never drawn one by one. Every point is binned into the pixel grid of the plot area
+# (level of detail = one bin per screen pixel) and the bin counts are drawn as one density image.
+# New points only add to the bins, so each block of streamed results costs O(block); repaints are
+# coalesced by a short timer. When the view changes (resize, other axes, data outside the current
+# bounds) all points are binned again, which is a few array operations even for 1e6 points.
+# Every bin also remembers the last point that fell into it; the cursor readout looks up the
+# nearest occupied bin and reports that point's row, so the design behind it can be shown.
+
+margins = (64, 12, 16, 40)  # left, top, right, bottom in pixels
+pick_radius = 6  # pixels searched around the cursor
+category_width = 0.7  # share of a category's band its points are spread over
+repaint_interval = 40  # ms between progressive repaints
+# density colour ramp from few (dark blue) to many points (yellow) per pixel
+ramp = np.array([[40, 70, 160], [40, 150, 200], [110, 200, 120], [250, 230, 80]], dtype=float)
+
+
+def _palette(levels=256):
+    # ARGB32 colours of the density levels, level 0 (empty pixel) transparent
+    position = np.linspace(0.0, len(ramp) - 1, levels - 1)
+    lower = np.minimum(position.astype(int), len(ramp) - 2)
+    weight = (position - lower)[:, None]
+    rgb = (ramp[lower] * (1 - weight) + ramp[lower + 1] * weight).astype(np.uint32)
+    colours = (np.uint32(255) << 24) | (rgb[:, 0] << 16) | (rgb[:, 1] << 8) | rgb[:, 2]
+    return np.concatenate([[0], colours]).astype(np.uint32)
+
+
+palette = _palette()
+
+
+def _ticks(low, high, count=6):
+    # "Nice" tick positions (steps of 1, 2 or 5 times a power of ten) between low and high
+    span = high - low
+    if not span > 0:
+        return np.array([low])
+    raw = span / count
+    power = 10 ** math.floor(math.log10(raw))
+    step = next(factor * power for factor in (1, 2, 5, 10) if factor * power >= raw)
+    return np.arange(math.ceil(low / step), math.floor(high / step) + 1) * step
+
+
+def _density_image(counts):
+    # ARGB32 image of the bin counts on a log scale, empty bins transparent
+    scale = (len(palette) - 2) / math.log1p(max(int(counts.max()), 1))
+    levels = np.log1p(counts, dtype=np.float32)
+    levels *= scale
+    index = levels.astype(np.intp)
+    index += counts > 0  # level 0 is kept for the empty bins
+    argb = palette[index]
+    height, width = counts.shape
+    return QImage(np.ascontiguousarray(argb).data, width, height, 4 * width, QImage.Format_ARGB32).copy()
+
+
+class ScatterPlot(QWidget):
+    point_hovered = Signal(int)  # row under the cursor, -1 for none
+    point_clicked = Signal(int)
+
+    def __init__(self, parent=None):
+        super().__init__(parent)
+        self.setMouseTracking(True)
+        self.setMinimumSize(360, 280)
+        self.setSizePolicy(QSizePolicy.Expanding, QSizePolicy.Expanding)
+        self.columns = {}  # name -> array with room for more rows
+        self.count = 0
+        self.capacity_hint = 1024
+        self.x_name = self.y_name = None
+        self.x_label = self.y_label = ""
+        self.x_categories = None  # tick labels of a categorical x axis (integer values)
+        self.bounds = None  # (x low, x high, y low, y high)
+        self.counts = None  # bin counts (height x width of the plot area)
+        self.nearest = None  # last row in every bin, -1 for empty bins
+        self.binned = 0  # rows already in the bins
+        self.image = None
+        self.hover = -1
+        self.repaint_timer = QTimer(self)
+        self.repaint_timer.setSingleShot(True)
+        self.repaint_timer.setInterval(repaint_interval)
+        self.repaint_timer.timeout.connect(self.refresh)
+
+    def set_axes(self, x_name, y_name, x_label="", y_label="", x_categories=None):
+        self.x_name, self.y_name = x_name, y_name
+        self.x_label, self.y_label = x_label or x_name, y_label or y_name
+        self.x_categories = x_categories
+        self._invalidate()
+
+    def clear(self):
+        self.columns = {}
+        self.count = 0
+        self.hover = -1
+        self._invalidate()
+
+    def append(self, columns):
+        # Adds a block of rows (dict of equally long arrays); drawn with the next progressive repaint
+        size = len(next(iter(columns.values())))
+        needed = self.count + size
+        for name, values in columns.items():
+            stored = self.columns.get(name)
+            if stored is None or len(stored) < needed:
+                grown = np.empty(max(needed, 2 * self.count, self.capacity_hint), dtype=np.asarray(values).dtype)
+                if stored is not None:
+                    grown[:self.count] = stored[:self.count]
+                self.columns[name] = stored = grown
+            stored[self.count:needed] = values
+        self.count = needed
+        if not self.repaint_timer.isActive():
+            self.repaint_timer.start()
+
+    def reserve(self, rows):
+        # Makes room for `rows` rows up front, so streamed blocks are appended without copies
+        self.capacity_hint = rows
+
+    def value(self, name, row):
+        return self.columns[name][row]
+
+    def plot_rect(self):
+        left, top, right, bottom = margins
+        return QRect(left, top, max(self.width() - left - right, 1), max(self.height() - top - bottom, 1))
+
+    def _invalidate(self):
+        self.bounds = None
+        self.binned = 0
+        self.counts = None
+        self.refresh()
+
+    def _data_bounds(self):
+        x = self.columns[self.x_name][:self.count]
+        y = self.columns[self.y_name][:self.count]
+        finite = np.isfinite(x) & np.isfinite(y)
+        if not finite.any():
+            return None
+        x, y = x[finite], y[finite]
+        if self.x_categories is not None:
+            x_low, x_high = -0.5, len(self.x_categories) - 0.5
+        else:
+            x_low, x_high = float(x.min()), float(x.max())
+        y_low, y_high = float(y.min()), float(y.max())
+        # 5 % room on every side, so streamed points rarely force a new binning
+        x_pad = (x_high - x_low) * 0.05 or 0.5
+        y_pad = (y_high - y_low) * 0.05 or abs(y_low) * 0.05 or 0.5
+        if self.x_categories is not None:
+            x_pad = 0.0
+        return x_low - x_pad, x_high + x_pad, y_low - y_pad, y_high + y_pad
+
+    def _x_values(self, start, stop):
+        # x of the rows start..stop; on a categorical axis the points are spread over the width of
+        # their category by a fixed offset per row (golden ratio sequence), so they stay visible
+        x = self.columns[self.x_name][start:stop]
+        if self.x_categories is None:
+            return x
+        offset = (np.arange(start, stop) * 0.6180339887) % 1.0 - 0.5
+        return x + offset * category_width
+
+    def _pixels(self, start, stop):
+        # Flat bin index and row of the points start..stop that fall into the plot area
+        x_low, x_high, y_low, y_high = self.bounds
+        height, width = self.counts.shape
+        x = self._x_values(start, stop)
+        y = self.columns[self.y_name][start:stop]
+        with np.errstate(invalid="ignore"):
+            column = np.floor((x - x_low) / (x_high - x_low) * width)
+            row = np.floor((y_high - y) / (y_high - y_low) * height)
+            inside = (column >= 0) & (column < width) & (row >= 0) & (row < height)
+        return (row[inside] * width + column[inside]).astype(np.intp), np.flatnonzero(inside) + start
+
+    def refresh(self):
+        # Bins the rows that came in since the last call and repaints
+        if self.x_name is None or self.count == 0 or self.x_name not in self.columns:
+            self.image = None
+            self.update()
+            return
+        area = self.plot_rect()
+        shape = (area.height(), area.width())
+        if self.counts is None or self.counts.shape != shape:
+            self.binned = 0
+        if self.bounds is not None and self.binned < self.count:
+            x = self.columns[self.x_name][self.binned:self.count]
+            y = self.columns[self.y_name][self.binned:self.count]
+            x_low, x_high, y_low, y_high = self.bounds
+            with np.errstate(invalid="ignore"):
+                outside = (x < x_low) | (x > x_high) | (y < y_low) | (y > y_high)
+            if outside.any():
+                self.binned = 0
+        if self.bounds is None or self.binned == 0:
+            self.bounds = self._data_bounds()
+            if self.bounds is None:
+                self.image = None
+                self.update()
+                return
+            self.counts = np.zeros(shape, dtype=np.int64)
+            self.nearest = np.full(shape[0] * shape[1], -1, dtype=np.int64)
+
+        if self.binned < self.count:
+            pixels, rows = self._pixels(self.binned, self.count)
+            self.counts += np.bincount(pixels, minlength=self.counts.size).reshape(self.counts.shape)
+            self.nearest[pixels] = rows
+            self.binned = self.count
+            self.image = _density_image(self.counts)
+        self.update()
+
+    def resizeEvent(self, event):
+        super().resizeEvent(event)
+        self.binned = 0
+        if self.count:
+            self.repaint_timer.start()
+
+    def _to_screen(self, x, y):
+        area = self.plot_rect()
+        x_low, x_high, y_low, y_high = self.bounds
+        return (area.left() + (x - x_low) / (x_high - x_low) * area.width(),
+                area.top() + (y_high - y) / (y_high - y_low) * area.height())
+
+    def paintEvent(self, event):
+        painter = QPainter(self)
+        painter.fillRect(self.rect(), QColor(30, 30, 30))
+        area = self.plot_rect()
+        painter.setPen(QPen(QColor(110, 110, 110)))
+        painter.drawRect(area.adjusted(0, 0, -1, -1))
+        if self.bounds is None or self.image is None:
+            painter.setPen(QColor(160, 160, 160))
+            painter.drawText(area, Qt.AlignCenter, "No results to plot")
+            return
+        painter.drawImage(area.topLeft(), self.image)
+
+        x_low, x_high, y_low, y_high = self.bounds
+        metrics = painter.fontMetrics()
+        painter.setPen(QColor(190, 190, 190))
+        if self.x_categories is not None:
+            x_ticks = np.arange(len(self.x_categories))
+            step = max(1, math.ceil(len(x_ticks) * 70 / area.width()))  # keep the names apart
+            x_ticks = x_ticks[::step]
+        else:
+            x_ticks = _ticks(x_low, x_high)
+        for tick in x_ticks:
+            x, _ = self._to_screen(tick, y_low)
+            painter.drawLine(int(x), area.bottom(), int(x), area.bottom() + 4)
+            text = self.x_categories[int(tick)] if self.x_categories is not None else f"{tick:g}"
+            painter.drawText(int(x - metrics.horizontalAdvance(text) / 2), area.bottom() + 6 + metrics.ascent(), text)
+        for tick in _ticks(y_low, y_high):
+            _, y = self._to_screen(x_low, tick)
+            painter.drawLine(area.left() - 4, int(y), area.left(), int(y))
+            text = f"{tick:.4g}"
+            painter.drawText(area.left() - 6 - metrics.horizontalAdvance(text), int(y + metrics.ascent() / 2 - 1), text)
+        painter.drawText(QRect(area.left(), self.height() - metrics.height() - 2, area.width(), metrics.height()),
+                         Qt.AlignCenter, self.x_label)
+        painter.save()
+        painter.translate(12, area.center().y())
+        painter.rotate(-90)
+        painter.drawText(QRect(-area.height() // 2, -metrics.height() + 4, area.height(), metrics.height()),
+                         Qt.AlignCenter, self.y_label)
+        painter.restore()
+
+        if 0 <= self.hover < self.count:
+            x, y = self._to_screen(self._x_values(self.hover, self.hover + 1)[0], self.columns[self.y_name][self.hover])
+            painter.setPen(QPen(QColor(255, 80, 80), 2))
+            painter.drawEllipse(int(x) - 5, int(y) - 5, 10, 10)
+
+    def row_at(self, position):
+        # Row of the point nearest to a widget position (within pick_radius pixels), -1 for none
+        if self.nearest is None or self.binned == 0:
+            return -1
+        area = self.plot_rect()
+        height, width = self.counts.shape
+        column, row = int(position.x()) - area.left(), int(position.y()) - area.top()
+        rows = np.arange(max(row - pick_radius, 0), min(row + pick_radius + 1, height))
+        columns = np.arange(max(column - pick_radius, 0), min(column + pick_radius + 1, width))
+        if not len(rows) or not len(columns):
+            return -1
+        window = self.nearest.reshape(height, width)[np.ix_(rows, columns)]
+        occupied = np.argwhere(window >= 0)
+        if not len(occupied):
+            return -1
+        distance = (rows[occupied[:, 0]] - row) ** 2 + (columns[occupied[:, 1]] - column) ** 2
+        best = occupied[np.argmin(distance)]
+        return int(window[best[0], best[1]])
+
+    def mouseMoveEvent(self, event):
+        row = self.row_at(event.position())
+        if row != self.hover:
+            self.hover = row
+            self.point_hovered.emit(row)
+            self.update()
+
+    def mousePressEvent(self, event):
+        row = self.row_at(event.position())
+        if row >= 0 and event.button() == Qt.LeftButton:
+            self.point_clicked.emit(row)
+
+    def leaveEvent(self, event):
+        if self.hover != -1:
+            self.hover = -1
+            self.point_hovered.emit(-1)
+            self.update()
@@ -0,0 +1,449 @@
+import argparse
+import hashlib
+import inspect
+import itertools
+import math
+import os
+import sqlite3
+import sys
+import threading
+import time
+
+import numpy as np
+
+from calculation_engine import (engine_version, phase_coordinates_2, tower_voltages,
+                                tower_type_index, calculate_line_parameters)
+from conductor_catalog import catalog
+from instrumentation import timings
+
+# Persistent result store: the per-length results of every design calculated once are kept in a
+# SQLite database and served from there in later sessions.
+#
+# A design is addressed by a 128-bit hash of its normalized inputs: tower type and voltage,
+# circuits, bundle count and spacing, the coordinates (the second circuit only when there is one)
+# and the conductor data itself (radius, GMR, resistance, current capacity), seeded with the engine
+# version. Editing the catalog or bumping calculation_engine.engine_version therefore gives new
+# keys and old entries simply age out. The inputs of a call are laid out as one float64 block and
+# hashed with array operations, not design by design. The line length is not part of the key: the
+# totals are the stored per-length values times the length, exactly like in the engine, so designs
+# that only differ in length share one entry.
+#
+# The database runs in WAL mode, so any number of readers (threads or processes) work next to one
+# writer. Every thread gets its own connection. Lookups and writes go in blocks of keys and one
+# transaction per calculate() call. Results of this process are also kept in memory (sorted hash
+# arrays searched with np.searchsorted, single designs in a dict of their inputs), so repeated
+# designs of a session, like the GUI recalculating a design, do not reach SQLite at all. Failures
+# of the database are reported once and the designs are calculated as if the store was empty.
+
+default_store_path = os.environ.get(
+    "TRANSMISSION_LINE_RESULT_STORE",
+    os.path.join(os.path.expanduser("~"), ".cache", "transmission_line_design", "results.sqlite3"))
+stored_values = ["R", "L", "C", "capacity", "bundle_GMR", "r_eq_bundle", "gmd"]
+lookup_block = 500  # keys per SELECT ... IN (...)
+default_memory_entries = 500000  # results of this process also kept in memory
+recent_entries = 10000  # single designs (GUI clicks) kept by their normalized inputs
+evict_slack = 0.05  # fraction above max_entries before the store is trimmed
+design_width = 21  # rows of design_block
+hash_block = 8192  # designs hashed at once
+touch_interval = 3600.0  # s, last-use times of hits are refreshed at most this often
+
+_schema = """
+CREATE TABLE IF NOT EXISTS results (
+    key BLOB PRIMARY KEY,
+    value BLOB NOT NULL,  -- stored_values as little-endian float64
+    created REAL NOT NULL,
+    used REAL NOT NULL
+) WITHOUT ROWID;
+CREATE INDEX IF NOT EXISTS results_used ON results (used);
+"""
+_design_defaults = {"number_of_circuits": 1, **{name: np.nan for name in phase_coordinates_2}}
+_engine_signature = inspect.signature(calculate_line_parameters)
+
+
+def _key_seeds():
+    # Per-input seeds of the two 64-bit hash lanes; they depend on the engine version, so a new
+    # engine version gives new keys
+    digest = hashlib.sha256(f"engine-{engine_version}".encode()).digest()
+    rng = np.random.default_rng(int.from_bytes(digest[:8], "little"))
+    return np.frombuffer(rng.bytes(2 * design_width * 8), dtype=np.uint64).reshape(2, design_width)
+
+
+_seeds = _key_seeds()
+_odd_seeds = (_seeds[1] | np.uint64(1))[:, None]
+
+
+def design_block(tower_type, x_coordinates_a, y_coordinates_a, x_coordinates_b, y_coordinates_b,
+                 x_coordinates_c, y_coordinates_c, number_of_conductors, distance_between_conductors,
+                 conductor_type, number_of_circuits=1, x_coordinates_a_2=np.nan, y_coordinates_a_2=np.nan,
+                 x_coordinates_b_2=np.nan, y_coordinates_b_2=np.nan, x_coordinates_c_2=np.nan,
+                 y_coordinates_c_2=np.nan):
+    # Normalized inputs (calculate_line_parameters arguments without the length) as one contiguous
+    # float64 block of design_width rows, one column per design; returns (block, broadcast shape)
+    tower = tower_type_index(tower_type)
+    circuits = np.asarray(number_of_circuits, dtype=float)
+    # the second circuit only counts when there is one
+    second = (x_coordinates_a_2, y_coordinates_a_2, x_coordinates_b_2, y_coordinates_b_2, x_coordinates_c_2,
+              y_coordinates_c_2)
+    if circuits.ndim:
+        second = [np.where(circuits == 2, c, np.nan) for c in second]
+    elif circuits != 2:
+        second = [np.nan] * len(second)
+    values = [tower, tower_voltages[tower], circuits, number_of_conductors, distance_between_conductors,
+              x_coordinates_a, y_coordinates_a, x_coordinates_b, y_coordinates_b, x_coordinates_c, y_coordinates_c,
+              *second, *catalog.parameters(catalog.index(conductor_type))]
+    try:
+        # inputs of one shape (a single design, or the columns of a batch) stack directly
+        block = np.array(values, dtype=float)
+        shape = block.shape[1:]
+        block = block.reshape(design_width, -1)
+    except ValueError:
+        shape = np.broadcast_shapes(*(np.shape(v) for v in values))
+        block = np.empty((design_width, math.prod(shape)))
+        for i, value in enumerate(values):
+            block[i] = np.broadcast_to(value, shape).reshape(-1)
+    # one bit pattern for NaN and for zero
+    block += 0.0
+    block[np.isnan(block)] = np.nan
+    return block, shape
+
+
+def design_hashes(block):
+    # Two 64-bit hash lanes of every design of design_block, computed with array operations on
+    # hash_block designs at a time (that part of the block stays in the CPU cache): each value is
+    # xor-ed with the seed of its input and mixed (splitmix64 finalizer), the lanes are two sums of
+    # the mixed values
+    bits = block.view(np.uint64)
+    first = np.empty(bits.shape[1], dtype=np.uint64)
+    second = np.empty(bits.shape[1], dtype=np.uint64)
+    for start in range(0, bits.shape[1], hash_block):
+        part = slice(start, start + hash_block)
+        x = bits[:, part] ^ _seeds[0][:, None]
+        x ^= x >> np.uint64(30)
+        x *= np.uint64(0xbf58476d1ce4e5b9)
+        x ^= x >> np.uint64(27)
+        x *= np.uint64(0x94d049bb133111eb)
+        x ^= x >> np.uint64(31)
+        x.sum(axis=0, dtype=np.uint64, out=first[part])
+        x *= _odd_seeds
+        x.sum(axis=0, dtype=np.uint64, out=second[part])
+    return first, second
+
+
+def design_keys(first, second):
+    # Store keys: both lanes as 16 big-endian bytes, so keys sort like the first lane
+    lanes = np.column_stack((first.astype(">u8"), second.astype(">u8")))
+    return lanes.view("V16").ravel().tolist()
+
+
+def _distinct(first, second):
+    # (index of the first row of every distinct key, index of the distinct key of every row), keys
+    # in the order of the first lane
+    _, index, inverse = np.unique(first, return_index=True, return_inverse=True)
+    inverse = inverse.reshape(-1)
+    if not np.array_equal(second[index][inverse], second):
+        # two designs share the first lane: group by both
+        _, index, inverse = np.unique(np.column_stack((first, second)), axis=0, return_index=True,
+                                      return_inverse=True)
+        inverse = inverse.reshape(-1)
+    return index, inverse
+
+
+def _line_results(values, shape, line_length):
+    # calculate_line_parameters results from stored_values (designs x stored_values) and the length
+    results = {name: values[:, i].reshape(shape) for i, name in enumerate(stored_values)}
+    line_length_km = np.asarray(line_length, dtype=float)
+    results["total_R"] = results["R"] * line_length_km
+    results["total_L"] = results["L"] * line_length_km * 1000  # since L is per meter and line length is in km
+    results["total_C"] = results["C"] * line_length_km * 1000  # since C is per meter and line length is in km
+    return results
+
+
+class ResultStore:
+    def __init__(self, path=default_store_path, max_entries=None, max_age_days=None,
+                 memory_entries=default_memory_entries):
+        # max_entries / max_age_days are enforced while writing (None: no limit): the entry count is
+        # kept running and the store is trimmed once it passes max_entries by evict_slack, entries
+        # unused for max_age_days are removed at most every touch_interval. The last memory_entries
+        # results of this process are also kept in memory and looked up without SQLite.
+        self.path = path
+        self.max_entries = max_entries
+        self.max_age_days = max_age_days
+        self.memory_entries = memory_entries
+        self.hits = 0
+        self.misses = 0
+        self.failed = False
+        self._local = threading.local()
+        self._lock = threading.Lock()
+        self._entries = None  # entries in the database, counted on the first write
+        self._age_checked = 0.0
+        self._clear_memory()
+
+    def _clear_memory(self):
+        self._recent = {}  # normalized inputs of a single design -> its stored_values
+        # first lane (sorted), second lane, values, last-use times
+        self._memory = (np.empty(0, dtype=np.uint64), np.empty(0, dtype=np.uint64),
+                        np.empty((0, len(stored_values))), np.empty(0))
+
+    def _connection(self):
+        connection = getattr(self._local, "connection", None)
+        if connection is None:
+            directory = os.path.dirname(os.path.abspath(self.path))
+            os.makedirs(directory, exist_ok=True)
+            connection = sqlite3.connect(self.path, timeout=30.0, isolation_level=None)
+            connection.execute("PRAGMA journal_mode=WAL")
+            connection.execute("PRAGMA synchronous=NORMAL")
+            connection.executescript(_schema)
+            self._local.connection = connection
+        return connection
+
+    def _failure(self, error):
+        if not self.failed:
+            print(f"result store {self.path} not used: {error}", file=sys.stderr)
+        self.failed = True
+
+    def _recall(self, first, second, now):
+        # Rows found in memory: (mask, their values, keys of the ones whose last-use time is refreshed)
+        memory_first, memory_second, memory_values, memory_used = self._memory
+        if not len(memory_first):
+            return np.zeros(len(first), dtype=bool), memory_values, []
+        if len(first) > 1:
+            # the binary searches of sorted keys stay close to each other in memory
+            order = np.argsort(first)
+            position = np.empty(len(first), dtype=np.intp)
+            position[order] = np.searchsorted(memory_first, first[order])
+        else:
+            position = np.searchsorted(memory_first, first)
+        position = np.minimum(position, len(memory_first) - 1)
+        found = (memory_first[position] == first) & (memory_second[position] == second)
+        position = position[found]
+        stale = position[memory_used[position] < now - touch_interval]
+        if not len(stale):
+            return found, memory_values[position], []
+        memory_used[stale] = now
+        return found, memory_values[position], design_keys(memory_first[stale], memory_second[stale])
+
+    def _remember(self, first, second, values, used):
+        # Adds results to the memory; it starts over when it would exceed memory_entries
+        if not self.memory_entries:
+            return
+        with self._lock:
+            memory = self._memory
+            if len(memory[0]) + len(first) > self.memory_entries:
+                memory = (first[:0], second[:0], values[:0], used[:0])
+            first, second, values, used = (np.concatenate((old, new[:self.memory_entries]))
+                                           for old, new in zip(memory, (first, second, values, used)))
+            order = np.argsort(first, kind="stable")
+            # one entry per first lane (a shared first lane only makes the other design a miss)
+            keep = order[np.concatenate(([True], np.diff(first[order]) != 0))]
+            self._memory = (first[keep], second[keep], values[keep], used[keep])
+
+    def get(self, keys):
+        # Stored entries among the keys: (their positions in keys, values (found x stored_values),
+        # last-use times)
+        position = dict(zip(keys, range(len(keys))))
+        rows = []
+        connection = self._connection()
+        for start in range(0, len(keys), lookup_block):
+            block = keys[start:start + lookup_block]
+            rows += connection.execute(
+                f"SELECT key, value, used FROM results WHERE key IN ({', '.join('?' * len(block))})", block).fetchall()
+        if not rows:
+            return np.empty(0, dtype=np.intp), np.empty((0, len(stored_values))), np.empty(0)
+        found, blobs, used = zip(*rows)
+        values = np.frombuffer(b"".join(blobs), dtype="<f8").reshape(len(found), len(stored_values))
+        return np.array([position[key] for key in found], dtype=np.intp), values, np.array(used, dtype=float)
+
+    def put(self, keys, values, used_keys=()):
+        # Stores the rows of `values` (designs x stored_values) under `keys` and refreshes the
+        # last-use time of used_keys, all in one transaction. Keys in sorted order fill the B-tree
+        # page by page.
+        now = time.time()
+        connection = self._connection()
+        blobs = np.ascontiguousarray(values, dtype="<f8").view(f"V{8 * len(stored_values)}").ravel().tolist()
+        connection.execute("BEGIN IMMEDIATE")
+        try:
+            connection.executemany("INSERT OR REPLACE INTO results VALUES (?, ?, ?, ?)",
+                                   zip(keys, blobs, itertools.repeat(now), itertools.repeat(now)))
+            used_keys = list(used_keys)
+            for start in range(0, len(used_keys), lookup_block):
+                block = used_keys[start:start + lookup_block]
+                connection.execute(f"UPDATE results SET used = ? WHERE key IN ({', '.join('?' * len(block))})",
+                                   [now, *block])
+            connection.execute("COMMIT")
+        except BaseException:
+            connection.execute("ROLLBACK")
+            raise
+        self._trim(len(keys), now)
+
+    def _trim(self, added, now):
+        # Evicts once the running entry count passes max_entries by evict_slack, and old entries
+        # at most every touch_interval
+        trim_entries = trim_age = False
+        with self._lock:
+            if self.max_entries is not None:
+                if self._entries is None:
+                    self._entries = self._connection().execute("SELECT count(*) FROM results").fetchone()[0]
+                else:
+                    self._entries += added
+                trim_entries = self._entries > self.max_entries * (1 + evict_slack)
+            if self.max_age_days is not None and now - self._age_checked > touch_interval:
+                self._age_checked = now
+                trim_age = True
+        if trim_entries or trim_age:
+            self.evict(self.max_entries if trim_entries else None, self.max_age_days if trim_age else None)
+
+    @timings.timed("result_store")
+    def calculate(self, *args, **kwargs):
+        # Same arguments and results as calculate_line_parameters, with the stored results used
+        # where they exist and the new ones stored
+        design = _engine_signature.bind(*args, **kwargs).arguments if args else dict(kwargs)
+        line_length = design.pop("line_length")
+        cache = design.pop("cache", None)
+        if design.pop("conductor_data", None) is not None:
+            raise ValueError("conductor_data is not supported by the result store")
+        with timings.stage("keys"):
+            block, shape = design_block(**design)
+            if not shape:
+                # a single design seen before in this process: no hashing at all
+                recent = self._recent.get(block.tobytes())
+                if recent is not None:
+                    with self._lock:
+                        self.hits += 1
+                    return _line_results(recent.copy(), shape, line_length)
+            first, second = design_hashes(block)
+        now = time.time()
+        values = np.empty((len(first), len(stored_values)))
+        with timings.stage("memory"):
+            recalled, recalled_values, stale_keys = self._recall(first, second, now)
+            values[recalled] = recalled_values
+
+        rows = np.flatnonzero(~recalled)
+        keys, fetched, missing = [], values[:0], np.empty(0, dtype=np.intp)
+        if len(rows):
+            # identical designs are looked up and calculated once
+            index, inverse = _distinct(first[rows], second[rows])
+            distinct = rows[index]
+            keys = design_keys(first[distinct], second[distinct])
+            found, stored, used = np.empty(0, dtype=np.intp), np.empty((0, len(stored_values))), np.empty(0)
+            if not self.failed:
+                try:
+                    with timings.stage("lookup"):
+                        found, stored, used = self.get(keys)
+                except (sqlite3.Error, OSError) as error:
+                    self._failure(error)
+            fetched = np.empty((len(keys), len(stored_values)))
+            fetched[found] = stored
+            is_missing = np.ones(len(keys), dtype=bool)
+            is_missing[found] = False
+            missing = np.flatnonzero(is_missing)
+            stale_keys += [keys[i] for i in found[used < now - touch_interval].tolist()]
+            if len(missing):
+                inputs = {**_design_defaults, **design}
+                inputs = {name: np.ravel(np.broadcast_to(value, shape))[distinct[missing]]
+                          for name, value in inputs.items()}
+                results = calculate_line_parameters(**inputs, line_length=1.0, cache=cache)
+                fetched[missing] = np.column_stack([np.broadcast_to(results[name], len(missing))
+                                                    for name in stored_values])
+            values[rows] = fetched[inverse]
+            last_used = np.full(len(keys), now)
+            last_used[found] = np.where(used < now - touch_interval, now, used)
+            self._remember(first[distinct], second[distinct], fetched, last_used)
+        if (len(missing) or stale_keys) and not self.failed:
+            try:
+                with timings.stage("write"):
+                    self.put([keys[i] for i in missing.tolist()], fetched[missing], stale_keys)
+            except (sqlite3.Error, OSError) as error:
+                self._failure(error)
+        with self._lock:
+            self.hits += len(first) - len(missing)
+            self.misses += len(missing)
+            if not shape:
+                if len(self._recent) >= recent_entries:
+                    self._recent.clear()
+                self._recent[block.tobytes()] = values.copy()
+        return _line_results(values, shape, line_length)
+
+    def evict(self, max_entries=None, max_age_days=None):
+        # Removes entries unused for max_age_days and then the least recently used ones above
+        # max_entries; returns the number of removed entries
+        connection = self._connection()
+        connection.execute("BEGIN IMMEDIATE")
+        try:
+            removed = 0
+            if max_age_days is not None:
+                removed += connection.execute("DELETE FROM results WHERE used < ?",
+                                              (time.time() - max_age_days * 86400,)).rowcount
+            if max_entries is not None:
+                count = connection.execute("SELECT count(*) FROM results").fetchone()[0]
+                if count > max_entries:
+                    removed += connection.execute(
+                        "DELETE FROM results WHERE key IN (SELECT key FROM results ORDER BY used LIMIT ?)",
+                        (count - max_entries,)).rowcount
+                with self._lock:
+                    self._entries = min(count, max_entries)
+            elif self._entries is not None:
+                with self._lock:
+                    self._entries -= removed
+            connection.execute("COMMIT")
+        except BaseException:
+            connection.execute("ROLLBACK")
+            raise
+        return removed
+
+    def clear(self):
+        self._connection().execute("DELETE FROM results")
+        self.hits = self.misses = 0
+        self._entries = 0 if self._entries is not None else None
+        self._clear_memory()
+
+    def vacuum(self):
+        # Gives the space of removed entries back to the file system
+        self._connection().execute("VACUUM")
+
+    def stats(self):
+        connection = self._connection()
+        entries, oldest = connection.execute("SELECT count(*), min(used) FROM results").fetchone()
+        page_count = connection.execute("PRAGMA page_count").fetchone()[0]
+        page_size = connection.execute("PRAGMA page_size").fetchone()[0]
+        lookups = self.hits + self.misses
+        return {
+            "path": self.path,
+            "entries": entries,
+            "size_bytes": page_count * page_size,
+            "oldest_use_days": (time.time() - oldest) / 86400 if oldest is not None else 0.0,
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": self.hits / lookups if lookups else 0.0,
+        }
+
+    def close(self):
+        connection = getattr(self._local, "connection", None)
+        if connection is not None:
+            connection.close()
+            self._local.connection = None
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Inspect and trim the persistent result store")
+    parser.add_argument("path", nargs="?", default=default_store_path, help="store file")
+    parser.add_argument("--max-entries", type=int, help="keep at most this many (most recently used) entries")
+    parser.add_argument("--max-age-days", type=float, help="remove entries unused for this many days")
+    parser.add_argument("--clear", action="store_true", help="remove all entries")
+    parser.add_argument("--vacuum", action="store_true", help="shrink the file after removing entries")
+    args = parser.parse_args(argv)
+
+    store = ResultStore(args.path)
+    if args.clear:
+        store.clear()
+    if args.max_entries is not None or args.max_age_days is not None:
+        print(f"{store.evict(args.max_entries, args.max_age_days)} entries removed")
+    if args.vacuum:
+        store.vacuum()
+    stats = store.stats()
+    print(f"{stats['path']}: {stats['entries']} entries, {stats['size_bytes'] / 1e6:.1f} MB, "
+          f"least recently used {stats['oldest_use_days']:.1f} days ago")
+    store.close()
+
+
+if __name__ == "__main__":
+    main()
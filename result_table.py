@@ -0,0 +1,198 @@
+import numpy as np
+
+from batch_calculator import open_writer
+from calculation_engine import tower_types, tower_type_index, phase_coordinates, phase_coordinates_2
+from conductor_catalog import catalog
+
+# Columnar results: a ResultTable keeps the full-precision inputs and results of any number of
+# designs as one contiguous NumPy array per column, which is the memory layout of Arrow. Tower and
+# conductor types are int32 codes with the names as dictionary. Numeric columns are handed to
+# Arrow without copying, so Parquet and Arrow IPC files, and pandas/polars frames built from
+# to_arrow(), come straight from the arrays; no per-row Python objects are made on the way.
+#
+# Tables grow by appending blocks of columns (the capacity doubles, like the sweep plot); an
+# array passed to the constructor or read from an Arrow IPC file is used as it is.
+
+input_columns = (["tower_type", "number_of_circuits"] + phase_coordinates + phase_coordinates_2
+                 + ["number_of_conductors", "distance_between_conductors", "conductor_type", "line_length"])
+# results of calculate_line_parameters: per-meter R (ohm/km), L (H/m), C (F/m), totals and capacity
+result_columns = ["R", "L", "C", "total_R", "total_L", "total_C", "capacity", "bundle_GMR", "r_eq_bundle", "gmd"]
+integer_columns = {"number_of_circuits", "number_of_conductors"}
+csv_rows = 100000  # rows converted to text at once when writing CSV without pyarrow
+
+
+def default_categories():
+    return {"tower_type": list(tower_types), "conductor_type": catalog.names}
+
+
+class ResultTable:
+    def __init__(self, columns=None, categories=None):
+        # columns: dict of equally long arrays; categorical columns hold codes into categories
+        self._columns = {}
+        self.count = 0
+        self.categories = default_categories()
+        self.categories.update(categories or {})
+        if columns:
+            self.append(columns)
+
+    @classmethod
+    def from_calculation(cls, inputs, results):
+        # Table of calculate_line_parameters inputs (scalars or arrays, broadcast to the rows, type
+        # names or indices) and its results
+        size = np.size(results["R"])
+        columns = {}
+        for name in input_columns:
+            value = inputs.get(name, 1 if name == "number_of_circuits" else np.nan)
+            if name == "tower_type":
+                value = tower_type_index(value)
+            elif name == "conductor_type":
+                value = catalog.index(value)
+            columns[name] = np.broadcast_to(value, (size,))
+        for name in result_columns:
+            columns[name] = np.broadcast_to(results[name], (size,))
+        return cls(columns)
+
+    @classmethod
+    def read(cls, path):
+        # Table from a .parquet or Arrow IPC (.arrow/.feather) file; IPC files are memory mapped
+        import pyarrow as pa
+        if path.endswith(".parquet"):
+            import pyarrow.parquet as pq
+            table = pq.read_table(path)
+        else:
+            table = pa.ipc.open_file(pa.memory_map(path)).read_all()
+        columns, categories = {}, {}
+        for name, column in zip(table.column_names, table.columns):
+            column = column.combine_chunks() if column.num_chunks != 1 else column.chunk(0)
+            if pa.types.is_dictionary(column.type):
+                categories[name] = column.dictionary.to_pylist()
+                column = column.indices
+            columns[name] = column.to_numpy(zero_copy_only=False)
+        return cls(columns, categories)
+
+    def __len__(self):
+        return self.count
+
+    def __contains__(self, name):
+        return name in self._columns
+
+    def __getitem__(self, name):
+        return self._columns[name][:self.count]
+
+    @property
+    def names(self):
+        return list(self._columns)
+
+    @property
+    def columns(self):
+        # name -> column (views, no copies)
+        return {name: values[:self.count] for name, values in self._columns.items()}
+
+    def _dtype(self, name, values):
+        if name in self.categories:
+            return np.int32
+        if name in integer_columns:
+            return np.int64
+        return np.asarray(values).dtype if np.asarray(values).dtype.kind in "biuU" else np.float64
+
+    def append(self, columns):
+        # Adds a block of rows (dict of equally long arrays with the columns of the table)
+        size = len(next(iter(columns.values())))
+        if self._columns and set(columns) != set(self._columns):
+            raise ValueError("The block has different columns than the table.")
+        needed = self.count + size
+        for name, values in columns.items():
+            stored = self._columns.get(name)
+            dtype = self._dtype(name, values)
+            if stored is None and self.count == 0 and isinstance(values, np.ndarray) and values.ndim == 1:
+                # first block: adopted without copying when it has the right type and layout
+                self._columns[name] = np.ascontiguousarray(values, dtype=dtype)
+                continue
+            if stored is None or len(stored) < needed:
+                grown = np.empty(max(needed, 2 * self.count), dtype=dtype)
+                if stored is not None:
+                    grown[:self.count] = stored[:self.count]
+                self._columns[name] = stored = grown
+            stored[self.count:needed] = values
+        self.count = needed
+
+    def reserve(self, rows):
+        # Makes room for `rows` rows in total, so appended blocks are copied only once
+        for name, stored in self._columns.items():
+            if len(stored) < rows:
+                grown = np.empty(rows, dtype=stored.dtype)
+                grown[:self.count] = stored[:self.count]
+                self._columns[name] = grown
+
+    def select(self, rows):
+        # New table with the selected rows (mask or indices)
+        return ResultTable({name: values[rows] for name, values in self.columns.items()}, self.categories)
+
+    def decoded(self, name, rows=slice(None)):
+        # Column with categorical codes replaced by their names
+        values = self[name][rows]
+        if name in self.categories:
+            return np.array(self.categories[name])[values]
+        return values
+
+    def to_structured(self):
+        # Copy as a structured NumPy array (one record per design)
+        columns = self.columns
+        records = np.empty(self.count, dtype=[(name, values.dtype) for name, values in columns.items()])
+        for name, values in columns.items():
+            records[name] = values
+        return records
+
+    def to_arrow(self):
+        # pyarrow Table sharing the memory of the numeric columns; categorical columns become
+        # dictionary arrays over the same codes
+        import pyarrow as pa
+        arrays = []
+        for name, values in self.columns.items():
+            if name in self.categories:
+                arrays.append(pa.DictionaryArray.from_arrays(pa.array(values), pa.array(self.categories[name])))
+            else:
+                arrays.append(pa.array(values))
+        return pa.table(arrays, names=self.names)
+
+    def to_pandas(self):
+        # pandas DataFrame (categorical columns as pandas categoricals); needs pandas
+        return self.to_arrow().to_pandas()
+
+    def to_polars(self):
+        # polars DataFrame; needs polars
+        import polars
+        return polars.from_arrow(self.to_arrow())
+
+    def write(self, path, row_group_size=1000000):
+        # Writes .parquet, Arrow IPC (.arrow/.feather) or CSV (names instead of codes)
+        if path.endswith(".parquet"):
+            import pyarrow.parquet as pq
+            pq.write_table(self.to_arrow(), path, row_group_size=row_group_size)
+        elif path.endswith((".arrow", ".feather")):
+            import pyarrow as pa
+            table = self.to_arrow()
+            with pa.OSFile(path, "wb") as file, pa.ipc.new_file(file, table.schema) as writer:
+                writer.write_table(table, max_chunksize=row_group_size)
+        else:
+            try:
+                import pyarrow as pa
+                import pyarrow.csv
+            except ImportError:
+                pa = None
+            if pa is not None and path != "-":
+                # Arrow formats the numbers in C++, several times faster than the csv module
+                table = self.to_arrow()
+                for name in self.categories:
+                    if name in self:
+                        table = table.set_column(table.column_names.index(name), name,
+                                                 table.column(name).cast(pa.string()))
+                pyarrow.csv.write_csv(table, path)
+                return
+            writer = open_writer(path)
+            try:
+                for start in range(0, self.count, csv_rows):
+                    part = slice(start, start + csv_rows)
+                    writer.write({name: self.decoded(name, part) for name in self.names})
+            finally:
+                writer.close()
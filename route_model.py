@@ -0,0 +1,155 @@
+import argparse
+
+import numpy as np
+
+from batch_calculator import read_chunks, parse_design_columns, select_rows, default_chunk_size
+from calculation_engine import phase_coordinates, phase_coordinates_2, calculate_line_parameters
+from conductor_catalog import catalog
+from impedance_matrix import line_matrices, sequence_components, tower_conductors
+from input_validation import describe_errors
+from long_line import phase_abcd_matrix, phase_modes
+
+# Route model: a line made of sections with their own tower type, coordinates, conductor and
+# length (km). The section table has the same columns as the batch mode input, line_length being
+# the section length, plus an optional "transposition" column (0, 1, 2) giving how many positions
+# the phases are rotated in that section. Sections are read in chunks, their ABCD matrices are
+# computed in one array pass per chunk and multiplied together with a pairwise tree reduction, so
+# the route is processed in linear time with one chunk in memory.
+# Sections are modelled in the phase domain: the impedance and admittance matrices of the explicit
+# conductors (impedance_matrix.line_matrices, with earth return) are reduced to the phases, the two
+# circuits of a double circuit section are connected in parallel, and the 6x6 ABCD matrices of the
+# three-phase sections are cascaded. The phase coupling is kept, so an untransposed route is
+# unbalanced and transposition averages it out. The route's A, B, C, D are the positive-sequence
+# terms of the result and "unbalance" is |Z21 / Z11| of its sequence series impedance.
+
+matrix_elements = 4000000  # conductor matrix entries built at once
+
+
+def cascade_abcd(matrices):
+    # Product M1 @ M2 @ ... @ Mn of a (n, k, k) stack, as log2(n) batched matrix products
+    matrices = np.asarray(matrices)
+    if len(matrices) == 0:
+        return np.eye(matrices.shape[-1] if matrices.ndim == 3 else 2, dtype=complex)
+    while len(matrices) > 1:
+        if len(matrices) % 2:
+            matrices = np.concatenate([matrices, np.eye(matrices.shape[-1], dtype=matrices.dtype)[None]])
+        matrices = matrices[0::2] @ matrices[1::2]
+    return matrices[0]
+
+
+def _rotate_phases(inputs, transposition):
+    # Section coordinates with the phases moved k positions (a -> b -> c) for transposed sections
+    rotated = dict(inputs)
+    for suffix in ("", "_2"):
+        x = np.stack([inputs[name + suffix] for name in phase_coordinates[0::2]])
+        y = np.stack([inputs[name + suffix] for name in phase_coordinates[1::2]])
+        rows = np.arange(x.shape[1])
+        for i, (x_name, y_name) in enumerate(zip(phase_coordinates[0::2], phase_coordinates[1::2])):
+            source = (i + transposition) % 3
+            rotated[x_name + suffix] = x[source, rows]
+            rotated[y_name + suffix] = y[source, rows]
+    return rotated
+
+
+def section_abcd(inputs, frequency=50.0, earth_resistivity=100.0):
+    # Phase-domain ABCD matrices (sections, 6, 6) of design rows, one three-phase section each.
+    # Rows are grouped by bundle count and circuits like in corona_performance, and the per-km
+    # matrices and their modes are computed once for every distinct tower and conductor in the group. The circuits of a
+    # double circuit row carry the same phase voltages, so their admittances add:
+    # Z = (K^T Z6^-1 K)^-1 and Y = K^T Y6 K with K = [I; I].
+    names = phase_coordinates + phase_coordinates_2
+    n = np.asarray(inputs["number_of_conductors"]).astype(int)
+    circuits = np.asarray(inputs["number_of_circuits"]).astype(int)
+    radius, gmr, resistance, _ = catalog.parameters(inputs["conductor_type"])
+    spacing = np.asarray(inputs["distance_between_conductors"], dtype=float) / 100  # cm -> m
+    line_length = np.asarray(inputs["line_length"], dtype=float)
+    abcd = np.empty((len(n), 6, 6), dtype=complex)
+    for group_n, group_circuits in set(zip(n.tolist(), circuits.tolist())):
+        index = np.flatnonzero((n == group_n) & (circuits == group_circuits))
+        phase_count = 3 * group_circuits
+        x_phases = np.column_stack([np.asarray(inputs[name], dtype=float)[index]
+                                    for name in names[0:2 * phase_count:2]])
+        y_phases = np.column_stack([np.asarray(inputs[name], dtype=float)[index]
+                                    for name in names[1:2 * phase_count:2]])
+        designs, inverse = np.unique(np.column_stack([x_phases, y_phases, spacing[index], radius[index],
+                                                      gmr[index], resistance[index]]),
+                                     axis=0, return_inverse=True)
+        merge = np.vstack([np.eye(3)] * group_circuits)
+        Z = np.empty((len(designs), 3, 3), dtype=complex)
+        Y = np.empty((len(designs), 3, 3), dtype=complex)
+        step = max(1, matrix_elements // (phase_count * group_n) ** 2)
+        for start in range(0, len(designs), step):
+            part = designs[start:start + step]
+            x, y, phases = tower_conductors(part[:, :phase_count], part[:, phase_count:2 * phase_count], group_n,
+                                            part[:, -4])
+            matrices = line_matrices(x, y, part[:, -3, None], part[:, -2, None], part[:, -1, None], phases,
+                                     frequency, earth_resistivity)
+            Z[start:start + step] = np.linalg.inv(merge.T @ np.linalg.inv(matrices["Z_phase"]) @ merge)
+            Y[start:start + step] = merge.T @ matrices["Y_phase"] @ merge
+        inverse = inverse.reshape(-1)
+        modes = tuple(array[inverse] for array in phase_modes(Z, Y))
+        abcd[index] = phase_abcd_matrix(Z[inverse], Y[inverse], line_length[index], modes)
+    return abcd
+
+
+def route_model(path, frequency=50.0, chunk_size=default_chunk_size, earth_resistivity=100.0):
+    # Equivalent line of a route file: ABCD parameters, lumped totals and the equivalent pi model
+    total = np.eye(6, dtype=complex)
+    sections = 0
+    totals = {"length": 0.0, "total_R": 0.0, "total_L": 0.0, "total_C": 0.0}
+    minimum_capacity = np.inf
+
+    for columns in read_chunks(path, chunk_size):
+        inputs, codes = parse_design_columns(columns)
+        bad = np.flatnonzero(codes)
+        if len(bad):
+            row = sections + bad[0] + 2  # line number in the file (after the header)
+            raise ValueError(f"Section on line {row}: " + " ".join(describe_errors(codes[bad[0]])))
+        inputs = select_rows(inputs, slice(None))
+        strung = inputs
+        if "transposition" in columns:
+            strung = _rotate_phases(inputs, np.asarray(columns["transposition"]).astype(int) % 3)
+        total = total @ cascade_abcd(section_abcd(strung, frequency, earth_resistivity))
+
+        # lumped totals and capacity of the engine, which assumes ideally transposed sections
+        results = calculate_line_parameters(**inputs)
+
+        sections += len(codes)
+        totals["length"] += float(inputs["line_length"].sum())
+        for name in ("total_R", "total_L", "total_C"):
+            totals[name] += float(results[name].sum())
+        minimum_capacity = min(minimum_capacity, float(results["capacity"].min()))
+
+    sequence = [sequence_components(block) for block in (total[:3, :3], total[:3, 3:], total[3:, :3], total[3:, 3:])]
+    A, B, C, D = (block[1, 1] for block in sequence)
+    return {
+        "sections": sections,
+        "A": A, "B": B, "C": C, "D": D,
+        "unbalance": abs(sequence[1][2, 1] / B) if B != 0 else 0.0,  # negative over positive sequence
+        "series_impedance": B,  # equivalent pi model
+        "shunt_admittance": 2 * (A - 1) / B if B != 0 else 0j,
+        "capacity": minimum_capacity,  # MVA, limited by the weakest section
+        **totals,
+    }
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Equivalent line of a route given as a CSV/Parquet section table")
+    parser.add_argument("route", help="section table (.csv or .parquet)")
+    parser.add_argument("--frequency", type=float, default=50.0, help="in Hz")
+    parser.add_argument("--chunk-size", type=int, default=default_chunk_size, help="sections per chunk")
+    parser.add_argument("--earth-resistivity", type=float, default=100.0, help="in ohm m")
+    args = parser.parse_args(argv)
+
+    route = route_model(args.route, args.frequency, args.chunk_size, args.earth_resistivity)
+    print(f"Sections: {route['sections']}, length {route['length']:.3f} km")
+    print(f"Total R (Ω): {route['total_R']:.5f}   L (mH): {route['total_L']:.5f}   C (µF): {route['total_C']:.5f}")
+    print(f"Capacity (MVA): {route['capacity']:.3f}")
+    for name in ("A", "B", "C", "D"):
+        value = route[name]
+        print(f"{name} = {value.real:.6g} {'+' if value.imag >= 0 else '-'} j{abs(value.imag):.6g}")
+    print(f"Unbalance: {route['unbalance'] * 100:.3f} %")
+
+
+if __name__ == "__main__":
+    main()
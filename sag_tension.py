@@ -0,0 +1,289 @@
+import argparse
+import math
+import sys
+import time
+
+import numpy as np
+
+from batch_calculator import read_chunks, open_writer, parse_design_columns, select_rows, parse_float
+from calculation_engine import phase_coordinates, phase_coordinates_2, tower_voltages
+from conductor_catalog import catalog, design_temperature
+from impedance_matrix import potential_coefficient_matrix, reduce_to_phases, sequence_components, tower_conductors
+from input_validation import describe_errors
+
+# Sag and tension of level spans with the catenary and the change-of-state equation, and the
+# conductor heights that follow from them. The y coordinates of a design are attachment heights;
+# at mid-span the conductor hangs lower by the sag, which grows with temperature, ice and wind.
+#
+# The conductor is strung to the reference horizontal tension H_ref at the reference temperature
+# (bare conductor, no wind). Its unstressed length then follows from the catenary length
+#   L(H, w) = 2 H / w sinh(w S / (2 H))
+# and under any other load case (temperature t, resultant weight w per m) H solves
+#   f(H) = L(H, w) - L_u (1 + alpha (t - t_ref)) (1 + H / EA) = 0
+# f falls monotonically and is convex in H, so a Newton iteration that starts below the root, or
+# is brought back below it by a bracket, converges for every span. All spans and load cases are
+# solved together as one array iteration instead of a scalar root search per span.
+#
+# Weights per m: conductor m g, radial ice of thickness t_i on diameter d gives rho_ice g pi t_i (d + t_i),
+# wind pressure p acts on d + 2 t_i. With wind the conductor swings out of the vertical plane and
+# only the vertical component of the sag lowers it. Creep and the ground profile are not modelled.
+#
+# The GMD formula of the calculator only sees height differences, which a common sag leaves
+# unchanged; the heights enter through the ground plane of the potential coefficients, so the
+# effective (span averaged) heights are fed into positive_sequence_capacitance (and can go into
+# the EMF and corona calculations with sagged_heights).
+
+g = 9.80665  # m/s²
+ice_density = 913.0  # kg/m³
+everyday_tension = 0.2  # reference horizontal tension as a fraction of the rated strength
+reference_temperature = 15.0  # °C
+max_tension_ratio = 0.5  # highest allowed support tension as a fraction of the rated strength
+clearance_base = 5.5  # m, minimum ground clearance up to 33 kV
+clearance_per_kv = 0.01  # m added per kV line-to-line above 33 kV
+tolerance = 1e-10  # relative change of H at which the iteration stops
+max_iterations = 60
+chunk_elements = 4000000  # potential coefficients evaluated at once
+
+# Load cases: (name, conductor temperature in °C, radial ice in mm, wind pressure in Pa)
+default_load_cases = [
+    ("everyday", reference_temperature, 0.0, 0.0),
+    ("hot", design_temperature, 0.0, 0.0),
+    ("ice", -5.0, 10.0, 0.0),
+    ("wind", reference_temperature, 0.0, 380.0),
+]
+
+
+def conductor_mechanics(conductor_type):
+    # (diameter m, weight N/m, EA N, expansion 1/K, rated strength N) of the conductor(s)
+    diameter, mass, area, modulus, expansion, strength = catalog.gather(
+        conductor_type, "diameter_mm", "mass_kg_per_km", "area_mm2", "modulus_gpa", "expansion_per_k",
+        "rated_strength_kn")
+    if np.isnan(mass).any() or np.isnan(area).any() or np.isnan(modulus).any() or np.isnan(expansion).any() \
+            or np.isnan(strength).any():
+        raise ValueError("The conductor catalog has no mechanical data for some of the conductors.")
+    return diameter * 1e-3, mass * g / 1000, area * 1e-6 * modulus * 1e9, expansion, strength * 1e3
+
+
+def load_weights(diameter, weight, ice_thickness=0.0, wind_pressure=0.0):
+    # Vertical, horizontal and resultant load in N/m; diameter in m, ice in mm, wind in Pa
+    ice = np.asarray(ice_thickness, dtype=float) * 1e-3
+    vertical = weight + ice_density * g * math.pi * ice * (diameter + ice)
+    horizontal = np.asarray(wind_pressure, dtype=float) * (diameter + 2 * ice)
+    return vertical, horizontal, np.hypot(vertical, horizontal)
+
+
+def catenary_length(H, w, span):
+    return 2 * H / w * np.sinh(w * span / (2 * H))
+
+
+def catenary_sag(H, w, span):
+    return H / w * (np.cosh(w * span / (2 * H)) - 1)
+
+
+def solve_tension(span, w, temperature, unstressed_length, EA, expansion, reference_temperature=reference_temperature,
+                  start=None):
+    # Horizontal tension (N) solving the change-of-state equation, all arguments broadcast.
+    # unstressed_length: conductor length at the reference temperature without tension.
+    # Returns (H, iterations); rows that did not converge are NaN.
+    span, w, temperature, unstressed_length, EA, expansion = np.broadcast_arrays(
+        *(np.asarray(value, dtype=float) for value in (span, w, temperature, unstressed_length, EA, expansion)))
+    free_length = unstressed_length * (1 + expansion * (temperature - reference_temperature))
+    # f is convex, so Newton steps from below the root approach it monotonically. Steps from above
+    # the root may overshoot into the exponential part of the catenary, where Newton crawls, so
+    # they lower H by at most half and never leave the bracket [low, high].
+    low = w * span / 1400  # far below any root, sinh(700) is still finite
+    high = np.full(span.shape, np.inf)
+    if start is None:
+        # inelastic parabola: free_length = S + w² S³ / (24 H²)
+        slack = np.maximum(free_length - span, 1e-9 * span)
+        start = w * span * np.sqrt(span / (24 * slack))
+    H = np.maximum(np.broadcast_to(start, span.shape), low)
+    with np.errstate(over="ignore", invalid="ignore"):
+        for iteration in range(1, max_iterations + 1):
+            u = w * span / (2 * H)
+            f = 2 * H / w * np.sinh(u) - free_length * (1 + H / EA)
+            slope = 2 * (np.sinh(u) - u * np.cosh(u)) / w - free_length / EA
+            low = np.where(f > 0, H, low)
+            high = np.where(f > 0, high, H)
+            step = np.maximum(H - f / slope, H / 2)
+            done = np.abs(step - H) <= tolerance * H
+            # steps that leave the bracket are replaced by a (geometric) bisection
+            outside = (step < low) | (step > high)
+            step[outside] = np.where(np.isfinite(high), np.sqrt(low * high), 2 * low)[outside]
+            H = step
+            if done.all():
+                return H, iteration
+    return np.where(done, H, np.nan), max_iterations
+
+
+def sag_tension(conductor_type, span, temperature, ice_thickness=0.0, wind_pressure=0.0,
+                reference_tension=everyday_tension, reference_temperature=reference_temperature):
+    # Sag-tension state of level spans (m) of the conductor(s) under load cases; all arguments
+    # broadcast, e.g. spans of shape (N, 1) against cases of shape (M,) give (N, M) arrays.
+    # The spans are strung to reference_tension (fraction of the rated strength, horizontal) at
+    # reference_temperature. Returns a dict of arrays:
+    #   horizontal_tension, max_tension    N (the highest tension is at the supports)
+    #   tension_ratio                      max_tension / rated strength
+    #   sag, vertical_sag                  m, sag in the swung plane and its vertical component
+    #   swing_angle                        degrees out of the vertical
+    #   average_drop                       m, mean height below the supports over the span (vertical)
+    conductor = catalog.index(conductor_type)
+    diameter, weight, EA, expansion, strength = conductor_mechanics(conductor)
+    span = np.asarray(span, dtype=float)
+    H_ref = reference_tension * strength
+    unstressed_length = catenary_length(H_ref, weight, span) / (1 + H_ref / EA)
+    vertical, horizontal, w = load_weights(diameter, weight, ice_thickness, wind_pressure)
+    H, _ = solve_tension(span, w, temperature, unstressed_length, EA, expansion, reference_temperature,
+                         start=H_ref * w / weight)
+    c = H / w
+    u = span / (2 * c)
+    sag = c * (np.cosh(u) - 1)
+    cosine = vertical / w
+    max_tension = H + w * sag
+    return {
+        "horizontal_tension": H,
+        "max_tension": max_tension,
+        "tension_ratio": max_tension / strength,
+        "sag": sag,
+        "vertical_sag": sag * cosine,
+        "swing_angle": np.broadcast_to(np.degrees(np.arccos(np.clip(cosine, -1.0, 1.0))), H.shape),
+        # mean of the catenary over the span measured from the supports
+        "average_drop": (sag - c * (np.sinh(u) / u - 1)) * cosine,
+    }
+
+
+def minimum_clearance(voltage):
+    # Required ground clearance in m for a line-to-line voltage in V
+    return clearance_base + clearance_per_kv * np.maximum(np.asarray(voltage, dtype=float) / 1000 - 33, 0)
+
+
+def sagged_heights(inputs, drop):
+    # Copy of the design inputs with every y coordinate lowered by `drop` (m, broadcast against
+    # the rows), e.g. average_drop for effective heights that go into calculate_line_parameters
+    # or the field calculations, or vertical_sag for the lowest points
+    sagged = dict(inputs)
+    for name in phase_coordinates[1::2] + phase_coordinates_2[1::2]:
+        if name in sagged:
+            sagged[name] = np.asarray(sagged[name], dtype=float) - drop
+    return sagged
+
+
+def positive_sequence_capacitance(inputs, drop=0.0):
+    # Positive-sequence capacitance in µF/km (circuits in parallel) of design rows with the y
+    # coordinates lowered by `drop` (m, scalar, (rows,) or (rows, cases)); returns (rows, cases).
+    # Potential coefficients with the ground plane and the explicit bundle, rows are grouped by
+    # bundle count and circuits like in corona_performance.
+    names = phase_coordinates + phase_coordinates_2
+    n = np.asarray(inputs["number_of_conductors"]).astype(int)
+    circuits = np.asarray(inputs["number_of_circuits"]).astype(int)
+    radius = catalog.gather(inputs["conductor_type"], "radius")[0]
+    spacing = np.asarray(inputs["distance_between_conductors"], dtype=float) / 100  # cm -> m
+    drop = np.asarray(drop, dtype=float)
+    drop = drop.reshape(drop.shape + (1,) * (2 - drop.ndim))
+    drop = np.broadcast_to(drop, (len(n), drop.shape[1]))
+    capacitance = np.full(drop.shape, np.nan)
+    for group_n, group_circuits in set(zip(n.tolist(), circuits.tolist())):
+        index = np.flatnonzero((n == group_n) & (circuits == group_circuits))
+        phase_count = 3 * group_circuits
+        x_phases = np.column_stack([np.asarray(inputs[name], dtype=float)[index]
+                                    for name in names[0:2 * phase_count:2]])
+        y_phases = np.column_stack([np.asarray(inputs[name], dtype=float)[index]
+                                    for name in names[1:2 * phase_count:2]])
+        step = max(1, chunk_elements // (drop.shape[1] * (phase_count * group_n) ** 2))
+        for start in range(0, len(index), step):
+            part = slice(start, start + step)
+            rows = index[part]
+            y = y_phases[part, None, :] - drop[rows, :, None]
+            x, y, phases = tower_conductors(np.broadcast_to(x_phases[part, None, :], y.shape), y, group_n,
+                                            spacing[rows, None])
+            C = np.linalg.inv(reduce_to_phases(potential_coefficient_matrix(x, y, radius[rows, None, None]), phases))
+            sequence = sequence_components(C).real
+            positive = [3 * circuit + 1 for circuit in range(group_circuits)]
+            capacitance[rows] = sequence[..., positive, :][..., positive].sum(axis=(-2, -1)) * 1e6  # F -> µF
+    return capacitance
+
+
+def ground_clearance(inputs, vertical_sag, voltage=None):
+    # Lowest conductor height (m) at mid-span for every design and the margin over the required
+    # clearance. inputs are design columns (number_of_circuits, tower_type, y coordinates),
+    # vertical_sag broadcasts against the rows (e.g. (rows, cases)).
+    heights = [np.asarray(inputs[name], dtype=float) for name in phase_coordinates[1::2]]
+    double = np.asarray(inputs.get("number_of_circuits", 1)) == 2
+    for name in phase_coordinates_2[1::2]:
+        heights.append(np.where(double, np.asarray(inputs.get(name, np.nan), dtype=float), np.inf))
+    lowest = np.minimum.reduce(np.broadcast_arrays(*heights))
+    lowest = lowest.reshape(lowest.shape + (1,) * (np.ndim(vertical_sag) - lowest.ndim)) - vertical_sag
+    if voltage is None:
+        voltage = tower_voltages[inputs["tower_type"]]
+    required = minimum_clearance(voltage)
+    return lowest, lowest - np.reshape(required, np.shape(required) + (1,) * (np.ndim(lowest) - np.ndim(required)))
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(
+        description="Sag, tension and ground clearance of the designs in a CSV/Parquet file under load cases")
+    parser.add_argument("input", help="design table in the batch mode format (.csv/.parquet, '-' for CSV on stdin), "
+                        "an optional 'span' column gives the span of every design in m")
+    parser.add_argument("output", help="output .csv/.parquet ('-' for CSV on stdout), one row per design and case")
+    parser.add_argument("--span", type=float, default=300.0, help="span in m where the table has none")
+    parser.add_argument("--case", action="append", metavar="NAME:TEMP[:ICE[:WIND]]",
+                        help="load case: conductor temperature in °C, radial ice in mm, wind pressure in Pa "
+                        "(repeatable, default: " + ", ".join(case[0] for case in default_load_cases) + ")")
+    parser.add_argument("--reference-tension", type=float, default=everyday_tension,
+                        help="stringing tension at the reference temperature as a fraction of the rated strength")
+    parser.add_argument("--reference-temperature", type=float, default=reference_temperature, help="in °C")
+    args = parser.parse_args(argv)
+
+    cases = default_load_cases
+    if args.case:
+        cases = []
+        for text in args.case:
+            name, *values = text.split(":")
+            if not 1 <= len(values) <= 3:
+                parser.error(f"invalid load case: {text}")
+            values = [float(value) for value in values] + [0.0] * (3 - len(values))
+            cases.append((name, *values))
+    names = np.array([case[0] for case in cases])
+    temperature, ice, wind = (np.array([case[i] for case in cases], dtype=float) for i in (1, 2, 3))
+
+    start = time.perf_counter()
+    writer = open_writer(args.output)
+    rows = failed = 0
+    try:
+        for columns in read_chunks(args.input):
+            inputs, codes = parse_design_columns(columns)
+            for i in np.flatnonzero(codes).tolist():
+                print(f"Design {rows + i + 1}: " + " ".join(describe_errors(codes[i])), file=sys.stderr)
+            ok = np.flatnonzero(codes == 0)
+            design = select_rows(inputs, ok)
+            span = parse_float(columns.get("span"), len(codes))[ok]
+            span = np.where(np.isnan(span), args.span, span)
+            state = sag_tension(design["conductor_type"][:, None], span[:, None], temperature, ice, wind,
+                                args.reference_tension, args.reference_temperature)
+            lowest, margin = ground_clearance(design, state["vertical_sag"])
+            attachment = positive_sequence_capacitance(design)
+            effective = positive_sequence_capacitance(design, state["average_drop"])
+            output = {
+                "design": np.repeat(ok + rows + 1, len(cases)),
+                "case": np.tile(names, len(ok)),
+                "span": np.repeat(span, len(cases)),
+            }
+            for name in ("horizontal_tension", "tension_ratio", "sag", "vertical_sag", "swing_angle"):
+                output[name] = state[name].ravel()
+            output["lowest_height"] = lowest.ravel()
+            output["clearance_margin"] = margin.ravel()
+            output["ok"] = ((margin >= 0) & (state["tension_ratio"] <= max_tension_ratio)).ravel()
+            output["average_drop"] = state["average_drop"].ravel()
+            output["C1_attachment"] = np.repeat(attachment[:, 0], len(cases))  # µF/km
+            output["C1_effective"] = effective.ravel()
+            writer.write(output)
+            failed += int(np.count_nonzero(~output["ok"]))
+            rows += len(codes)
+    finally:
+        writer.close()
+    print(f"{rows} designs, {failed} design/case pairs fail the clearance or tension limit, "
+          f"done in {time.perf_counter() - start:.2f} s", file=sys.stderr)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,279 @@
+import argparse
+import itertools
+import json
+import math
+import multiprocessing
+import os
+import socket
+import sys
+import time
+import zlib
+
+import numpy as np
+
+from batch_calculator import open_writer
+from calculation_engine import tower_types, tower_type_index
+from conductor_catalog import catalog
+from design_sweep import default_objectives, default_spacings, chunk_size, design_axes, grid_chunk, merge_fronts
+
+# Checkpointed grid sweeps through a file-backed work queue. A study (the grid of design_sweep.grid_sweep)
+# is split into deterministic units of unit_size grid points; any number of worker processes, on
+# this machine or on others that see the same directory, claim units, compute their Pareto fronts
+# and check them in. Nothing but the study directory is shared:
+#
+#   study.json            the study: grid axes (conductors by name), objectives, unit size
+#   claims/<unit>         lease of the worker computing a unit, created exclusively ("host pid")
+#   results/<unit>.npz    front and counts of a finished unit, written to a temporary file and renamed
+#
+# A unit is done when its result exists, so a study resumes where it stopped: restarted workers
+# skip finished units and only recompute the ones that were in progress. Claims of processes that
+# died on this host are taken over at once, claims from other hosts after lease_timeout seconds.
+# Taking over a claim that is still alive only costs a duplicate computation, the results of a unit
+# are always the same. merge_study() combines the unit fronts into the front of the whole grid.
+
+lease_timeout = 600.0  # s after which a claim from another host counts as abandoned
+poll_interval = 1.0  # s between passes while the remaining units are claimed by other workers
+
+
+def _claim_path(directory, unit):
+    return os.path.join(directory, "claims", f"{unit:08d}")
+
+
+def _result_path(directory, unit):
+    return os.path.join(directory, "results", f"{unit:08d}.npz")
+
+
+def _write_json(path, data):
+    temporary = f"{path}.{socket.gethostname()}.{os.getpid()}.tmp"
+    with open(temporary, "w") as file:
+        json.dump(data, file, indent=1)
+    os.replace(temporary, path)
+
+
+def create_study(directory, tower_type, points_per_axis=5, number_of_circuits=1, spacings=default_spacings,
+                 conductors=None, objectives=default_objectives, min_phase_distance=1.0, unit_size=chunk_size):
+    # Creates the study directory (arguments as in grid_sweep). Creating an existing study again
+    # with the same definition is allowed, a different definition raises ValueError.
+    axes = design_axes(tower_type, number_of_circuits, points_per_axis, spacings, conductors)
+    total = int(np.prod([len(axis) for axis in axes]))
+    study = {
+        "tower_type": tower_types[int(tower_type_index(tower_type))],
+        "number_of_circuits": int(number_of_circuits),
+        "axes": [axis.tolist() for axis in axes[:8]],
+        "conductors": [catalog.names[i] for i in axes[8].tolist()],
+        "objectives": [list(objective) for objective in objectives],
+        "min_phase_distance": float(min_phase_distance),
+        "unit_size": int(unit_size),
+        "designs": total,
+        "units": math.ceil(total / unit_size),
+    }
+    path = os.path.join(directory, "study.json")
+    if os.path.exists(path):
+        with open(path) as file:
+            if json.load(file) != study:
+                raise ValueError(f"{directory} already holds a different study")
+        return study
+    for name in ("claims", "results"):
+        os.makedirs(os.path.join(directory, name), exist_ok=True)
+    _write_json(path, study)
+    return study
+
+
+def load_study(directory):
+    # (study definition, grid axes as arrays)
+    with open(os.path.join(directory, "study.json")) as file:
+        study = json.load(file)
+    axes = [np.array(axis) for axis in study["axes"]] + [catalog.index(study["conductors"])]
+    return study, axes
+
+
+def _unit_task(study, axes, unit):
+    # Task of design_sweep.grid_chunk for one unit
+    start = unit * study["unit_size"]
+    stop = min(start + study["unit_size"], study["designs"])
+    objectives = [tuple(objective) for objective in study["objectives"]]
+    return (study["tower_type"], study["number_of_circuits"], axes, start, stop, study["min_phase_distance"],
+            objectives)
+
+
+def _abandoned(path, host):
+    # Whether the claim at path belongs to a dead process of this host or has not been renewed
+    # for lease_timeout seconds
+    try:
+        with open(path) as file:
+            claim_host, _, pid = file.read().strip().rpartition(" ")
+        age = time.time() - os.path.getmtime(path)
+    except (FileNotFoundError, ValueError):
+        return False
+    if claim_host == host and pid.isdigit():
+        try:
+            os.kill(int(pid), 0)
+        except ProcessLookupError:
+            return True
+        except PermissionError:
+            pass
+    return age > lease_timeout
+
+
+def _claim(directory, unit, host):
+    # Claims a unit for this process; False when another live worker holds it
+    path = _claim_path(directory, unit)
+    owner = f"{host} {os.getpid()}"
+    try:
+        descriptor = os.open(path, os.O_CREAT | os.O_EXCL | os.O_WRONLY)
+    except FileExistsError:
+        if not _abandoned(path, host):
+            return False
+        with open(path, "w") as file:
+            file.write(owner)
+        return True
+    with os.fdopen(descriptor, "w") as file:
+        file.write(owner)
+    return True
+
+
+def _write_result(directory, unit, front, evaluated, valid):
+    path = _result_path(directory, unit)
+    temporary = f"{path}.{socket.gethostname()}.{os.getpid()}.tmp"
+    with open(temporary, "wb") as file:
+        np.savez(file, evaluated=evaluated, valid=valid, **{f"front_{key}": value for key, value in front.items()})
+    os.replace(temporary, path)
+
+
+def _read_result(path):
+    with np.load(path) as data:
+        front = {name[len("front_"):]: data[name] for name in data.files if name.startswith("front_")}
+        return front, int(data["evaluated"]), int(data["valid"])
+
+
+def run_worker(directory, max_units=None):
+    # Claims and computes units until every unit is done (or max_units are computed here);
+    # returns the number of units computed by this worker
+    study, axes = load_study(directory)
+    host = socket.gethostname()
+    units = study["units"]
+    # workers start at different places of the queue, so they rarely compete for the same unit
+    first = zlib.crc32(f"{host} {os.getpid()}".encode()) % units
+    order = list(itertools.chain(range(first, units), range(first)))
+    computed = 0
+    while True:
+        waiting = False
+        for unit in order:
+            if max_units is not None and computed >= max_units:
+                return computed
+            if os.path.exists(_result_path(directory, unit)):
+                continue
+            if not _claim(directory, unit, host):
+                waiting = True
+                continue
+            try:
+                if not os.path.exists(_result_path(directory, unit)):  # may have been finished meanwhile
+                    front, evaluated, valid = grid_chunk(_unit_task(study, axes, unit))
+                    _write_result(directory, unit, front, evaluated, valid)
+                    computed += 1
+            finally:
+                try:
+                    os.remove(_claim_path(directory, unit))
+                except FileNotFoundError:
+                    pass
+        if not waiting:
+            return computed
+        time.sleep(poll_interval)
+
+
+def run_workers(directory, workers=None):
+    # Runs `workers` worker processes on this machine until the study is done
+    workers = workers or os.cpu_count()
+    if workers == 1:
+        return run_worker(directory)
+    processes = [multiprocessing.Process(target=run_worker, args=(directory,)) for _ in range(workers)]
+    for process in processes:
+        process.start()
+    for process in processes:
+        process.join()
+
+
+def study_status(directory):
+    # Units done, claimed and open, and the designs evaluated so far
+    study, _ = load_study(directory)
+    done = {int(name.split(".")[0]) for name in os.listdir(os.path.join(directory, "results"))
+            if name.endswith(".npz")}
+    claimed = {int(name) for name in os.listdir(os.path.join(directory, "claims")) if name.isdigit()} - done
+    return {"units": study["units"], "done": len(done), "claimed": len(claimed),
+            "open": study["units"] - len(done) - len(claimed), "designs": study["designs"],
+            "designs_done": sum(min(study["unit_size"], study["designs"] - unit * study["unit_size"])
+                                for unit in done)}
+
+
+def merge_study(directory, partial=False):
+    # Pareto front of the study from the unit results, plus sweep statistics like grid_sweep.
+    # Unless `partial` is set, all units must be done.
+    study, _ = load_study(directory)
+    objectives = [tuple(objective) for objective in study["objectives"]]
+    missing = [unit for unit in range(study["units"]) if not os.path.exists(_result_path(directory, unit))]
+    if missing and not partial:
+        raise ValueError(f"{len(missing)} of {study['units']} units are not done yet (first: {missing[0]})")
+    skipped = set(missing)
+    fronts, evaluated, valid = [], 0, 0
+    for unit in range(study["units"]):
+        if unit in skipped:
+            continue
+        front, unit_evaluated, unit_valid = _read_result(_result_path(directory, unit))
+        if len(front.get("capacity", ())):
+            fronts.append(front)
+        evaluated += unit_evaluated
+        valid += unit_valid
+        if len(fronts) >= 256:  # keeps the memory bounded on very large studies
+            fronts = [front for front in [merge_fronts(fronts, objectives)] if front]
+    return merge_fronts(fronts, objectives), {"evaluated": evaluated, "valid": valid, "missing": len(missing)}
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Checkpointed grid sweeps through a file-backed work queue")
+    commands = parser.add_subparsers(dest="command", required=True)
+    create = commands.add_parser("create", help="define a study in a directory")
+    create.add_argument("directory")
+    create.add_argument("tower_type", type=int, choices=[1, 2, 3], help="tower type number")
+    create.add_argument("--circuits", type=int, choices=[1, 2], default=1)
+    create.add_argument("--points", type=int, default=5, help="grid points per coordinate axis")
+    create.add_argument("--unit-size", type=int, default=chunk_size, help="grid points per work unit")
+    work = commands.add_parser("work", help="compute units (run on every machine that shares the directory)")
+    work.add_argument("directory")
+    work.add_argument("--workers", type=int, help="worker processes on this machine")
+    status = commands.add_parser("status", help="show the progress of a study")
+    status.add_argument("directory")
+    merge = commands.add_parser("merge", help="combine the unit results into the Pareto front")
+    merge.add_argument("directory")
+    merge.add_argument("--output", help="write the front to a .csv/.parquet file")
+    merge.add_argument("--partial", action="store_true", help="merge the units done so far")
+    args = parser.parse_args(argv)
+
+    if args.command == "create":
+        study = create_study(args.directory, args.tower_type - 1, args.points, args.circuits,
+                             unit_size=args.unit_size)
+        print(f"{study['designs']} designs in {study['units']} units")
+    elif args.command == "work":
+        start = time.perf_counter()
+        run_workers(args.directory, args.workers)
+        print(f"worked for {time.perf_counter() - start:.2f} s", file=sys.stderr)
+    elif args.command == "status":
+        progress = study_status(args.directory)
+        print(f"{progress['done']}/{progress['units']} units done, {progress['claimed']} in progress, "
+              f"{progress['open']} open ({progress['designs_done']}/{progress['designs']} designs)")
+    else:
+        front, stats = merge_study(args.directory, args.partial)
+        print(f"Evaluated {stats['evaluated']} designs ({stats['valid']} valid), "
+              f"{len(front.get('capacity', []))} on the Pareto front"
+              + (f", {stats['missing']} units missing" if stats["missing"] else ""))
+        if args.output and front:
+            output = dict(front)
+            output["conductor_type"] = np.array(catalog.names)[front["conductor_type"]]
+            writer = open_writer(args.output)
+            try:
+                writer.write(output)
+            finally:
+                writer.close()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,164 @@
+import argparse
+import math
+import sys
+import time
+
+import numpy as np
+
+from batch_calculator import read_chunks, open_writer, parse_float, default_chunk_size
+from calculation_engine import tower_types, tower_type_index, line_capacity
+from conductor_catalog import catalog, design_temperature
+
+# Dynamic line rating: steady-state ampacity from weather with the IEEE 738 heat balance
+#   q_c + q_r = q_s + I^2 R(T_c)
+# (convective and radiative cooling against solar heating and Joule losses, all in W/m at the
+# maximum allowed conductor temperature T_c), turned into a line capacity in MVA with the same
+# formula as the static rating. Weather records are streamed in chunks and every chunk is one
+# array evaluation over (timestamps x conductors).
+#
+# Weather columns: timestamp (optional, copied to the output), ambient_temperature (°C),
+# wind_speed (m/s), wind_direction (degrees from north) and solar_irradiance (W/m², the irradiance
+# on the conductor; the sun position is not modelled).
+
+weather_columns = ["ambient_temperature", "wind_speed", "wind_direction", "solar_irradiance"]
+default_emissivity = 0.8
+default_absorptivity = 0.8
+
+
+def air_properties(film_temperature, elevation=0.0):
+    # Dynamic viscosity (kg/m s), density (kg/m³) and thermal conductivity (W/m °C) of air
+    viscosity = 1.458e-6 * (film_temperature + 273) ** 1.5 / (film_temperature + 383.4)
+    density = (1.293 - 1.525e-4 * elevation + 6.379e-9 * elevation ** 2) / (1 + 0.00367 * film_temperature)
+    conductivity = 2.424e-2 + 7.477e-5 * film_temperature - 4.407e-9 * film_temperature ** 2
+    return viscosity, density, conductivity
+
+
+def wind_angle(wind_direction, line_azimuth):
+    # Angle between the wind and the line axis in degrees (0 to 90); both directions from north
+    difference = np.abs(np.asarray(wind_direction, dtype=float) - line_azimuth) % 180
+    return np.minimum(difference, 180 - difference)
+
+
+def convective_cooling(diameter, conductor_temperature, ambient_temperature, wind_speed, angle, elevation=0.0):
+    # q_c in W/m: the larger of the two forced convection formulas and natural convection
+    film_temperature = (conductor_temperature + ambient_temperature) / 2
+    viscosity, density, conductivity = air_properties(film_temperature, elevation)
+    rise = np.maximum(conductor_temperature - ambient_temperature, 0.0)
+    phi = np.radians(angle)
+    k_angle = 1.194 - np.cos(phi) + 0.194 * np.cos(2 * phi) + 0.368 * np.sin(2 * phi)
+    reynolds = diameter * density * wind_speed / viscosity
+    forced_low = k_angle * (1.01 + 1.35 * reynolds ** 0.52) * conductivity * rise
+    forced_high = k_angle * 0.754 * reynolds ** 0.6 * conductivity * rise
+    natural = 3.645 * np.sqrt(density) * diameter ** 0.75 * rise ** 1.25
+    return np.maximum(np.maximum(forced_low, forced_high), natural)
+
+
+def radiative_cooling(diameter, conductor_temperature, ambient_temperature, emissivity=default_emissivity):
+    # q_r in W/m
+    return 17.8 * diameter * emissivity * (((conductor_temperature + 273) / 100) ** 4
+                                           - ((ambient_temperature + 273) / 100) ** 4)
+
+
+def steady_state_ampacity(conductor_type, ambient_temperature, wind_speed, wind_angle_degrees, solar_irradiance,
+                          max_temperature=design_temperature, emissivity=default_emissivity,
+                          absorptivity=default_absorptivity, elevation=0.0):
+    # Ampacity in A of the conductor(s) at max_temperature (°C). All arguments broadcast, e.g.
+    # weather of shape (T, 1) against conductors of shape (K,) gives a (T, K) array. Where the sun
+    # alone heats the conductor above max_temperature the ampacity is 0.
+    conductor = catalog.index(conductor_type)
+    diameter = catalog.gather(conductor, "diameter_mm")[0] * 10**(-3)  # in m
+    resistance = catalog.resistance_at(conductor, max_temperature) / 1000  # in ohm/m
+    cooling = (convective_cooling(diameter, max_temperature, ambient_temperature, wind_speed,
+                                  wind_angle_degrees, elevation)
+               + radiative_cooling(diameter, max_temperature, ambient_temperature, emissivity))
+    heating = absorptivity * np.asarray(solar_irradiance, dtype=float) * diameter
+    return np.sqrt(np.maximum(cooling - heating, 0.0) / resistance)
+
+
+def rating_chunk(columns, conductors, tower_type, number_of_circuits, number_of_conductors,
+                 line_azimuth=0.0, voltage=None, **options):
+    # Ampacity (A) and capacity (MVA) columns of one chunk of weather records for every conductor
+    size = len(next(iter(columns.values())))
+    weather = {name: parse_float(columns.get(name), size)[:, None] for name in weather_columns}
+    conductors = catalog.index(list(conductors))
+    with np.errstate(invalid="ignore"):
+        ampacity = steady_state_ampacity(
+            conductors, weather["ambient_temperature"], np.maximum(weather["wind_speed"], 0.0),
+            wind_angle(weather["wind_direction"], line_azimuth), np.maximum(weather["solar_irradiance"], 0.0),
+            **options)
+    capacity = line_capacity(tower_type, number_of_circuits, number_of_conductors, ampacity, voltage)
+
+    output = {"timestamp": columns["timestamp"]} if "timestamp" in columns else {}
+    for k, name in enumerate(catalog.names[i] for i in conductors.tolist()):
+        output[f"ampacity_{name}"] = ampacity[:, k]
+        output[f"capacity_{name}"] = capacity[:, k]
+    return output
+
+
+def run_rating(input_path, output_path, conductors, tower_type, number_of_circuits, number_of_conductors,
+               chunk_size=default_chunk_size, **options):
+    # Streams a weather file into a capacity time series. Returns per conductor the number of
+    # records, the minimum/mean capacity (MVA) and the records below the static rating.
+    conductors = [catalog.names[i] for i in catalog.index(list(conductors)).tolist()]
+    static = line_capacity(tower_type, number_of_circuits, number_of_conductors,
+                           catalog.gather(conductors, "current_capacity")[0], options.get("voltage"))
+    summary = {name: {"records": 0, "minimum": math.inf, "total": 0.0, "below_static": 0} for name in conductors}
+    writer = open_writer(output_path)
+    try:
+        for columns in read_chunks(input_path, chunk_size):
+            output = rating_chunk(columns, conductors, tower_type, number_of_circuits, number_of_conductors,
+                                  **options)
+            writer.write(output)
+            for name, rating in zip(conductors, static):
+                capacity = output[f"capacity_{name}"]
+                capacity = capacity[np.isfinite(capacity)]
+                entry = summary[name]
+                entry["records"] += len(capacity)
+                entry["minimum"] = min(entry["minimum"], float(capacity.min(initial=math.inf)))
+                entry["total"] += float(capacity.sum())
+                entry["below_static"] += int(np.count_nonzero(capacity < rating))
+    finally:
+        writer.close()
+    for name, rating in zip(conductors, static):
+        entry = summary[name]
+        entry["mean"] = entry.pop("total") / entry["records"] if entry["records"] else math.nan
+        entry["static"] = float(rating)
+    return summary
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Dynamic line rating (IEEE 738 steady state) from a weather time series")
+    parser.add_argument("weather", help="weather .csv/.parquet file ('-' for CSV on stdin)")
+    parser.add_argument("output", help="capacity time series .csv/.parquet ('-' for CSV on stdout)")
+    parser.add_argument("--tower-type", type=int, choices=[1, 2, 3], default=1, help="tower type number")
+    parser.add_argument("--circuits", type=int, choices=[1, 2], default=1)
+    parser.add_argument("--bundle", type=int, default=1, help="conductors in the bundle")
+    parser.add_argument("--conductors", nargs="+", default=None, help="conductor names (default: whole catalog)")
+    parser.add_argument("--voltage", type=float, help="line-to-line voltage in kV (default: the tower's)")
+    parser.add_argument("--azimuth", type=float, default=0.0, help="line direction in degrees from north")
+    parser.add_argument("--max-temperature", type=float, default=design_temperature, help="in °C")
+    parser.add_argument("--emissivity", type=float, default=default_emissivity)
+    parser.add_argument("--absorptivity", type=float, default=default_absorptivity)
+    parser.add_argument("--elevation", type=float, default=0.0, help="in m above sea level")
+    parser.add_argument("--chunk-size", type=int, default=default_chunk_size, help="records per chunk")
+    args = parser.parse_args(argv)
+
+    tower_type = tower_types[args.tower_type - 1]
+    if args.circuits == 2 and tower_type_index(tower_type) != 2:
+        parser.error("Only the Type-3 tower can carry two circuits.")
+    start = time.perf_counter()
+    summary = run_rating(args.weather, args.output, args.conductors or catalog.names, tower_type, args.circuits,
+                         args.bundle, args.chunk_size, line_azimuth=args.azimuth,
+                         voltage=args.voltage * 1000 if args.voltage else None,
+                         max_temperature=args.max_temperature, emissivity=args.emissivity,
+                         absorptivity=args.absorptivity, elevation=args.elevation)
+    print(f"rated in {time.perf_counter() - start:.2f} s", file=sys.stderr)
+    print(f"{'conductor':12s} {'records':>8s} {'static':>9s} {'minimum':>9s} {'mean':>9s} {'below static':>13s}",
+          file=sys.stderr)
+    for name, entry in summary.items():
+        print(f"{name:12s} {entry['records']:8d} {entry['static']:9.1f} {entry['minimum']:9.1f} "
+              f"{entry['mean']:9.1f} {entry['below_static']:13d}", file=sys.stderr)
+
+
+if __name__ == "__main__":
+    main()